@@ -1,5 +1,24 @@
 from nbaio.util import AioUtils
+from nbaio.cache import AioDownloadCache
+from nbaio.writer import AioFileWriter
+from nbaio.limits import AioHostLimiter, AioAdaptiveLimiter, AioRateLimiter, AioThroughputWatchdog, AioSlowTransferError
+from nbaio.retry import AioRetryPolicy
+from nbaio.metalink import AioMetalink, AioMetalinkFile
+from nbaio.delta import AioDeltaIndex
+from nbaio.result import AioDownloadResult
 
 __all__ = [
-    "AioUtils"
+    "AioUtils",
+    "AioDownloadCache",
+    "AioFileWriter",
+    "AioHostLimiter",
+    "AioAdaptiveLimiter",
+    "AioRateLimiter",
+    "AioThroughputWatchdog",
+    "AioSlowTransferError",
+    "AioRetryPolicy",
+    "AioMetalink",
+    "AioMetalinkFile",
+    "AioDeltaIndex",
+    "AioDownloadResult",
 ]
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""On-disk download cache with HTTP revalidation.
+
+Cached bodies are stored per URL together with their ETag/Last-Modified
+validators, so repeated downloads can be revalidated with conditional
+requests and served locally on 304 Not Modified. The total size of the cache
+is bounded by evicting least recently used entries.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+
+class AioDownloadCache:
+    """Size-bounded LRU cache of downloaded files keyed by URL."""
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, cache_dir: Union[str, Path], max_size: Optional[int] = None):
+        """Open (or create) a cache directory.
+
+        Args:
+            cache_dir: Directory holding cached bodies and the index
+            max_size: Maximum total size of cached bodies in bytes (None for unbounded)
+        """
+        self._dir = Path(cache_dir)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._dir
+
+    @property
+    def total_size(self) -> int:
+        """Total size of cached bodies in bytes."""
+        with self._lock:
+            return sum(entry["size"] for entry in self._index.values())
+
+    def _load_index(self) -> dict:
+        try:
+            return json.loads((self._dir / self.INDEX_NAME).read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self) -> None:
+        index_path = self._dir / self.INDEX_NAME
+        tmp_path = index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._index))
+        os.replace(tmp_path, index_path)
+
+    def body_path(self, url: str) -> Path:
+        """Return the path of the cached body for a URL."""
+        return self._dir / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def lookup(self, url: str) -> Optional[dict]:
+        """Return the cache entry (etag, last_modified, size) for a URL, or None."""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None or not self.body_path(url).exists():
+                return None
+            return dict(entry)
+
+    def conditional_headers(self, url: str) -> dict:
+        """Return If-None-Match/If-Modified-Since headers for a cached URL."""
+        entry = self.lookup(url)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, url: str) -> None:
+        """Mark a URL as recently used."""
+        with self._lock:
+            if url in self._index:
+                # Index order is recency order: move the entry to the end
+                entry = self._index.pop(url)
+                entry["last_used"] = time.time()
+                self._index[url] = entry
+                self._save_index()
+
+    def store(
+        self,
+        url: str,
+        source_path: Path,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> bool:
+        """Copy a downloaded file into the cache and record its validators.
+
+        Responses without validators cannot be revalidated and are not stored.
+        Blocking; call from a worker thread when used from async code.
+
+        Returns:
+            True if the file was stored
+        """
+        if not etag and not last_modified:
+            return False
+        if self._max_size is not None and Path(source_path).stat().st_size > self._max_size:
+            return False
+
+        body_path = self.body_path(url)
+        tmp_path = body_path.with_suffix(".tmp")
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, body_path)
+
+        with self._lock:
+            self._index.pop(url, None)
+            self._index[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": body_path.stat().st_size,
+                "last_used": time.time(),
+            }
+            self._evict_locked()
+            self._save_index()
+        return True
+
+    def restore(self, url: str, dest_path: Path) -> int:
+        """Copy a cached body to dest_path and mark it as recently used.
+
+        Blocking; call from a worker thread when used from async code.
+
+        Returns:
+            Number of bytes restored
+        """
+        dest_path = Path(dest_path)
+        # Copy next to the destination and rename, so dest_path is never half-written
+        tmp_path = dest_path.with_name(f".{dest_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            shutil.copyfile(self.body_path(url), tmp_path)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        self.touch(url)
+        return Path(dest_path).stat().st_size
+
+    def evict(self) -> None:
+        """Evict least recently used entries until the cache fits max_size."""
+        with self._lock:
+            self._evict_locked()
+            self._save_index()
+
+    def _evict_locked(self) -> None:
+        if self._max_size is None:
+            return
+        total = sum(entry["size"] for entry in self._index.values())
+        for url, entry in list(self._index.items()):
+            if total <= self._max_size:
+                break
+            self.body_path(url).unlink(missing_ok=True)
+            del self._index[url]
+            total -= entry["size"]
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        with self._lock:
+            for url in list(self._index):
+                self.body_path(url).unlink(missing_ok=True)
+            self._index = {}
+            self._save_index()
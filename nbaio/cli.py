@@ -1,8 +1,78 @@
 import click
 import anyio
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional, TextIO
+from click.core import ParameterSource
 from .util import AioUtils
+from .cache import AioDownloadCache
+from .retry import AioRetryPolicy
+from .metalink import AioMetalink
+from .delta import AioDeltaIndex
+
+
+class ByteSize(click.ParamType):
+    """Byte count with an optional K/M/G suffix (powers of 1024), e.g. '500K' or '10M'."""
+    name = "size"
+    _units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, (int, float)):
+            return value
+        text = str(value).strip().upper().removesuffix("B")
+        unit = text[-1:] if text[-1:] in self._units else ""
+        try:
+            return float(text[:len(text) - len(unit)]) * self._units[unit]
+        except ValueError:
+            self.fail(f"'{value}' is not a valid size (e.g. 500K, 10M, 1G)", param, ctx)
+
+
+def _download_entry(url: str, output: Path, dest: Optional[str] = None, checksum: Optional[str] = None, decompress: bool = False) -> tuple:
+    """Build a download_files entry from a URL ('|' separates mirrors of the same file)."""
+    mirrors = [mirror for mirror in url.split("|") if mirror] or [url]
+    # Simple filename extraction from URL
+    filename = dest or mirrors[0].split("/")[-1] or "downloaded_file"
+    if decompress and not dest and AioUtils._compression_format(filename):
+        # 'data.csv.gz' is saved as 'data.csv'
+        filename = filename.rsplit(".", 1)[0]
+    entry = (mirrors[0] if len(mirrors) == 1 else mirrors, output / filename)
+    return entry + (checksum,) if checksum else entry
+
+
+def _extract_entry(url: str, output: Path, dest: Optional[str] = None, checksum: Optional[str] = None) -> tuple:
+    """Build a download_extract_files entry; DEST names a subdirectory of the output directory."""
+    entry = (url, output / dest if dest else output)
+    return entry + (checksum,) if checksum else entry
+
+
+# Options of the download command that --extract cannot honor
+_EXTRACT_UNSUPPORTED = (
+    "processes", "adaptive_concurrency", "max_connections", "keepalive_expiry", "segments", "resume",
+    "cache_dir", "cache_max_size", "write_buffer_size", "max_per_host", "host_limits",
+    "limit_rate_per_download", "race_mirrors", "multi_source", "connections_per_source",
+    "skip_existing", "dedupe", "dedupe_checksums", "link_mode", "compressed", "decompress",
+    "delta", "largest_first", "metalinks",
+)
+
+
+def _manifest_fields(line: str) -> Optional[list[str]]:
+    """Split a manifest line into URL [DEST [CHECKSUM]] (None for blank lines and '#' comments)."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    return line.split(maxsplit=2)
+
+
+async def _read_manifest(manifest: TextIO, make_entry: Callable[..., tuple]) -> AsyncIterator[tuple]:
+    """Lazily yield make_entry(URL, [DEST, [CHECKSUM]]) for the lines of a manifest, reading it in batches off the event loop."""
+    while True:
+        lines = await anyio.to_thread.run_sync(manifest.readlines, 64 * 1024)
+        if not lines:
+            return
+        for line in lines:
+            fields = _manifest_fields(line)
+            if fields:
+                yield make_entry(*fields)
 
 
 @click.group()
@@ -12,23 +82,212 @@ def cli():
 
 
 @cli.command(name="download")
-@click.argument("urls", nargs=-1, required=True)
+@click.argument("urls", nargs=-1)
 @click.option("-o", "--output", type=click.Path(path_type=Path), default=".", help="Output directory")
 @click.option("-c", "--concurrent", type=int, default=5, help="Maximum concurrent downloads")
-def download(urls: list[str], output: Path, concurrent: int):
-    """Download multiple files concurrently."""
+@click.option("-P", "--processes", type=int, default=1, help="Worker processes to split the batch across, each with its own event loop and connection pool (0: one per CPU)")
+@click.option("--adaptive-concurrency/--no-adaptive-concurrency", default=False, help="Tune concurrency up to --concurrent (and --max-per-host, per host) from measured throughput, backing off on errors and 429/503")
+@click.option("--max-connections", type=int, default=None, help="Maximum pooled connections (default: 100)")
+@click.option("--keepalive-expiry", type=float, default=5.0, help="Seconds idle connections are kept alive")
+@click.option("--http2/--no-http2", default=False, help="Enable HTTP/2 multiplexing (requires 'h2')")
+@click.option("--connect-timeout", type=float, default=30.0, help="Seconds to establish a connection")
+@click.option("--read-timeout", type=float, default=60.0, help="Seconds to wait for the next chunk of a response")
+@click.option("--pool-timeout", type=float, default=None, help="Seconds to wait for a free pooled connection (default: 3600)")
+@click.option("--deadline", type=float, default=None, help="Seconds the whole batch may take; unfinished downloads are cancelled and fail")
+@click.option("--segments", type=int, default=1, help="Parallel byte ranges per large file (requires server Range support)")
+@click.option("--resume/--no-resume", default=False, help="Keep '.part' files on failure and continue them on re-run")
+@click.option("--cache-dir", type=click.Path(path_type=Path), default=None, help="Cache directory for revalidating unchanged files (ETag/Last-Modified)")
+@click.option("--cache-max-size", type=int, default=None, help="Maximum cache size in bytes (least recently used entries are evicted)")
+@click.option("--chunk-size", type=int, default=None, help="Network read chunk size in bytes (default: as received)")
+@click.option("--write-buffer-size", type=int, default=1024 * 1024, help="Bytes coalesced in memory before each disk write")
+@click.option("--max-per-host", type=int, default=None, help="Maximum concurrent downloads from any single host")
+@click.option("--host-limit", "host_limits", multiple=True, help="Concurrency cap shared by hosts matching a pattern, as PATTERN=N (e.g. '*.example.com=4')")
+@click.option("--limit-rate", type=ByteSize(), default=None, help="Aggregate bandwidth limit in bytes per second (e.g. 10M)")
+@click.option("--limit-rate-per-download", type=ByteSize(), default=None, help="Bandwidth limit of each download in bytes per second")
+@click.option("--retries", type=int, default=0, help="Retries per download on transient errors (backoff with jitter, honors Retry-After)")
+@click.option("--race-mirrors/--no-race-mirrors", default=False, help="Start each download from the mirror delivering the first bytes fastest")
+@click.option("--min-throughput", type=ByteSize(), default=None, help="Fail over to the next mirror (or retry) below this many bytes per second")
+@click.option("--throughput-window", type=float, default=10.0, help="Seconds over which --min-throughput is measured")
+@click.option("--multi-source/--no-multi-source", default=False, help="Fetch pieces of each file from all of its mirrors at once")
+@click.option("--connections-per-source", type=int, default=1, help="Concurrent piece requests per mirror with --multi-source")
+@click.option("--skip-existing", type=click.Choice(["size", "checksum", "validators"]), default=None, help="Keep existing files that are up to date: same size as the remote file, matching manifest checksum, or unchanged ETag/Last-Modified")
+@click.option("--dedupe/--no-dedupe", default=True, help="Fetch a URL listed several times once and link the other destinations to it")
+@click.option("--dedupe-checksums", is_flag=True, default=False, help="Also treat entries with the same manifest checksum as duplicates")
+@click.option("--link-mode", type=click.Choice(["auto", "reflink", "hardlink", "copy"]), default="auto", help="How duplicates are materialized (auto: reflink, else copy)")
+@click.option("--compressed", is_flag=True, default=False, help="Request a compressed transfer (gzip/br/zstd) and decode it while downloading")
+@click.option("--decompress", is_flag=True, default=False, help="Decompress .gz/.bz2/.xz/.zst files while downloading, saving them without the suffix")
+@click.option("--delta", is_flag=True, default=False, help="Update existing files fetching only changed blocks, using the '<url>.nbdelta' file next to each URL (see delta_index)")
+@click.option("--largest-first", is_flag=True, default=False, help="Probe sizes with HEAD requests first and start the largest downloads first")
+@click.option("--from-file", "manifest", type=click.File("r"), default=None, help="Manifest with one 'URL [DEST [CHECKSUM]]' per line ('-' for stdin), read as the batch runs")
+@click.option("--metalink", "metalinks", multiple=True, type=click.Path(exists=True, path_type=Path), help="Metalink document (.meta4/.metalink) listing files, mirrors and checksums")
+@click.option("--extract", is_flag=True, default=False, help="Extract archives into the output directory while downloading (archives are not saved)")
+@click.option("--filter", type=click.Choice(['data', 'tar', 'fully_trusted']), default='data', help="Filter level for TAR extraction with --extract (default: data)")
+def download(
+    urls: list[str],
+    output: Path,
+    concurrent: int,
+    processes: int,
+    adaptive_concurrency: bool,
+    max_connections: Optional[int],
+    keepalive_expiry: float,
+    http2: bool,
+    connect_timeout: float,
+    read_timeout: float,
+    pool_timeout: Optional[float],
+    deadline: Optional[float],
+    segments: int,
+    resume: bool,
+    cache_dir: Optional[Path],
+    cache_max_size: Optional[int],
+    chunk_size: Optional[int],
+    write_buffer_size: int,
+    max_per_host: Optional[int],
+    host_limits: list[str],
+    limit_rate: Optional[float],
+    limit_rate_per_download: Optional[float],
+    retries: int,
+    race_mirrors: bool,
+    min_throughput: Optional[float],
+    throughput_window: float,
+    multi_source: bool,
+    connections_per_source: int,
+    skip_existing: Optional[str],
+    dedupe: bool,
+    dedupe_checksums: bool,
+    link_mode: str,
+    compressed: bool,
+    decompress: bool,
+    delta: bool,
+    largest_first: bool,
+    manifest: Optional[TextIO],
+    metalinks: list[Path],
+    extract: bool,
+    filter: str,
+):
+    """Download multiple files concurrently over a shared connection pool.
+
+    Mirrors of the same file are given as one argument separated by '|',
+    e.g. 'https://a.example.com/f.bin|https://b.example.com/f.bin'.
+    """
+    if not urls and not metalinks and manifest is None:
+        raise click.UsageError("Give at least one URL, --from-file manifest or --metalink document.")
+    
+    parsed_host_limits = {}
+    for item in host_limits:
+        pattern, _, limit = item.rpartition("=")
+        if not pattern or not limit.isdigit():
+            raise click.BadParameter(f"Expected PATTERN=N, got '{item}'", param_hint="--host-limit")
+        parsed_host_limits[pattern] = int(limit)
+    
+    if decompress and skip_existing in ("size", "checksum"):
+        # Sizes and checksums describe the compressed file, never the decompressed one kept
+        raise click.UsageError(f"--skip-existing {skip_existing} cannot be combined with --decompress (use validators).")
+    
     output.mkdir(parents=True, exist_ok=True)
+    retry = AioRetryPolicy(max_attempts=retries + 1) if retries > 0 else None
+    
+    if extract:
+        ctx = click.get_current_context()
+        unsupported = [
+            param.opts[0] for param in ctx.command.params
+            if param.name in _EXTRACT_UNSUPPORTED and ctx.get_parameter_source(param.name) != ParameterSource.DEFAULT
+        ]
+        if unsupported:
+            raise click.UsageError(f"{', '.join(unsupported)} cannot be combined with --extract.")
+        extract_downloads = [_extract_entry(url, output) for url in urls]
+        
+        async def iter_extract_downloads():
+            # Manifest entries are read as workers ask for them, never all at once
+            for entry in extract_downloads:
+                yield entry
+            async for entry in _read_manifest(manifest, lambda url, *rest: _extract_entry(url, output, *rest)):
+                yield entry
+        
+        async def do_download_extract():
+            results = await AioUtils.download_extract_files(
+                iter_extract_downloads() if manifest is not None else extract_downloads,
+                max_concurrent=concurrent,
+                filter=filter,
+                http2=http2,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                pool_timeout=pool_timeout,
+                chunk_size=chunk_size,
+                max_rate=limit_rate,
+                retry=retry,
+                min_throughput=min_throughput,
+                throughput_window=throughput_window,
+                deadline=deadline,
+            )
+            success_count = sum(1 for r in results if r)
+            click.echo(f"Extracted {success_count}/{len(results)} archives.")
+
+        anyio.run(do_download_extract)
+        return
     
-    downloads = []
-    for url in urls:
-        # Simple filename extraction from URL
-        filename = url.split("/")[-1] or "downloaded_file"
-        downloads.append((url, output / filename))
+    downloads = [_download_entry(url, output, decompress=decompress) for url in urls]
+    for metalink in metalinks:
+        try:
+            document = AioMetalink.load(metalink)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--metalink")
+        for entry in document.files:
+            downloads.append((entry, output / Path(entry.name).name))
+    
+    cache = AioDownloadCache(cache_dir, max_size=cache_max_size) if cache_dir else None
+    
+    async def iter_downloads():
+        # Manifest entries are read as workers ask for them, never all at once
+        for entry in downloads:
+            yield entry
+        async for entry in _read_manifest(manifest, lambda url, *rest: _download_entry(url, output, *rest, decompress=decompress)):
+            yield entry
+    
+    if processes != 1:
+        if cache is not None:
+            raise click.UsageError("--cache-dir cannot be combined with --processes.")
+        batch = partial(AioUtils.download_files_sharded, processes=processes or None)
+    else:
+        batch = AioUtils.download_files
     
     async def do_download():
-        results = await AioUtils.download_files(downloads, max_concurrent=concurrent)
+        results = await batch(
+            iter_downloads() if manifest is not None else downloads,
+            max_concurrent=concurrent,
+            adaptive_concurrency=adaptive_concurrency,
+            max_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+            http2=http2,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            pool_timeout=pool_timeout,
+            segments=segments,
+            resume=resume,
+            cache=cache,
+            chunk_size=chunk_size,
+            write_buffer_size=write_buffer_size,
+            max_per_host=max_per_host,
+            host_limits=parsed_host_limits or None,
+            max_rate=limit_rate,
+            max_rate_per_download=limit_rate_per_download,
+            retry=retry,
+            race_mirrors=race_mirrors,
+            min_throughput=min_throughput,
+            throughput_window=throughput_window,
+            multi_source=multi_source,
+            connections_per_source=connections_per_source,
+            skip_existing=skip_existing,
+            dedupe=dedupe,
+            dedupe_checksums=dedupe_checksums,
+            link_mode=link_mode,
+            accept_encoding=compressed,
+            decompress=decompress,
+            delta=delta,
+            largest_first=largest_first,
+            deadline=deadline,
+        )
         success_count = sum(1 for r in results if r)
-        click.echo(f"Downloaded {success_count}/{len(urls)} files.")
+        click.echo(f"Downloaded {success_count}/{len(results)} files.")
 
     anyio.run(do_download)
 
@@ -67,6 +326,28 @@ def extract(path: Path, output: Optional[Path], remove: bool, filter: str):
 
     anyio.run(do_extract)
 
+@cli.command(name="delta_index")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("-o", "--output", type=click.Path(file_okay=False, path_type=Path), default=None, help="Directory for the control files (default: next to each file)")
+@click.option("--block-size", type=ByteSize(), default=AioDeltaIndex.DEFAULT_BLOCK_SIZE, help="Block size, e.g. 64K or 1M (default: 1M)")
+@click.option("--algorithm", default="sha256", help="Hash algorithm of the block checksums")
+def delta_index(paths: list[Path], output: Optional[Path], block_size: float, algorithm: str):
+    """Generate '<file>.nbdelta' block checksum files for delta downloads (download --delta)."""
+    if output is not None:
+        output.mkdir(parents=True, exist_ok=True)
+    
+    async def do_index():
+        for path in paths:
+            try:
+                index = await anyio.to_thread.run_sync(AioDeltaIndex.generate, path, int(block_size), algorithm)
+            except ValueError as e:
+                raise click.BadParameter(str(e))
+            control_path = (output or path.parent) / (path.name + AioDeltaIndex.SUFFIX)
+            index.save(control_path)
+            click.echo(f"Wrote {control_path} ({len(index.block_checksums)} blocks)")
+    
+    anyio.run(do_index)
+
 @cli.command(name="shell")
 @click.argument("commands", nargs=-1, required=True)
 @click.option("-c", "--concurrent", type=int, default=5, help="Maximum concurrent commands")
@@ -0,0 +1,164 @@
+"""Block checksum index of a file, for delta downloads of its next version.
+
+The index (a small JSON control file, published next to the file as
+'<name>.nbdelta') lists a digest per fixed-size block of the new version.
+A client holding an older version hashes its own blocks, reuses every block
+whose digest appears in the index and fetches only the rest with Range
+requests, in the spirit of zsync.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+
+class AioDeltaIndex:
+    """Block digests of one version of a file.
+
+    Usage:
+        index = AioDeltaIndex.generate("disk.img")
+        index.save("disk.img.nbdelta")
+        await AioUtils.download_file(url, "disk.img", delta="disk.img.nbdelta")
+    """
+
+    SUFFIX = ".nbdelta"
+    VERSION = 1
+    DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(
+        self,
+        size: int,
+        block_size: int,
+        block_checksums: List[str],
+        algorithm: str = "sha256",
+        checksum: Optional[str] = None,
+        name: Optional[str] = None,
+    ):
+        """Create an index.
+
+        Args:
+            size: File size in bytes
+            block_size: Length of each block in bytes (the last block may be shorter)
+            block_checksums: Hex digest of every block, in file order
+            algorithm: hashlib algorithm of the block digests
+            checksum: Whole-file digest as 'algorithm:hexdigest', if known
+            name: File name the index was generated from
+        """
+        self.size = size
+        self.block_size = block_size
+        self.block_checksums = block_checksums
+        self.algorithm = algorithm
+        self.checksum = checksum
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"AioDeltaIndex(name={self.name!r}, size={self.size}, blocks={len(self.block_checksums)})"
+
+    def block_range(self, index: int) -> tuple[int, int]:
+        """Return the (start, end) byte offsets of a block, end exclusive."""
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.size)
+
+    @classmethod
+    def generate(
+        cls,
+        path: Union[str, Path],
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        algorithm: str = "sha256",
+    ) -> "AioDeltaIndex":
+        """Hash a file block by block (and as a whole). Blocking.
+
+        Raises:
+            ValueError: If block_size is not positive or the algorithm is not supported by hashlib
+        """
+        if block_size <= 0:
+            raise ValueError(f"Invalid block size: {block_size}")
+        hashlib.new(algorithm)
+        path = Path(path)
+        whole = hashlib.new(algorithm)
+        block_checksums = []
+        size = 0
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                whole.update(block)
+                block_checksums.append(hashlib.new(algorithm, block).hexdigest())
+                size += len(block)
+        return cls(size, block_size, block_checksums, algorithm, f"{algorithm}:{whole.hexdigest()}", path.name)
+
+    def match_local(self, path: Union[str, Path]) -> Dict[int, int]:
+        """Find blocks of this version in a local file. Blocking.
+
+        The local file is hashed at block boundaries, so blocks changed in place
+        are found wherever they moved to in whole blocks; data shifted by
+        inserted or removed bytes is not matched and has to be fetched.
+
+        Returns:
+            Mapping of block index to the offset of identical data in the local file
+        """
+        wanted: Dict[str, List[int]] = {}
+        for index, digest in enumerate(self.block_checksums):
+            wanted.setdefault(digest, []).append(index)
+
+        matches = {}
+        offset = 0
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(self.block_size)
+                if not block:
+                    break
+                digest = hashlib.new(self.algorithm, block).hexdigest()
+                for index in wanted.pop(digest, []):
+                    matches[index] = offset
+                offset += len(block)
+        return matches
+
+    def dumps(self) -> str:
+        """Serialize the index as a JSON control file."""
+        return json.dumps({
+            "version": self.VERSION,
+            "name": self.name,
+            "size": self.size,
+            "block_size": self.block_size,
+            "algorithm": self.algorithm,
+            "checksum": self.checksum,
+            "blocks": self.block_checksums,
+        })
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the control file."""
+        Path(path).write_text(self.dumps())
+
+    @classmethod
+    def parse(cls, text: Union[str, bytes]) -> "AioDeltaIndex":
+        """Parse a control file.
+
+        Raises:
+            ValueError: If the document is not a valid control file
+        """
+        try:
+            data = json.loads(text)
+            if data.get("version") != cls.VERSION:
+                raise ValueError(f"unsupported version {data.get('version')!r}")
+            index = cls(
+                size=int(data["size"]),
+                block_size=int(data["block_size"]),
+                block_checksums=list(data["blocks"]),
+                algorithm=data.get("algorithm", "sha256"),
+                checksum=data.get("checksum"),
+                name=data.get("name"),
+            )
+            hashlib.new(index.algorithm)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Invalid delta control file: {e}") from e
+        if index.block_size <= 0 or len(index.block_checksums) != -(-index.size // index.block_size):
+            raise ValueError("Invalid delta control file: block count does not match the size")
+        return index
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "AioDeltaIndex":
+        """Read and parse a control file."""
+        return cls.parse(Path(path).read_bytes())
@@ -0,0 +1,365 @@
+"""Concurrency and bandwidth limits for download batches.
+
+AioHostLimiter layers per-host and per-host-pattern caps under the global
+limiter of a batch, so one dominant origin cannot occupy every slot.
+AioAdaptiveLimiter is a concurrency cap that tunes itself (AIMD) from the
+throughput it measures, for batches where no static limit fits every server.
+AioRateLimiter is a token bucket capping bytes per second, shared by every
+download that consults it. AioThroughputWatchdog is the opposite bound: it
+flags a transfer whose throughput collapses below a floor.
+"""
+
+import time
+import fnmatch
+from collections import deque
+from contextlib import asynccontextmanager, AsyncExitStack
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+import anyio
+import httpx
+
+
+class AioHostLimiter:
+    """Per-host and per-host-pattern concurrency caps.
+
+    Usage:
+        host_limiter = AioHostLimiter(max_per_host=2, host_limits={"*.example.com": 4})
+        async with host_limiter.acquire(url):
+            ...
+    """
+
+    def __init__(
+        self,
+        max_per_host: Optional[int] = None,
+        host_limits: Optional[Dict[str, int]] = None,
+        adaptive: bool = False,
+        parent: Optional[Any] = None,
+    ):
+        """Create a host limiter.
+
+        Args:
+            max_per_host: Maximum concurrent operations against any single host (None for unlimited)
+            host_limits: Mapping of fnmatch-style host patterns (e.g. '*.example.com') to a
+                concurrency cap shared by all hosts matching the pattern; the first matching
+                pattern applies
+            adaptive: Whether each host gets an AioAdaptiveLimiter tuning its concurrency
+                between 1 and max_per_host instead of a fixed cap
+            parent: Limiter the adaptive host limiters pass received bytes on to
+        """
+        self._max_per_host = max_per_host
+        self._host_limits = dict(host_limits or {})
+        self._adaptive = adaptive
+        self._parent = parent
+        self._host_limiters: Dict[str, Union[anyio.CapacityLimiter, 'AioAdaptiveLimiter']] = {}
+        self._pattern_limiters = {
+            pattern: anyio.CapacityLimiter(limit) for pattern, limit in self._host_limits.items()
+        }
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        """Return the lowercase host name of a URL ('' if it has none)."""
+        try:
+            return httpx.URL(url).host.lower()
+        except Exception:
+            return ''
+
+    def pattern_for(self, url: str) -> Optional[str]:
+        """Return the host pattern whose cap applies to a URL (None if no pattern matches)."""
+        host = self.host_of(url)
+        if not host:
+            return None
+        return next((pattern for pattern in self._host_limits if fnmatch.fnmatch(host, pattern.lower())), None)
+
+    def limiters_for(self, url: str) -> List[Union[anyio.CapacityLimiter, 'AioAdaptiveLimiter']]:
+        """Return the limiters that apply to a URL, in acquisition order."""
+        host = self.host_of(url)
+        if not host:
+            return []
+
+        limiters = []
+        pattern = self.pattern_for(url)
+        if pattern is not None:
+            limiters.append(self._pattern_limiters[pattern])
+        if self._max_per_host:
+            if host not in self._host_limiters:
+                if self._adaptive:
+                    self._host_limiters[host] = AioAdaptiveLimiter(self._max_per_host, parent=self._parent)
+                else:
+                    self._host_limiters[host] = anyio.CapacityLimiter(self._max_per_host)
+            limiters.append(self._host_limiters[host])
+        return limiters
+
+    def adaptive_for(self, url: str) -> Optional['AioAdaptiveLimiter']:
+        """Return the adaptive limiter of a URL's host (None unless adaptive)."""
+        limiters = self.limiters_for(url) if self._adaptive else []
+        return limiters[-1] if limiters and isinstance(limiters[-1], AioAdaptiveLimiter) else None
+
+    def has_capacity(self, url: str) -> bool:
+        """Return whether every limiter that applies to the URL has a free slot.
+
+        A hint for schedulers: no slot is reserved, so acquire() may still wait
+        if another task takes the slot first.
+        """
+        for limiter in self.limiters_for(url):
+            if isinstance(limiter, AioAdaptiveLimiter):
+                if limiter.in_use >= limiter.limit:
+                    return False
+            elif limiter.borrowed_tokens >= limiter.total_tokens:
+                return False
+        return True
+
+    @asynccontextmanager
+    async def acquire(self, url: str) -> AsyncIterator[None]:
+        """Hold a slot of every limiter that applies to the URL."""
+        async with AsyncExitStack() as stack:
+            for limiter in self.limiters_for(url):
+                await stack.enter_async_context(limiter)
+            yield
+
+
+class AioAdaptiveLimiter:
+    """Concurrency cap tuned by additive increase, multiplicative decrease.
+
+    Download loops call consume() with the size of every received chunk, just
+    as with AioRateLimiter (which it can stand in for, passing bytes on to its
+    parent). At the end of every interval in which all slots were in use, the
+    throughput of the interval is compared with the one before: if it
+    improved, one more slot opens; if it dropped below tolerance times the
+    previous one, the limit is multiplied by backoff. record_error() backs
+    off as well, at most once per interval, for throttling responses and
+    failed transfers. Running operations are never interrupted: a lowered
+    limit only holds back the next ones.
+
+    Usage:
+        limiter = AioAdaptiveLimiter(max_limit=32)
+        async with limiter:
+            async for chunk in response.aiter_bytes():
+                await limiter.consume(len(chunk))
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial: Optional[int] = None,
+        interval: float = 1.0,
+        backoff: float = 0.5,
+        tolerance: float = 0.8,
+        parent: Optional[Any] = None,
+    ):
+        """Create an adaptive limiter.
+
+        Args:
+            max_limit: Highest concurrency the limiter opens up to
+            min_limit: Lowest concurrency it backs off to
+            initial: Starting concurrency (defaults to 2, within the bounds)
+            interval: Seconds of transfer over which each throughput sample is taken
+            backoff: Factor applied to the limit on errors and throughput drops
+            tolerance: Fraction of the previous throughput below which a sample counts as a drop
+            parent: Limiter that is consulted as well, e.g. the batch's AioRateLimiter
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.interval = interval
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self._parent = parent
+        start = initial if initial is not None else 2
+        self._limiter = anyio.CapacityLimiter(max(self.min_limit, min(self.max_limit, start)))
+        self._bytes = 0
+        self._started = time.monotonic()
+        self._last_rate: Optional[float] = None
+        self._last_backoff = float('-inf')
+
+    def __repr__(self) -> str:
+        return f"AioAdaptiveLimiter(limit={self.limit}, in_use={self.in_use}, max_limit={self.max_limit})"
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(self._limiter.total_tokens)
+
+    @property
+    def in_use(self) -> int:
+        """Number of slots currently held."""
+        return self._limiter.borrowed_tokens
+
+    async def __aenter__(self) -> None:
+        await self._limiter.acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._limiter.release()
+
+    def _set_limit(self, limit: int) -> None:
+        self._limiter.total_tokens = max(self.min_limit, min(self.max_limit, limit))
+
+    def _restart_sample(self, now: float) -> None:
+        self._bytes = 0
+        self._started = now
+
+    def _adjust(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._started
+        if elapsed < self.interval:
+            return
+        rate = self._bytes / elapsed
+        self._restart_sample(now)
+        if self.in_use < self.limit:
+            # Idle slots: the sample says nothing about the limit
+            self._last_rate = None
+            return
+        if self._last_rate is not None:
+            if rate < self._last_rate * self.tolerance:
+                self._back_off(now)
+                return
+            if rate > self._last_rate:
+                self._set_limit(self.limit + 1)
+        self._last_rate = rate
+
+    def _back_off(self, now: float) -> None:
+        self._last_backoff = now
+        self._set_limit(int(self.limit * self.backoff))
+        # The next sample is the new baseline
+        self._last_rate = None
+        self._restart_sample(now)
+
+    def record_error(self) -> None:
+        """Report a throttling response or failed transfer, backing off once per interval."""
+        now = time.monotonic()
+        if now - self._last_backoff >= self.interval:
+            self._back_off(now)
+
+    async def consume(self, amount: int) -> None:
+        """Record amount received bytes and pass them on to the parent."""
+        self._bytes += amount
+        self._adjust()
+        if self._parent is not None:
+            await self._parent.consume(amount)
+
+
+class AioRateLimiter:
+    """Token bucket limiting throughput in bytes per second.
+
+    Download loops call consume() with the size of every received chunk; when
+    the bucket runs dry the caller sleeps, which stops reading from the socket
+    and lets TCP flow control slow the sender down.
+
+    Usage:
+        total = AioRateLimiter(10 * 1024 * 1024)                # shared by a batch
+        single = AioRateLimiter(2 * 1024 * 1024, parent=total)  # one download
+        await single.consume(len(chunk))
+        total.rate = 5 * 1024 * 1024                            # adjust at runtime
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        burst: Optional[float] = None,
+        parent: Optional['AioRateLimiter'] = None,
+    ):
+        """Create a token bucket.
+
+        Args:
+            rate: Maximum bytes per second (None or 0 for unlimited)
+            burst: Bucket capacity in bytes (defaults to one second worth of rate)
+            parent: Limiter that is consulted as well, e.g. an aggregate limit of a batch
+        """
+        self._rate = rate or None
+        self._burst = burst
+        self._parent = parent
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    @property
+    def burst(self) -> float:
+        if self._burst is not None:
+            return self._burst
+        return self._rate or 0.0
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Maximum bytes per second (None for unlimited)."""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: Optional[float]) -> None:
+        self._refill()
+        self._rate = rate or None
+        self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self._rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def consume(self, amount: int) -> None:
+        """Take amount bytes from the bucket, sleeping while it is in debt."""
+        if self._rate:
+            self._refill()
+            # Going into debt keeps chunks larger than the burst size working;
+            # concurrent consumers each wait for their share of the debt
+            self._tokens -= amount
+            if self._tokens < 0:
+                await anyio.sleep(-self._tokens / self._rate)
+        if self._parent is not None:
+            await self._parent.consume(amount)
+
+
+class AioSlowTransferError(httpx.TransportError):
+    """Raised when a transfer stays below its minimum throughput.
+
+    A transport error, so retry policies and mirror failover treat it like a
+    dropped connection.
+    """
+
+
+class AioThroughputWatchdog:
+    """Detects transfers whose throughput collapses below a minimum rate.
+
+    Download loops call update() with the size of every received chunk; once a
+    full window has elapsed, a window with fewer than min_rate * window bytes
+    raises AioSlowTransferError. Connections that stall completely deliver no
+    chunks at all and are left to the client's read timeout.
+
+    Usage:
+        watchdog = AioThroughputWatchdog(min_rate=100 * 1024, window=10)
+        async for chunk in response.aiter_bytes():
+            watchdog.update(len(chunk))
+    """
+
+    def __init__(self, min_rate: float, window: float = 10.0):
+        """Create a watchdog.
+
+        Args:
+            min_rate: Minimum acceptable throughput in bytes per second
+            window: Length of the sliding measurement window in seconds
+        """
+        self.min_rate = min_rate
+        self.window = window
+        self._samples: deque = deque()
+        self._bytes = 0
+        self._started = time.monotonic()
+
+    def reset(self) -> None:
+        """Start a new measurement, e.g. when a new response starts streaming."""
+        self._samples.clear()
+        self._bytes = 0
+        self._started = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """Throughput over the current window in bytes per second."""
+        elapsed = min(self.window, time.monotonic() - self._started)
+        return self._bytes / elapsed if elapsed > 0 else 0.0
+
+    def update(self, amount: int) -> None:
+        """Record received bytes, raising AioSlowTransferError if the window is too slow."""
+        now = time.monotonic()
+        self._samples.append((now, amount))
+        self._bytes += amount
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._bytes -= self._samples.popleft()[1]
+        if now - self._started >= self.window and self._bytes < self.min_rate * self.window:
+            raise AioSlowTransferError(
+                f"Throughput {self._bytes / self.window:.0f} B/s below minimum of {self.min_rate:.0f} B/s"
+            )
@@ -0,0 +1,194 @@
+"""Metalink documents describing a file available from several mirrors.
+
+Both Metalink 4 (RFC 5854, '.meta4') and the older Metalink 3 ('.metalink')
+formats are read. Each file entry yields its mirror URLs ordered by priority,
+its size, a whole-file digest and optional per-piece digests, in the
+'algorithm:hexdigest' form used by AioUtils checksums.
+"""
+
+import hashlib
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import List, Optional, Union
+
+
+class AioMetalinkFile:
+    """One file entry of a Metalink document."""
+
+    def __init__(
+        self,
+        name: str,
+        urls: List[str],
+        size: Optional[int] = None,
+        checksum: Optional[str] = None,
+        piece_size: Optional[int] = None,
+        piece_checksums: Optional[List[str]] = None,
+    ):
+        """Create a file entry.
+
+        Args:
+            name: File name given by the document
+            urls: Mirror URLs, most preferred first
+            size: File size in bytes, if given
+            checksum: Whole-file digest as 'algorithm:hexdigest', if given
+            piece_size: Length of each piece in bytes (the last piece may be shorter)
+            piece_checksums: Digest of every piece as 'algorithm:hexdigest', in file order
+        """
+        self.name = name
+        self.urls = urls
+        self.size = size
+        self.checksum = checksum
+        self.piece_size = piece_size
+        self.piece_checksums = piece_checksums or []
+
+    def __repr__(self) -> str:
+        return f"AioMetalinkFile(name={self.name!r}, urls={len(self.urls)}, size={self.size})"
+
+
+class AioMetalink:
+    """Parsed Metalink document.
+
+    Usage:
+        metalink = AioMetalink.load("ubuntu.iso.meta4")
+        entry = metalink.find("ubuntu.iso")
+        await AioUtils.download_file(entry.urls, dest, multi_source=True, metalink=entry)
+    """
+
+    NS4 = "urn:ietf:params:xml:ns:metalink"
+    NS3 = "http://www.metalinker.org/"
+    # Strongest first; names are hashlib names ('sha-256' in Metalink becomes 'sha256')
+    HASH_PREFERENCE = ("sha512", "sha384", "sha256", "sha224", "sha1", "md5")
+
+    def __init__(self, files: List[AioMetalinkFile]):
+        self.files = files
+
+    @staticmethod
+    def _hash_name(metalink_type: str) -> Optional[str]:
+        """Map a Metalink hash type to a hashlib algorithm name (None if unsupported)."""
+        name = (metalink_type or "").lower().replace("-", "")
+        return name if name in hashlib.algorithms_available else None
+
+    @staticmethod
+    def _piece_checksums(name: str, hash_nodes: List[ET.Element], file_name: str) -> List[str]:
+        """Turn the <hash> elements of a <pieces> list into 'algorithm:hexdigest' checksums."""
+        checksums = []
+        for index, node in enumerate(hash_nodes):
+            digest = (node.text or "").strip().lower()
+            if not digest:
+                raise ValueError(f"Empty piece hash {index} of '{file_name}'")
+            checksums.append(f"{name}:{digest}")
+        return checksums
+
+    @classmethod
+    def _pick_hash(cls, hashes: dict) -> Optional[str]:
+        for name in cls.HASH_PREFERENCE:
+            if name in hashes:
+                return f"{name}:{hashes[name].strip().lower()}"
+        for name, value in hashes.items():
+            return f"{name}:{value.strip().lower()}"
+        return None
+
+    @classmethod
+    def parse(cls, text: Union[str, bytes]) -> "AioMetalink":
+        """Parse a Metalink 4 or Metalink 3 document.
+
+        Raises:
+            ValueError: If the document is not valid Metalink XML or has an empty piece hash
+        """
+        try:
+            root = ET.fromstring(text)
+        except ET.ParseError as e:
+            raise ValueError(f"Invalid Metalink document: {e}") from e
+
+        if root.tag == f"{{{cls.NS4}}}metalink":
+            return cls(cls._parse_v4(root))
+        if root.tag == f"{{{cls.NS3}}}metalink":
+            return cls(cls._parse_v3(root))
+        raise ValueError(f"Not a Metalink document (root element {root.tag})")
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "AioMetalink":
+        """Read and parse a Metalink file."""
+        return cls.parse(Path(path).read_bytes())
+
+    @classmethod
+    def _parse_v4(cls, root: ET.Element) -> List[AioMetalinkFile]:
+        ns = {"m": cls.NS4}
+        files = []
+        for node in root.findall("m:file", ns):
+            urls = sorted(
+                node.findall("m:url", ns),
+                # Lower priority values are preferred; unprioritized URLs come last
+                key=lambda url: int(url.get("priority", 999999)),
+            )
+            hashes = {}
+            for hash_node in node.findall("m:hash", ns):
+                name = cls._hash_name(hash_node.get("type"))
+                if name and hash_node.text:
+                    hashes[name] = hash_node.text
+
+            piece_size, piece_checksums = None, []
+            for pieces in node.findall("m:pieces", ns):
+                name = cls._hash_name(pieces.get("type"))
+                if name:
+                    piece_size = int(pieces.get("length"))
+                    piece_checksums = cls._piece_checksums(name, pieces.findall("m:hash", ns), node.get("name", ""))
+                    break
+
+            size = node.findtext("m:size", namespaces=ns)
+            files.append(AioMetalinkFile(
+                name=node.get("name", ""),
+                urls=[url.text.strip() for url in urls if url.text],
+                size=int(size) if size else None,
+                checksum=cls._pick_hash(hashes),
+                piece_size=piece_size,
+                piece_checksums=piece_checksums,
+            ))
+        return files
+
+    @classmethod
+    def _parse_v3(cls, root: ET.Element) -> List[AioMetalinkFile]:
+        ns = {"m": cls.NS3}
+        files = []
+        for node in root.findall("m:files/m:file", ns):
+            urls = sorted(
+                (url for url in node.findall("m:resources/m:url", ns) if url.get("type", "http") in ("http", "https", "ftp")),
+                # Higher preference values are preferred
+                key=lambda url: -int(url.get("preference", 0)),
+            )
+            hashes = {}
+            for hash_node in node.findall("m:verification/m:hash", ns):
+                name = cls._hash_name(hash_node.get("type"))
+                if name and hash_node.text:
+                    hashes[name] = hash_node.text
+
+            piece_size, piece_checksums = None, []
+            for pieces in node.findall("m:verification/m:pieces", ns):
+                name = cls._hash_name(pieces.get("type"))
+                if name:
+                    piece_size = int(pieces.get("length"))
+                    ordered = sorted(pieces.findall("m:hash", ns), key=lambda h: int(h.get("piece", 0)))
+                    piece_checksums = cls._piece_checksums(name, ordered, node.get("name", ""))
+                    break
+
+            size = node.findtext("m:size", namespaces=ns)
+            files.append(AioMetalinkFile(
+                name=node.get("name", ""),
+                urls=[url.text.strip() for url in urls if url.text],
+                size=int(size) if size else None,
+                checksum=cls._pick_hash(hashes),
+                piece_size=piece_size,
+                piece_checksums=piece_checksums,
+            ))
+        return files
+
+    def find(self, name: Optional[str] = None) -> AioMetalinkFile:
+        """Return the file entry with the given name (or the only/first entry if name is None).
+
+        Raises:
+            KeyError: If no entry matches
+        """
+        for entry in self.files:
+            if name is None or entry.name == name or Path(entry.name).name == name:
+                return entry
+        raise KeyError(f"No file named {name!r} in Metalink document")
@@ -0,0 +1,50 @@
+"""Outcome of one download of a batch."""
+
+from pathlib import Path
+from typing import Any, Optional
+
+
+class AioDownloadResult:
+    """Outcome of one entry of a download batch, as reported on completion.
+
+    Usage:
+        async with AioUtils.download_files_iter(downloads) as results:
+            async for result in results:
+                if result.success:
+                    await process(result.path)
+    """
+
+    def __init__(
+        self,
+        index: int,
+        url: Any,
+        path: Path,
+        success: bool,
+        size: Optional[int] = None,
+        duration: float = 0.0,
+        error: Optional[str] = None,
+    ):
+        """Create a result.
+
+        Args:
+            index: Position of the entry in the batch input
+            url: URL of the entry as given (a mirror list, AioMetalinkFile or local path included)
+            path: Destination file path
+            success: Whether the file is in place
+            size: Size of the file in bytes (None if unknown or failed)
+            duration: Seconds spent downloading (or linking) the file, queueing excluded
+            error: Error message of a failed download
+        """
+        self.index = index
+        self.url = url
+        self.path = path
+        self.success = success
+        self.size = size
+        self.duration = duration
+        self.error = error
+
+    def __repr__(self) -> str:
+        return (
+            f"AioDownloadResult(index={self.index}, path={str(self.path)!r}, success={self.success}, "
+            f"size={self.size}, duration={self.duration:.3f}, error={self.error!r})"
+        )
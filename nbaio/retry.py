@@ -0,0 +1,96 @@
+"""Retry policy for downloads.
+
+AioRetryPolicy decides whether a failed attempt is worth repeating and how
+long to wait first: exponential backoff with full jitter, or the server's
+Retry-After header when it sends one.
+"""
+
+import random
+import email.utils
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple, Type
+import httpx
+
+
+class AioRetryPolicy:
+    """Retry policy with exponential backoff, jitter and Retry-After support.
+
+    Usage:
+        retry = AioRetryPolicy(max_attempts=5)
+        await AioUtils.download_file(url, dest, retry=retry)
+    """
+
+    DEFAULT_RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+    DEFAULT_RETRY_EXCEPTIONS: Tuple[Type[BaseException], ...] = (httpx.TransportError,)
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        jitter: bool = True,
+        retry_statuses: Optional[Iterable[int]] = None,
+        retry_exceptions: Optional[Tuple[Type[BaseException], ...]] = None,
+        respect_retry_after: bool = True,
+        max_retry_after: float = 300.0,
+    ):
+        """Create a retry policy.
+
+        Args:
+            max_attempts: Total number of attempts including the first one
+            backoff_base: Delay before the first retry in seconds, doubled for every further retry
+            backoff_max: Upper bound of the backoff delay in seconds
+            jitter: Whether to randomize delays between 0 and the backoff ("full jitter")
+            retry_statuses: HTTP status codes worth retrying (default: 408, 425, 429, 5xx gateway errors)
+            retry_exceptions: Exception types worth retrying (default: httpx.TransportError,
+                i.e. connection errors, resets and timeouts)
+            respect_retry_after: Whether to wait as long as a Retry-After header asks
+            max_retry_after: Upper bound for Retry-After delays in seconds
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses) if retry_statuses is not None else self.DEFAULT_RETRY_STATUSES
+        self.retry_exceptions = retry_exceptions if retry_exceptions is not None else self.DEFAULT_RETRY_EXCEPTIONS
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Whether an error is transient and worth another attempt."""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in self.retry_statuses
+        return isinstance(error, self.retry_exceptions)
+
+    def should_retry(self, attempt: int, error: BaseException) -> bool:
+        """Whether to make another attempt after the given (1-based) attempt failed."""
+        return attempt < self.max_attempts and self.is_retryable(error)
+
+    @staticmethod
+    def retry_after(error: BaseException) -> Optional[float]:
+        """Return the Retry-After delay in seconds carried by an HTTP error, if any."""
+        if not isinstance(error, httpx.HTTPStatusError):
+            return None
+        value = error.response.headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    def delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Return the number of seconds to wait after the given (1-based) attempt failed."""
+        if self.respect_retry_after and error is not None:
+            retry_after = self.retry_after(error)
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        backoff = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, backoff) if self.jitter else backoff
@@ -1,5 +1,6 @@
+import time
 import typing
-from typing import Optional, Union
+from typing import Dict, Optional, Union
 from rich.console import Console
 from rich.progress import (
     Progress,
@@ -45,4 +46,142 @@ class AioUi:
             console=self._console,
         ) if ui_enabled else nullcontext()
 
+class AioProgressThrottle:
+    """Accumulates progress advances and flushes them to a rich Progress at a bounded rate.
+
+    Download loops report every received chunk; forwarding each one would take
+    rich's lock thousands of times per second per download. Advances are summed
+    per task instead and handed to Progress.update at most once per interval
+    (or sooner once max_pending bytes piled up). One throttle can serve all
+    tasks of a batch.
+
+    Usage:
+        throttle = AioProgressThrottle(progress, interval=0.1)
+        throttle.advance(task_id, len(chunk))
+        throttle.flush()   # when the download is done
+    """
+
+    def __init__(
+        self,
+        progress: Progress,
+        interval: float = 0.1,
+        max_pending: Optional[int] = None,
+        total_task_id=None,
+    ):
+        """Create a throttle.
+
+        Args:
+            progress: Rich Progress instance receiving the updates
+            interval: Minimum seconds between two flushes
+            max_pending: Flush early once this many bytes are pending (None for time-based only)
+            total_task_id: Task that every advance of another task also counts toward,
+                e.g. the total of a batch
+        """
+        self._progress = progress
+        self._interval = interval
+        self._max_pending = max_pending
+        self._total_task_id = total_task_id
+        self._pending: Dict[int, int] = {}
+        self._pending_bytes = 0
+        self._flushed = time.monotonic()
+        self.total_advanced = 0
+
+    def advance(self, task_id, amount: int) -> None:
+        """Record progress of a task, flushing if the interval has passed."""
+        self._pending[task_id] = self._pending.get(task_id, 0) + amount
+        if self._total_task_id is not None and task_id != self._total_task_id:
+            self._pending[self._total_task_id] = self._pending.get(self._total_task_id, 0) + amount
+            self.total_advanced += amount
+        self._pending_bytes += abs(amount)
+        if (self._max_pending is not None and self._pending_bytes >= self._max_pending) \
+                or time.monotonic() - self._flushed >= self._interval:
+            self.flush()
+
+    def flush(self, task_id=None) -> None:
+        """Hand pending advances to the Progress (only those of task_id if given)."""
+        if task_id is not None:
+            amount = self._pending.pop(task_id, 0)
+            self._pending_bytes = max(0, self._pending_bytes - abs(amount))
+            if amount:
+                self._progress.update(task_id, advance=amount)
+            return
+        pending, self._pending = self._pending, {}
+        self._pending_bytes = 0
+        self._flushed = time.monotonic()
+        for pending_task, amount in pending.items():
+            if amount:
+                self._progress.update(pending_task, advance=amount)
+
+class AioQueueProgress:
+    """Progress stand-in that forwards task calls as messages to another process."""
+
+    def __init__(self, queue, shard: int):
+        self._queue = queue
+        self._shard = shard
+        self._next_task_id = 0
+
+    def add_task(self, description: str, total: Optional[float] = None, **fields) -> int:
+        task_id = self._next_task_id
+        self._next_task_id += 1
+        self._queue.put(('add_task', self._shard, task_id, description, total, fields))
+        return task_id
+
+    def update(self, task_id: int, **kwargs) -> None:
+        self._queue.put(('update', self._shard, task_id, kwargs))
+
+    def remove_task(self, task_id: int) -> None:
+        self._queue.put(('remove_task', self._shard, task_id))
+
+
+class AioQueueUi(AioUi):
+    """AioUi of a worker process that draws in its parent's AioUi instead.
+
+    Prints and progress bars are sent as messages over a multiprocessing
+    queue; the parent replays them with AioQueueUi.replay. Progress advances
+    should reach it through an AioProgressThrottle, which bounds the message
+    rate to one per task and interval.
+    """
+
+    def __init__(self, queue, shard: int = 0):
+        super().__init__()
+        self._queue = queue
+        self._shard = shard
+
+    def status(self, message: str, ui_enabled: bool = True):
+        return nullcontext()
+
+    def print(self, *args, **kwargs):
+        self._queue.put(('print', self._shard, args, kwargs))
+
+    def progress(self, ui_enabled: bool = True) -> Union[AioQueueProgress, nullcontext]:
+        return nullcontext(AioQueueProgress(self._queue, self._shard)) if ui_enabled else nullcontext()
+
+    @staticmethod
+    def replay(message: tuple, ui: AioUi, progress: Optional[Progress], task_ids: Dict[tuple, int]) -> None:
+        """Apply a UI message of a worker to the parent's ui and progress.
+
+        Args:
+            message: Message as sent by AioQueueUi or AioQueueProgress
+            ui: Parent's AioUi
+            progress: Parent's Progress (None to drop progress messages)
+            task_ids: Mapping of (shard, worker task id) to parent task ids, filled in as tasks are added
+        """
+        kind, shard, *payload = message
+        if kind == 'print':
+            args, kwargs = payload
+            ui.print(*args, **kwargs)
+        elif progress is None:
+            return
+        elif kind == 'add_task':
+            task_id, description, total, fields = payload
+            task_ids[(shard, task_id)] = progress.add_task(description, total=total, **fields)
+        elif kind == 'update':
+            task_id, kwargs = payload
+            if (shard, task_id) in task_ids:
+                progress.update(task_ids[(shard, task_id)], **kwargs)
+        elif kind == 'remove_task':
+            task_id, = payload
+            if (shard, task_id) in task_ids:
+                progress.remove_task(task_ids.pop((shard, task_id)))
+
 global_ui = AioUi()
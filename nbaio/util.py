@@ -3,6 +3,7 @@
 This module provides the AioUtils class with static methods for:
 - Downloading files with progress bars
 - Parallel downloading
+- Downloading into memory or as a byte stream
 - ZIP/tar extraction
 - Running subprocess commands asynchronously
 
@@ -15,168 +16,2920 @@ import os
 import shutil
 import zipfile
 import tarfile
+import gzip
+import bz2
+import lzma
+import tempfile
+import importlib.util
+import json
+import hashlib
+import secrets
+import time
+import email.utils
+import urllib.parse
+import urllib.request
+import multiprocessing
+import queue
+from collections import deque
 from pathlib import Path
-from typing import Optional, List, Callable
-from contextlib import nullcontext
+from typing import Optional, List, Callable, Awaitable, Sequence, Iterable, Iterator, AsyncIterable, AsyncIterator, Any
+from contextlib import nullcontext, contextmanager, asynccontextmanager
 import anyio
 import httpx
 from rich.progress import Progress
-from .ui import AioUi, global_ui
+from .ui import AioUi, AioQueueUi, AioProgressThrottle, global_ui
+from .cache import AioDownloadCache
+from .writer import AioFileWriter, AioBytePipe
+from .limits import AioHostLimiter, AioAdaptiveLimiter, AioRateLimiter, AioThroughputWatchdog
+from .retry import AioRetryPolicy
+from .metalink import AioMetalink, AioMetalinkFile
+from .delta import AioDeltaIndex
+from .result import AioDownloadResult
 
 
 class AioUtils:
     """Utility class for asynchronous operations using anyio."""
 
+    # ============================================================================
+    # HTTP CLIENT
+    # ============================================================================
+
+    @staticmethod
+    def create_http_client(
+        verify_ssl: bool = True,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = 5.0,
+        http2: bool = False,
+        timeout: float = 3600.0,
+        connect_timeout: Optional[float] = 30.0,
+        read_timeout: Optional[float] = 60.0,
+        pool_timeout: Optional[float] = None,
+    ) -> httpx.AsyncClient:
+        """Create a pooled HTTP client that can be shared by many downloads.
+        
+        The read timeout bounds the silence between two reads, not a whole
+        transfer; a minimum throughput (see AioThroughputWatchdog) catches
+        connections that trickle instead of stalling.
+        
+        Args:
+            verify_ssl: Whether to verify SSL certificates
+            max_connections: Maximum open connections (None uses httpx default of 100)
+            max_keepalive_connections: Maximum idle connections kept alive (None uses httpx default of 20)
+            keepalive_expiry: Seconds an idle connection is kept in the pool
+            http2: Whether to enable HTTP/2 multiplexing (requires the optional 'h2' package,
+                falls back to HTTP/1.1 when it is not installed)
+            timeout: Default timeout in seconds of every phase not given below (and of writes)
+            connect_timeout: Seconds to establish a connection (None uses timeout)
+            read_timeout: Seconds to wait for the next chunk of a response (None uses timeout)
+            pool_timeout: Seconds to wait for a free pooled connection (None uses timeout)
+            
+        Returns:
+            httpx.AsyncClient instance, to be used as an async context manager
+        """
+        limits = httpx.Limits(
+            max_connections=max_connections if max_connections is not None else 100,
+            max_keepalive_connections=max_keepalive_connections if max_keepalive_connections is not None else 20,
+            keepalive_expiry=keepalive_expiry,
+        )
+        timeouts = httpx.Timeout(
+            timeout,
+            connect=connect_timeout if connect_timeout is not None else timeout,
+            read=read_timeout if read_timeout is not None else timeout,
+            pool=pool_timeout if pool_timeout is not None else timeout,
+        )
+        return httpx.AsyncClient(
+            verify=verify_ssl,
+            timeout=timeouts,
+            limits=limits,
+            http2=http2 and importlib.util.find_spec("h2") is not None,
+        )
+
     # ============================================================================
     # DOWNLOAD
     # ============================================================================
 
     @staticmethod
-    async def _download_core(
+    def _part_paths(dest_path: Path) -> tuple[Path, Path]:
+        """Return the (partial data, metadata) sidecar paths of a resumable download."""
+        dest_path = Path(dest_path)
+        return (
+            dest_path.with_name(dest_path.name + '.part'),
+            dest_path.with_name(dest_path.name + '.part.json'),
+        )
+
+    @staticmethod
+    def _read_part_meta(meta_path: Path) -> Optional[dict]:
+        """Read resumable download metadata, returning None if missing or unreadable."""
+        try:
+            return json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_part_meta(meta_path: Path, meta: dict) -> None:
+        """Write resumable download metadata next to the partial file."""
+        meta_path.write_text(json.dumps(meta))
+
+    @staticmethod
+    def _if_range_validator(meta: dict) -> Optional[str]:
+        """Pick the validator for an If-Range header (weak ETags are not allowed there)."""
+        etag = meta.get('etag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return meta.get('last_modified')
+
+    @staticmethod
+    def _check_partial_response(response: httpx.Response) -> None:
+        """Make sure a Range request got an unencoded 206 Partial Content response.
+        
+        Raises:
+            ValueError: If the range was ignored, or the body carries a Content-Encoding
+                (its decoded bytes would not line up with the requested offsets)
+        """
+        if response.status_code != 206:
+            raise ValueError(f"Server ignored Range request (status {response.status_code})")
+        encoding = response.headers.get('content-encoding', 'identity').lower()
+        if encoding != 'identity':
+            raise ValueError(f"Range response has Content-Encoding '{encoding}'")
+
+    @staticmethod
+    async def _with_failover(
+        sources: Sequence[str],
+        attempt: Callable[[str], Awaitable[Any]],
+        retry: Optional[AioRetryPolicy] = None,
+        fatal: tuple = (),
+    ) -> Any:
+        """Await attempt(source) until it succeeds, failing over through the mirrors.
+        
+        A failed attempt moves on to the next mirror at once; only once every
+        mirror has failed in a row is the retry policy asked, backing off
+        before the next round.
+        
+        Args:
+            sources: Ordered mirror URLs, tried starting with the first
+            attempt: Coroutine function making one attempt against a mirror
+            retry: Retry policy consulted after each failed round (None gives up)
+            fatal: Exception types raised at once, without failing over (e.g. disk errors)
+            
+        Returns:
+            The result of the first successful attempt
+            
+        Raises:
+            Exception: The error of the last attempt once the retry policy gives up
+        """
+        attempt_number = 1
+        mirror = 0
+        failed_mirrors = 0
+        while True:
+            try:
+                return await attempt(sources[mirror])
+            except fatal:
+                raise
+            except Exception as e:
+                mirror = (mirror + 1) % len(sources)
+                failed_mirrors += 1
+                if failed_mirrors < len(sources):
+                    continue
+                if retry is None or not retry.should_retry(attempt_number, e):
+                    raise
+                failed_mirrors = 0
+                await anyio.sleep(retry.delay(attempt_number, e))
+                attempt_number += 1
+
+    @staticmethod
+    async def _meter_chunk(
+        size: int,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        watchdog: Optional[AioThroughputWatchdog] = None,
+    ) -> None:
+        """Account for a received chunk: watchdog, progress and bandwidth limit.
+        
+        The watchdog comes first, so a chunk of an abandoned transfer is neither
+        reported nor charged; callers count it as received only afterwards.
+        
+        Raises:
+            AioSlowTransferError: If the transfer has fallen below its minimum throughput
+        """
+        if watchdog:
+            watchdog.update(size)
+        if progress_callback:
+            progress_callback(size)
+        if rate_limiter:
+            await rate_limiter.consume(size)
+
+    @staticmethod
+    def _parse_checksum(checksum: str) -> tuple[str, str]:
+        """Split an 'algorithm:hexdigest' (or 'algorithm=hexdigest') checksum string.
+        
+        Raises:
+            ValueError: If the string is malformed or the algorithm is not supported by hashlib
+        """
+        separator = ':' if ':' in checksum else '='
+        algorithm, _, expected = checksum.partition(separator)
+        algorithm = algorithm.strip().lower()
+        if not algorithm or not expected:
+            raise ValueError(f"Invalid checksum '{checksum}', expected 'algorithm:hexdigest'")
+        hashlib.new(algorithm)
+        return algorithm, expected.strip().lower()
+
+    @staticmethod
+    def _hash_file(file_path: Path, hasher, limit: Optional[int] = None) -> None:
+        """Feed a file (or its first limit bytes) into a hashlib object. Blocking."""
+        remaining = limit
+        with open(file_path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                block = f.read(1024 * 1024 if remaining is None else min(1024 * 1024, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                if remaining is not None:
+                    remaining -= len(block)
+
+    @staticmethod
+    def _verify_digest(hasher, expected: str) -> None:
+        """Raise ValueError if a hashlib object does not match the expected hex digest."""
+        actual = hasher.hexdigest()
+        if actual != expected:
+            raise ValueError(f"Checksum mismatch ({hasher.name}): expected {expected}, got {actual}")
+
+    @staticmethod
+    def _temp_path(dest_path: Path) -> Path:
+        """Create an empty, uniquely named temp file next to dest_path.
+        
+        Downloads are written there and renamed over dest_path once complete,
+        so an existing good copy survives until the new one is whole.
+        """
+        while True:
+            temp_path = dest_path.with_name(f'.{dest_path.name}.{secrets.token_hex(4)}.tmp')
+            try:
+                with open(temp_path, 'xb'):
+                    return temp_path
+            except FileExistsError:
+                continue
+
+    @staticmethod
+    @contextmanager
+    def _cleanup_partial(*paths: Path, keep: bool = False) -> Iterator[None]:
+        """Remove the partial files of a download that fails or is cancelled.
+        
+        Covers cancellation (e.g. by a batch deadline) as well as errors, so no
+        temp file is left behind either way. Files renamed into place are gone
+        by then and are not touched.
+        
+        Args:
+            paths: Temp, '.part' and metadata files of the download
+            keep: Whether to keep them, e.g. to resume the download later
+        """
+        try:
+            yield
+        except BaseException:
+            if not keep:
+                for path in paths:
+                    path.unlink(missing_ok=True)
+            raise
+
+    ETAG_XATTR = 'user.nbaio.etag'
+
+    @staticmethod
+    def _record_validators(dest_path: Path, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """Stamp a downloaded file with its remote validators.
+        
+        The modification time is set to Last-Modified and the ETag is kept in an
+        extended attribute where the file system supports it.
+        """
+        if last_modified:
+            try:
+                timestamp = email.utils.parsedate_to_datetime(last_modified).timestamp()
+                os.utime(dest_path, (timestamp, timestamp))
+            except (TypeError, ValueError, OSError):
+                pass
+        if etag:
+            try:
+                os.setxattr(dest_path, AioUtils.ETAG_XATTR, etag.encode('utf-8'))
+            except (AttributeError, OSError):
+                pass
+
+    @staticmethod
+    def _local_validators(dest_path: Path) -> tuple[Optional[str], str]:
+        """Return the (etag, last_modified) a file was stamped with by _record_validators."""
+        try:
+            etag = os.getxattr(dest_path, AioUtils.ETAG_XATTR).decode('utf-8')
+        except (AttributeError, OSError):
+            etag = None
+        return etag, email.utils.formatdate(dest_path.stat().st_mtime, usegmt=True)
+
+    @staticmethod
+    def _check_skip_policy(skip_existing: Optional[str], decompress: bool) -> None:
+        """Refuse skip policies that can never match what a download leaves on disk.
+        
+        Raises:
+            ValueError: If 'size' or 'checksum' is combined with decompress; both describe
+                the compressed file, while the decompressed one is kept
+        """
+        if decompress and skip_existing in ('size', 'checksum'):
+            raise ValueError(f"skip_existing='{skip_existing}' cannot be combined with decompress")
+
+    @staticmethod
+    async def _is_up_to_date(
+        url: Union[str, Sequence[str]],
+        dest_path: Path,
+        policy: str,
+        client: httpx.AsyncClient,
+        expected_size: Optional[int] = None,
+        checksum: Optional[str] = None,
+    ) -> bool:
+        """Check whether an existing file can be kept instead of downloading it again.
+        
+        Local sources are compared with dest_path directly: 'size' compares the
+        sizes and 'validators' also requires dest_path to be no older than the source.
+        
+        Args:
+            url: URL (or mirror list, the first mirror is asked) of the file
+            dest_path: Existing destination file
+            policy: 'size' (expected_size or the remote Content-Length), 'checksum'
+                (local digest, no request) or 'validators' (conditional HEAD against
+                the validators stamped on the file when it was downloaded)
+            client: HTTP client for the remote checks
+            expected_size: Known file size, saves the request of the 'size' policy
+            checksum: Expected digest as 'algorithm:hexdigest' for the 'checksum' policy
+            
+        Returns:
+            True if the file is up to date; any failed check means it is not
+        """
+        if policy not in ('size', 'checksum', 'validators'):
+            raise ValueError(f"Unknown skip policy: {policy}")
+        if not dest_path.is_file():
+            return False
+        try:
+            source = AioUtils._local_source(url)
+            if source is not None and policy != 'checksum':
+                # Local copies carry the modification time of their source
+                source_stat, dest_stat = source.stat(), dest_path.stat()
+                if policy == 'size':
+                    return dest_stat.st_size == source_stat.st_size
+                return dest_stat.st_size == source_stat.st_size and dest_stat.st_mtime_ns >= source_stat.st_mtime_ns
+            
+            url = AioUtils._mirror_list(url)[0]
+            
+            if policy == 'checksum':
+                if not checksum:
+                    return False
+                algorithm, expected_digest = AioUtils._parse_checksum(checksum)
+                hasher = hashlib.new(algorithm)
+                await anyio.to_thread.run_sync(AioUtils._hash_file, dest_path, hasher)
+                return hasher.hexdigest() == expected_digest
+            
+            if policy == 'size':
+                if expected_size is None:
+                    head = await client.head(url, headers={'Accept-Encoding': 'identity'})
+                    head.raise_for_status()
+                    if 'content-length' not in head.headers:
+                        return False
+                    expected_size = int(head.headers['content-length'])
+                if expected_size == 0:
+                    return dest_path.stat().st_size == 0
+                return AioUtils.check_file_size(dest_path, expected_size, tolerance=0)
+            
+            etag, last_modified = AioUtils._local_validators(dest_path)
+            headers = {'If-Modified-Since': last_modified}
+            if etag:
+                headers['If-None-Match'] = etag
+            head = await client.head(url, headers=headers)
+            if head.status_code == 304:
+                return True
+            head.raise_for_status()
+            # Servers ignoring conditional HEADs: compare the validators ourselves
+            size = head.headers.get('content-length')
+            if size is not None and int(size) != dest_path.stat().st_size:
+                return False
+            if etag and head.headers.get('etag') == etag:
+                return True
+            remote_modified = head.headers.get('last-modified')
+            return bool(remote_modified) and (
+                email.utils.parsedate_to_datetime(remote_modified).timestamp() <= dest_path.stat().st_mtime
+            )
+        except Exception:
+            return False
+
+    @staticmethod
+    def _local_source(url: Union[str, os.PathLike, Sequence[str]]) -> Optional[Path]:
+        """Return the local path of a 'file://' URL or plain path (None for remote URLs and mirror lists)."""
+        if isinstance(url, os.PathLike):
+            return Path(url)
+        if not isinstance(url, str):
+            return None
+        if url.startswith('file:'):
+            parsed = urllib.parse.urlsplit(url)
+            if parsed.netloc not in ('', 'localhost'):
+                return None
+            return Path(urllib.request.url2pathname(parsed.path))
+        if '://' not in url:
+            return Path(url)
+        return None
+
+    @staticmethod
+    def _mirror_list(url: Union[str, Sequence[str]]) -> List[str]:
+        """Return a URL or an ordered sequence of mirror URLs as a list."""
+        urls = [url] if isinstance(url, str) else list(url)
+        if not urls:
+            raise ValueError("No URL given")
+        return urls
+
+    @staticmethod
+    async def _race_mirrors(
+        client: httpx.AsyncClient,
+        urls: List[str],
+        race_bytes: int = 64 * 1024,
+        timeout: float = 10.0,
+    ) -> List[str]:
+        """Race the first bytes of every mirror and move the fastest to the front.
+        
+        Each mirror is asked for its first race_bytes with a Range request. The
+        first mirror to deliver them wins and the remaining probes are cancelled;
+        the other mirrors keep their given order behind the winner, so the list
+        still decides where to fail over to.
+        
+        Args:
+            client: HTTP client used for the probes
+            urls: Ordered mirror URLs
+            race_bytes: Number of leading bytes each mirror has to deliver
+            timeout: Seconds to wait for a winner before keeping the given order
+            
+        Returns:
+            Mirror URLs with the fastest one first
+        """
+        winner: List[str] = []
+        
+        async def probe(url: str):
+            try:
+                received = 0
+                headers = {'Range': f'bytes=0-{race_bytes - 1}', 'Accept-Encoding': 'identity'}
+                async with client.stream('GET', url, headers=headers) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        received += len(chunk)
+                        if received >= race_bytes:
+                            break
+            except Exception:
+                # A failing mirror simply does not win
+                return
+            if not winner:
+                winner.append(url)
+                tg.cancel_scope.cancel()
+        
+        with anyio.move_on_after(timeout):
+            async with anyio.create_task_group() as tg:
+                for url in urls:
+                    tg.start_soon(probe, url)
+        
+        if not winner:
+            return list(urls)
+        return winner + [url for url in urls if url != winner[0]]
+
+    @staticmethod
+    async def _download_core(
+        url: Union[str, Sequence[str]],
+        dest_path: Path,
+        verify_ssl: bool = True,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        resume: bool = False,
+        cache: Optional[AioDownloadCache] = None,
+        checksum: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        write_buffer_size: int = 1024 * 1024,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        race_mirrors: bool = False,
+        race_bytes: int = 64 * 1024,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        keep_validators: bool = False,
+        accept_encoding: bool = False,
+    ) -> tuple[bool, Optional[str], Optional[int], Optional[type]]:
+        """Core download functionality without UI.
+        
+        Data is written to a temp file (or the '.part' file) next to dest_path
+        and renamed over it once complete, so dest_path is never left truncated.
+        
+        With several mirror URLs, a failed attempt fails over to the next mirror
+        right away, continuing from the bytes already received; mirrors are
+        assumed to serve identical files (pass a checksum to make sure). The
+        retry policy only kicks in once every mirror has failed.
+        
+        Args:
+            url: URL to download from, or an ordered list of mirror URLs of the same file
+            dest_path: Destination file path
+            verify_ssl: Whether to verify SSL certificates
+            progress_callback: Optional callback for progress updates (receives bytes downloaded;
+                negative when a restart discards bytes reported earlier)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            resume: Whether to download into a '.part' sidecar that is kept on failure and
+                continued with a Range/If-Range request on the next call
+            cache: Download cache used to revalidate with If-None-Match/If-Modified-Since
+                and to serve unchanged files locally on 304 Not Modified
+            checksum: Expected digest as 'algorithm:hexdigest' (e.g. 'sha256:ab12...'),
+                computed over the chunks as they stream in
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            write_buffer_size: Bytes coalesced in memory before each disk write
+            rate_limiter: Token bucket consulted for every received chunk (bandwidth limit)
+            retry: Retry policy for transient failures; retries continue from the bytes
+                already received when the server supports Range requests
+            race_mirrors: Whether to race the first bytes of all mirrors and start with the fastest
+            race_bytes: Number of leading bytes each mirror has to deliver in the race
+            min_throughput: Minimum throughput in bytes per second; a slower transfer is
+                abandoned and fails over to the next mirror (or is retried)
+            throughput_window: Seconds over which min_throughput is measured
+            keep_validators: Whether to stamp the file with the remote ETag/Last-Modified
+                (see _record_validators)
+            accept_encoding: Whether to offer compressed transfer encodings (gzip, deflate,
+                and br/zstd where httpx can decode them); the body is decoded while it
+                streams in. Otherwise the identity encoding is requested, so sizes refer
+                to the file itself. Compressed transfers restart from zero on failure,
+                and Range requests always ask for the identity encoding.
+            
+        Returns:
+            Tuple of (success, error_message, total_size, error_type) where error_type
+            is the class of the exception that failed the download (None on success)
+        """
+        dest_path = Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path, meta_path = AioUtils._part_paths(dest_path)
+        
+        try:
+            sources = AioUtils._mirror_list(url)
+            algorithm, expected_digest = AioUtils._parse_checksum(checksum) if checksum else (None, None)
+        except ValueError as e:
+            return (False, str(e), None, type(e))
+        
+        # Retries and failovers continue from the partial file as well, even without resume
+        use_part = resume or len(sources) > 1 or (retry is not None and retry.max_attempts > 1)
+        write_path = part_path if use_part else AioUtils._temp_path(dest_path)
+        watchdog = AioThroughputWatchdog(min_throughput, throughput_window) if min_throughput else None
+        
+        if use_part and not resume:
+            # Partial data of an earlier call is only reused when asked to
+            part_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+        
+        # Bytes reported to progress_callback and fed into the hash, kept across attempts
+        reported = 0
+        hasher = None
+        hashed = 0
+        
+        async def sync_to(position: int, replaced: bool = False):
+            """Bring progress and hash in line with the first position bytes on disk."""
+            nonlocal reported, hasher, hashed
+            if progress_callback and position != reported:
+                progress_callback(position - reported)
+            reported = position
+            if algorithm and (hasher is None or hashed != position or replaced):
+                hasher = hashlib.new(algorithm)
+                hashed = 0
+                if position:
+                    # Bytes that did not stream through this call have to be read back once
+                    await anyio.to_thread.run_sync(AioUtils._hash_file, write_path, hasher, position)
+                    hashed = position
+        
+        async def attempt(client: httpx.AsyncClient, url: str) -> int:
+            nonlocal reported, hashed
+            
+            # Continue partial data if we know how to revalidate it
+            offset = 0
+            expected_total = None
+            headers = {}
+            meta = AioUtils._read_part_meta(meta_path) if use_part and part_path.exists() else None
+            if meta and meta.get('url') == url and AioUtils._if_range_validator(meta):
+                offset = part_path.stat().st_size
+                if offset:
+                    headers = {'Range': f'bytes={offset}-', 'If-Range': AioUtils._if_range_validator(meta)}
+            elif meta and meta.get('url') != url and meta.get('url') in sources and meta.get('total_size'):
+                # Another mirror's validators mean nothing here: the total size has to match instead
+                offset = part_path.stat().st_size
+                expected_total = meta['total_size']
+                if offset:
+                    headers = {'Range': f'bytes={offset}-'}
+            if cache is not None and not headers:
+                headers = cache.conditional_headers(url)
+            if headers.get('Range') or not accept_encoding:
+                # Byte offsets only line up with the identity encoding
+                headers = {**headers, 'Accept-Encoding': 'identity'}
+            cache_validators = None
+            validators = (None, None)
+            
+            async with client.stream('GET', url, headers=headers) as response:
+                if response.status_code == 304 and cache is not None:
+                    # Unchanged upstream: serve the cached copy
+                    entry = cache.lookup(url) or {}
+                    validators = (entry.get('etag'), entry.get('last_modified'))
+                    total_size = await anyio.to_thread.run_sync(cache.restore, url, write_path)
+                    await sync_to(total_size, replaced=True)
+                elif response.status_code == 416 and offset and response.headers.get('content-range') == f'bytes */{offset}':
+                    # The partial file already holds every byte
+                    validators = (meta.get('etag'), meta.get('last_modified'))
+                    total_size = offset
+                    await sync_to(offset)
+                else:
+                    if response.status_code == 416 and offset:
+                        part_path.unlink()
+                        meta_path.unlink(missing_ok=True)
+                    response.raise_for_status()
+                    
+                    if response.status_code == 206:
+                        AioUtils._check_partial_response(response)
+                        content_range = response.headers.get('content-range', '')
+                        if (not content_range.startswith(f'bytes {offset}-')
+                                or (expected_total and not content_range.endswith(f'/{expected_total}'))):
+                            part_path.unlink()
+                            raise ValueError(f"Unexpected Content-Range: {response.headers.get('content-range')}")
+                    else:
+                        # Full response: the resource changed or the range was ignored
+                        offset = 0
+                    
+                    # Content-Length of a compressed transfer is not the size of the file
+                    encoded = response.headers.get('content-encoding', 'identity').lower() != 'identity'
+                    total_size = offset + int(response.headers.get('content-length', 0)) if not encoded else 0
+                    validators = (response.headers.get('etag'), response.headers.get('last-modified'))
+                    
+                    if use_part:
+                        # Without validators, decoded data is never continued with a Range request
+                        AioUtils._write_part_meta(meta_path, {
+                            'url': url,
+                            'etag': response.headers.get('etag') if not encoded else None,
+                            'last_modified': response.headers.get('last-modified') if not encoded else None,
+                            'total_size': total_size or None,
+                            'bytes_written': offset,
+                        })
+                    await sync_to(offset)
+                    if watchdog:
+                        watchdog.reset()
+                    
+                    async with AioFileWriter(write_path, 'ab' if offset else 'wb', buffer_size=write_buffer_size) as f:
+                        async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+                            await f.write(chunk)
+                            if hasher:
+                                hasher.update(chunk)
+                                hashed += len(chunk)
+                            await AioUtils._meter_chunk(len(chunk), progress_callback, rate_limiter, watchdog)
+                            reported += len(chunk)
+                    if encoded:
+                        total_size = reported
+                    
+                    if cache is not None and response.status_code == 200:
+                        cache_validators = (response.headers.get('etag'), response.headers.get('last-modified'))
+            
+            if hasher:
+                try:
+                    AioUtils._verify_digest(hasher, expected_digest)
+                except ValueError:
+                    # Corrupt data must not be resumed
+                    write_path.unlink(missing_ok=True)
+                    meta_path.unlink(missing_ok=True)
+                    raise
+            
+            os.replace(write_path, dest_path)
+            if use_part:
+                meta_path.unlink(missing_ok=True)
+            if keep_validators:
+                AioUtils._record_validators(dest_path, *validators)
+            
+            if cache_validators:
+                await anyio.to_thread.run_sync(cache.store, url, dest_path, *cache_validators)
+            
+            return total_size
+        
+        # Borrow the shared client without closing it, or own a one-off client
+        client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+        
+        try:
+            # The previous copy of dest_path, if any, is left untouched
+            with AioUtils._cleanup_partial(write_path, *([meta_path] if use_part else []), keep=resume):
+                async with client_ctx as client:
+                    if race_mirrors and len(sources) > 1:
+                        sources = await AioUtils._race_mirrors(client, sources, race_bytes)
+                    
+                    total_size = await AioUtils._with_failover(sources, lambda source: attempt(client, source), retry, fatal=(OSError,))
+                    return (True, None, total_size, None)
+                    
+        except Exception as e:
+            if resume:
+                # Keep the partial data and record how far we got
+                meta = AioUtils._read_part_meta(meta_path)
+                if meta is not None and part_path.exists():
+                    meta['bytes_written'] = part_path.stat().st_size
+                    AioUtils._write_part_meta(meta_path, meta)
+            return (False, str(e), None, type(e))
+
+    @staticmethod
+    async def _download_segmented_core(
+        url: Union[str, Sequence[str]],
+        dest_path: Path,
+        segments: int = 4,
+        min_segment_size: int = 4 * 1024 * 1024,
+        verify_ssl: bool = True,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        resume: bool = False,
+        cache: Optional[AioDownloadCache] = None,
+        checksum: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        write_buffer_size: int = 1024 * 1024,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        race_mirrors: bool = False,
+        race_bytes: int = 64 * 1024,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        keep_validators: bool = False,
+    ) -> tuple[bool, Optional[str], Optional[int], Optional[type]]:
+        """Core segmented download using concurrent HTTP Range requests, without UI.
+        
+        Probes the server for Accept-Ranges/Content-Length, splits the file into
+        byte ranges and writes each range at its offset into one preallocated file.
+        Falls back to _download_core when ranges are not supported or the file is
+        too small to be worth splitting. With several mirrors, the first one is
+        probed and a failing range fails over to the next mirror on its own.
+        
+        Args:
+            url: URL to download from, or an ordered list of mirror URLs of the same file
+            dest_path: Destination file path
+            segments: Maximum number of concurrent byte ranges
+            min_segment_size: Minimum size of a single range in bytes
+            verify_ssl: Whether to verify SSL certificates
+            progress_callback: Optional callback for progress updates (receives bytes downloaded)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            resume: Whether to keep per-range progress in a '.part' sidecar so that
+                only the missing bytes of each range are fetched on the next call
+            cache: Download cache revalidated with a conditional HEAD request
+            checksum: Expected digest as 'algorithm:hexdigest'; ranges arrive out of
+                order, so segmented downloads verify it with one pass over the file
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            write_buffer_size: Bytes coalesced in memory per range before each disk write
+            rate_limiter: Token bucket consulted for every received chunk (bandwidth limit)
+            retry: Retry policy for transient failures; each range retries on its own,
+                continuing from the bytes it already received
+            race_mirrors: Whether to race the first bytes of all mirrors and start with the fastest
+            race_bytes: Number of leading bytes each mirror has to deliver in the race
+            min_throughput: Minimum throughput of each range in bytes per second
+            throughput_window: Seconds over which min_throughput is measured
+            keep_validators: Whether to stamp the file with the remote ETag/Last-Modified
+            
+        Returns:
+            Tuple of (success, error_message, total_size, error_type)
+        """
+        dest_path = Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path, meta_path = AioUtils._part_paths(dest_path)
+        write_path = part_path if resume else None
+        
+        try:
+            sources = AioUtils._mirror_list(url)
+            algorithm, expected_digest = AioUtils._parse_checksum(checksum) if checksum else (None, None)
+        except ValueError as e:
+            return (False, str(e), None, type(e))
+        
+        client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+        
+        async with client_ctx as client:
+            if race_mirrors and len(sources) > 1:
+                sources = await AioUtils._race_mirrors(client, sources, race_bytes)
+            url = sources[0]
+            
+            # Probe range support; any probe failure just means single-stream download
+            try:
+                # Content-Length of the identity encoding is the size of the file
+                headers = {**(cache.conditional_headers(url) if cache is not None else {}), 'Accept-Encoding': 'identity'}
+                head = await client.head(url, headers=headers)
+                not_modified = head.status_code == 304 and cache is not None
+                if not not_modified:
+                    head.raise_for_status()
+                accepts_ranges = head.headers.get('accept-ranges', '').lower() == 'bytes'
+                total_size = int(head.headers.get('content-length', 0))
+            except Exception:
+                not_modified, accepts_ranges, total_size = False, False, 0
+            
+            if not_modified:
+                # Unchanged upstream: serve the cached copy, verified before it replaces dest_path
+                temp_path = AioUtils._temp_path(dest_path)
+                try:
+                    with AioUtils._cleanup_partial(temp_path):
+                        total_size = await anyio.to_thread.run_sync(cache.restore, url, temp_path)
+                        if algorithm:
+                            hasher = hashlib.new(algorithm)
+                            await anyio.to_thread.run_sync(AioUtils._hash_file, temp_path, hasher)
+                            AioUtils._verify_digest(hasher, expected_digest)
+                        os.replace(temp_path, dest_path)
+                except Exception as e:
+                    return (False, str(e), None, type(e))
+                if progress_callback:
+                    progress_callback(total_size)
+                return (True, None, total_size, None)
+            
+            count = min(segments, total_size // max(min_segment_size, 1))
+            if not accepts_ranges or count < 2:
+                return await AioUtils._download_core(
+                    sources,
+                    dest_path,
+                    verify_ssl=verify_ssl,
+                    progress_callback=progress_callback,
+                    client=client,
+                    resume=resume,
+                    cache=cache,
+                    checksum=checksum,
+                    chunk_size=chunk_size,
+                    write_buffer_size=write_buffer_size,
+                    rate_limiter=rate_limiter,
+                    retry=retry,
+                    min_throughput=min_throughput,
+                    throughput_window=throughput_window,
+                    keep_validators=keep_validators,
+                )
+            
+            meta = {
+                'url': url,
+                'etag': head.headers.get('etag'),
+                'last_modified': head.headers.get('last-modified'),
+                'total_size': total_size,
+            }
+            validator = AioUtils._if_range_validator(meta)
+            
+            # Reuse per-range progress only if the remote file is unchanged
+            previous = AioUtils._read_part_meta(meta_path) if resume and part_path.exists() else None
+            if (previous and validator and previous.get('ranges')
+                    and all(previous.get(k) == v for k, v in meta.items())
+                    and part_path.stat().st_size == total_size):
+                ranges = previous['ranges']
+            else:
+                step = -(-total_size // count)
+                ranges = [[start, min(start + step, total_size) - 1, 0] for start in range(0, total_size, step)]
+                previous = None
+            meta['ranges'] = ranges
+            errors: List[Exception] = []
+            
+            async def fetch_range(segment: list):
+                start, end = segment[0], segment[1]
+                watchdog = AioThroughputWatchdog(min_throughput, throughput_window) if min_throughput else None
+                
+                async def attempt(source: str):
+                    # Only the rest of this range is fetched, whichever mirror failed before
+                    done = segment[2]
+                    try:
+                        headers = {'Range': f'bytes={start + done}-{end}', 'Accept-Encoding': 'identity'}
+                        if validator and source == url:
+                            # Never mix ranges of two versions of the file
+                            headers['If-Range'] = validator
+                        async with client.stream('GET', source, headers=headers) as response:
+                            response.raise_for_status()
+                            AioUtils._check_partial_response(response)
+                            if not response.headers.get('content-range', '').endswith(f'/{total_size}'):
+                                raise ValueError(f"Unexpected Content-Range: {response.headers.get('content-range')}")
+                            if watchdog:
+                                watchdog.reset()
+                            
+                            async with AioFileWriter(write_path, 'r+b', offset=start + done, buffer_size=write_buffer_size) as f:
+                                async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+                                    await f.write(chunk)
+                                    await AioUtils._meter_chunk(len(chunk), progress_callback, rate_limiter, watchdog)
+                                    segment[2] += len(chunk)
+                    except OSError:
+                        # Buffered bytes may not have reached the disk: redo this attempt's bytes
+                        segment[2] = done
+                        raise
+                    if segment[2] != end - start + 1:
+                        raise ValueError(f"Incomplete range {start}-{end}: got {segment[2]} bytes")
+                
+                if start + segment[2] > end:
+                    return
+                try:
+                    await AioUtils._with_failover(sources, attempt, retry, fatal=(OSError,))
+                except Exception as e:
+                    errors.append(e)
+                    tg.cancel_scope.cancel()
+            
+            if write_path is None:
+                write_path = AioUtils._temp_path(dest_path)
+            
+            try:
+                with AioUtils._cleanup_partial(write_path, keep=resume):
+                    if previous is None:
+                        # Preallocate so every range can be written at its own offset
+                        def _preallocate():
+                            with open(write_path, 'wb') as f:
+                                f.truncate(total_size)
+                        
+                        await anyio.to_thread.run_sync(_preallocate)
+                    elif progress_callback:
+                        progress_callback(sum(segment[2] for segment in ranges))
+                    
+                    if resume:
+                        AioUtils._write_part_meta(meta_path, meta)
+                    
+                    async with anyio.create_task_group() as tg:
+                        for segment in ranges:
+                            tg.start_soon(fetch_range, segment)
+                    
+                    if errors:
+                        raise errors[0]
+                    
+                    if algorithm:
+                        hasher = hashlib.new(algorithm)
+                        await anyio.to_thread.run_sync(AioUtils._hash_file, write_path, hasher)
+                        try:
+                            AioUtils._verify_digest(hasher, expected_digest)
+                        except ValueError:
+                            # Corrupt data must not be resumed
+                            write_path.unlink(missing_ok=True)
+                            meta_path.unlink(missing_ok=True)
+                            raise
+                    
+                    os.replace(write_path, dest_path)
+                    if resume:
+                        meta_path.unlink(missing_ok=True)
+                    if keep_validators:
+                        AioUtils._record_validators(dest_path, meta['etag'], meta['last_modified'])
+                    
+                    if cache is not None:
+                        await anyio.to_thread.run_sync(cache.store, url, dest_path, meta['etag'], meta['last_modified'])
+                    
+                    return (True, None, total_size, None)
+                
+            except Exception as e:
+                if resume and part_path.exists():
+                    # Keep the partial data and record per-range progress
+                    AioUtils._write_part_meta(meta_path, meta)
+                return (False, str(e), None, type(e))
+
+    @staticmethod
+    async def _download_multisource_core(
+        url: Union[str, Sequence[str]],
+        dest_path: Path,
+        piece_size: int = 4 * 1024 * 1024,
+        connections_per_source: int = 1,
+        verify_ssl: bool = True,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        resume: bool = False,
+        checksum: Optional[str] = None,
+        piece_checksums: Optional[List[str]] = None,
+        expected_size: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        write_buffer_size: int = 1024 * 1024,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+    ) -> tuple[bool, Optional[str], Optional[int], Optional[type]]:
+        """Core multi-source download pulling pieces from several mirrors at once, without UI.
+        
+        Every mirror that serves byte ranges of the expected size gets its own
+        workers, which take the next missing piece from a shared queue. Faster
+        mirrors come back for more pieces sooner, so the work follows whichever
+        source is currently fastest and the bandwidth of all mirrors adds up.
+        A failed piece goes back to the queue for another mirror; a mirror that
+        fails without a retry left is dropped. Falls back to _download_core
+        (with mirror failover) when no mirror supports ranges.
+        
+        Args:
+            url: Ordered list of mirror URLs of the same file (or a single URL)
+            dest_path: Destination file path
+            piece_size: Size of the pieces handed out to mirrors in bytes
+            connections_per_source: Concurrent piece requests per mirror
+            verify_ssl: Whether to verify SSL certificates
+            progress_callback: Optional callback for progress updates (receives bytes downloaded;
+                negative when a failed piece discards bytes reported earlier)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            resume: Whether to keep finished pieces in a '.part' sidecar so that only
+                missing pieces are fetched on the next call
+            checksum: Expected digest of the assembled file as 'algorithm:hexdigest'
+            piece_checksums: Expected digest of every piece as 'algorithm:hexdigest'
+                (e.g. from a Metalink document), verified as each piece arrives
+            expected_size: File size in bytes, if known; mirrors reporting another size are skipped
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            write_buffer_size: Bytes coalesced in memory per piece before each disk write
+            rate_limiter: Token bucket consulted for every received chunk (bandwidth limit)
+            retry: Retry policy for transient failures of a mirror
+            min_throughput: Minimum throughput of each piece request in bytes per second
+            throughput_window: Seconds over which min_throughput is measured
+            
+        Returns:
+            Tuple of (success, error_message, total_size, error_type)
+        """
+        dest_path = Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path, meta_path = AioUtils._part_paths(dest_path)
+        write_path = part_path if resume else None
+        
+        try:
+            sources = AioUtils._mirror_list(url)
+            algorithm, expected_digest = AioUtils._parse_checksum(checksum) if checksum else (None, None)
+            piece_digests = [AioUtils._parse_checksum(c) for c in piece_checksums or []]
+        except ValueError as e:
+            return (False, str(e), None, type(e))
+        
+        client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+        
+        async with client_ctx as client:
+            # Probe every mirror; only those serving ranges of the same size take part
+            sizes = {}
+            
+            async def probe(source: str):
+                try:
+                    head = await client.head(source, headers={'Accept-Encoding': 'identity'})
+                    head.raise_for_status()
+                    if head.headers.get('accept-ranges', '').lower() == 'bytes' and head.headers.get('content-length'):
+                        sizes[source] = int(head.headers['content-length'])
+                except Exception:
+                    pass
+            
+            async with anyio.create_task_group() as tg:
+                for source in sources:
+                    tg.start_soon(probe, source)
+            
+            total_size = expected_size or next((sizes[s] for s in sources if s in sizes), 0)
+            usable = [s for s in sources if total_size and sizes.get(s) == total_size]
+            if not usable:
+                return await AioUtils._download_core(
+                    sources,
+                    dest_path,
+                    verify_ssl=verify_ssl,
+                    progress_callback=progress_callback,
+                    client=client,
+                    resume=resume,
+                    checksum=checksum,
+                    chunk_size=chunk_size,
+                    write_buffer_size=write_buffer_size,
+                    rate_limiter=rate_limiter,
+                    retry=retry,
+                    min_throughput=min_throughput,
+                    throughput_window=throughput_window,
+                )
+            
+            pieces = [(start, min(start + piece_size, total_size) - 1) for start in range(0, total_size, piece_size)]
+            if piece_digests and len(piece_digests) != len(pieces):
+                return (False, f"Expected {len(pieces)} piece checksums, got {len(piece_digests)}", None, ValueError)
+            
+            meta = {'url': usable[0], 'total_size': total_size, 'piece_size': piece_size}
+            
+            # Reuse finished pieces only if the partial file describes the same download
+            previous = AioUtils._read_part_meta(meta_path) if resume and part_path.exists() else None
+            if (previous and previous.get('url') in sources and 'pieces_done' in previous
+                    and previous.get('total_size') == total_size and previous.get('piece_size') == piece_size
+                    and part_path.stat().st_size == total_size):
+                done = set(previous['pieces_done'])
+            else:
+                done = set()
+                previous = None
+            meta['pieces_done'] = done
+            pending = deque(index for index in range(len(pieces)) if index not in done)
+            dropped = set()
+            errors: List[Exception] = []
+            failures: List[Exception] = []
+            
+            async def worker(source: str):
+                watchdog = AioThroughputWatchdog(min_throughput, throughput_window) if min_throughput else None
+                attempt_number = 1
+                while pending and source not in dropped:
+                    index = pending.popleft()
+                    start, end = pieces[index]
+                    received = 0
+                    hasher = hashlib.new(piece_digests[index][0]) if piece_digests else None
+                    try:
+                        headers = {'Range': f'bytes={start}-{end}', 'Accept-Encoding': 'identity'}
+                        async with client.stream('GET', source, headers=headers) as response:
+                            response.raise_for_status()
+                            AioUtils._check_partial_response(response)
+                            if response.headers.get('content-range') != f'bytes {start}-{end}/{total_size}':
+                                raise ValueError(f"Unexpected Content-Range: {response.headers.get('content-range')}")
+                            if watchdog:
+                                watchdog.reset()
+                            
+                            async with AioFileWriter(write_path, 'r+b', offset=start, buffer_size=write_buffer_size) as f:
+                                async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+                                    await f.write(chunk)
+                                    if hasher:
+                                        hasher.update(chunk)
+                                    await AioUtils._meter_chunk(len(chunk), progress_callback, rate_limiter, watchdog)
+                                    received += len(chunk)
+                        
+                        if received != end - start + 1:
+                            raise ValueError(f"Incomplete piece {start}-{end}: got {received} bytes")
+                        if hasher:
+                            AioUtils._verify_digest(hasher, piece_digests[index][1])
+                    except OSError as e:
+                        # Disk errors hit every mirror alike
+                        pending.appendleft(index)
+                        errors.append(e)
+                        tg.cancel_scope.cancel()
+                        return
+                    except Exception as e:
+                        # Hand the piece to the next free worker, whichever mirror it serves
+                        pending.appendleft(index)
+                        if progress_callback and received:
+                            progress_callback(-received)
+                        failures.append(e)
+                        if retry is not None and retry.should_retry(attempt_number, e):
+                            await anyio.sleep(retry.delay(attempt_number, e))
+                            attempt_number += 1
+                            continue
+                        dropped.add(source)
+                        return
+                    done.add(index)
+                    attempt_number = 1
+            
+            if write_path is None:
+                write_path = AioUtils._temp_path(dest_path)
+            
+            try:
+                with AioUtils._cleanup_partial(write_path, keep=resume):
+                    if previous is None:
+                        # Preallocate so every piece can be written at its own offset
+                        def _preallocate():
+                            with open(write_path, 'wb') as f:
+                                f.truncate(total_size)
+                        
+                        await anyio.to_thread.run_sync(_preallocate)
+                    elif progress_callback:
+                        progress_callback(sum(pieces[index][1] - pieces[index][0] + 1 for index in done))
+                    
+                    # A piece failing after the other workers ran out of work needs another round
+                    while pending:
+                        alive = [s for s in usable if s not in dropped]
+                        if not alive:
+                            raise failures[-1]
+                        async with anyio.create_task_group() as tg:
+                            for source in alive:
+                                for _ in range(max(connections_per_source, 1)):
+                                    tg.start_soon(worker, source)
+                        if errors:
+                            raise errors[0]
+                    
+                    if algorithm:
+                        hasher = hashlib.new(algorithm)
+                        await anyio.to_thread.run_sync(AioUtils._hash_file, write_path, hasher)
+                        try:
+                            AioUtils._verify_digest(hasher, expected_digest)
+                        except ValueError:
+                            # Corrupt data must not be resumed
+                            write_path.unlink(missing_ok=True)
+                            meta_path.unlink(missing_ok=True)
+                            raise
+                    
+                    os.replace(write_path, dest_path)
+                    if resume:
+                        meta_path.unlink(missing_ok=True)
+                    
+                    return (True, None, total_size, None)
+                
+            except Exception as e:
+                if resume and part_path.exists():
+                    # Keep the partial data and record the finished pieces
+                    AioUtils._write_part_meta(meta_path, {**meta, 'pieces_done': sorted(done)})
+                return (False, str(e), None, type(e))
+
+    @staticmethod
+    async def _load_delta_index(
+        delta: Union[bool, str, Path, AioDeltaIndex],
+        url: Union[str, Sequence[str]],
+        client: httpx.AsyncClient,
+    ) -> AioDeltaIndex:
+        """Resolve the delta option of download_file to a parsed control file.
+        
+        Raises:
+            ValueError: If the control file cannot be fetched, read or parsed
+        """
+        if isinstance(delta, AioDeltaIndex):
+            return delta
+        if delta is True:
+            # Published next to the file, like '.zsync' files
+            delta = AioUtils._mirror_list(url)[0] + AioDeltaIndex.SUFFIX
+        local = AioUtils._local_source(delta)
+        if local is not None:
+            try:
+                return await anyio.to_thread.run_sync(AioDeltaIndex.load, local)
+            except OSError as e:
+                raise ValueError(f"Cannot read delta control file: {e}") from e
+        success, error, content = await AioUtils._download_bytes_core(str(delta), client=client, max_size=256 * 1024 * 1024)
+        if not success:
+            raise ValueError(f"Cannot fetch delta control file {delta}: {error}")
+        return AioDeltaIndex.parse(content)
+
+    @staticmethod
+    async def _download_delta_core(
+        url: Union[str, Sequence[str]],
+        dest_path: Path,
+        index: AioDeltaIndex,
+        base_path: Optional[Path] = None,
+        verify_ssl: bool = True,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        checksum: Optional[str] = None,
+        connections: int = 4,
+        max_range_size: int = 16 * 1024 * 1024,
+        chunk_size: Optional[int] = None,
+        write_buffer_size: int = 1024 * 1024,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+    ) -> tuple[bool, Optional[str], Optional[int], Optional[type]]:
+        """Core delta download without UI: fetch only the blocks a local copy lacks.
+        
+        Blocks of base_path whose digests appear in the index are copied into
+        place in the kernel (see _copy_file_range); runs of missing blocks are
+        fetched with Range requests (at most max_range_size each) by a pool of
+        connections, and every fetched block is checked against the index.
+        Without any reusable block this is a plain download.
+        
+        Args:
+            url: URL of the new version, or an ordered list of mirror URLs (failed
+                ranges are fetched again from the next mirror)
+            dest_path: Destination file path
+            index: Block digests of the new version (see AioDeltaIndex)
+            base_path: Previous version of the file (defaults to dest_path)
+            verify_ssl: Whether to verify SSL certificates
+            progress_callback: Optional callback for progress updates (receives bytes copied
+                or downloaded; negative when a failed range is fetched again)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            checksum: Expected digest of the new version as 'algorithm:hexdigest'
+                (defaults to the whole-file digest of the index)
+            connections: Concurrent range requests
+            max_range_size: Largest single range request in bytes
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            write_buffer_size: Bytes coalesced in memory per range before each disk write
+            rate_limiter: Token bucket consulted for every received chunk (bandwidth limit)
+            retry: Retry policy for transient failures of a range
+            min_throughput: Minimum throughput per range request in bytes per second before
+                it is abandoned for the next mirror (or retried)
+            throughput_window: Seconds over which min_throughput is measured
+            
+        Returns:
+            Tuple of (success, error_message, total_size, error_type)
+        """
+        dest_path = Path(dest_path)
+        base_path = Path(base_path) if base_path is not None else dest_path
+        checksum = checksum or index.checksum
+        try:
+            sources = AioUtils._mirror_list(url)
+            algorithm, expected_digest = AioUtils._parse_checksum(checksum) if checksum else (None, None)
+            
+            matches = await anyio.to_thread.run_sync(index.match_local, base_path) if base_path.is_file() else {}
+            if not matches:
+                return await AioUtils._download_core(
+                    sources,
+                    dest_path,
+                    verify_ssl=verify_ssl,
+                    progress_callback=progress_callback,
+                    client=client,
+                    checksum=checksum,
+                    chunk_size=chunk_size,
+                    write_buffer_size=write_buffer_size,
+                    rate_limiter=rate_limiter,
+                    retry=retry,
+                    min_throughput=min_throughput,
+                    throughput_window=throughput_window,
+                )
+            
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = AioUtils._temp_path(dest_path)
+            with AioUtils._cleanup_partial(temp_path):
+                def _assemble():
+                    """Preallocate the new version and copy the reusable blocks into place."""
+                    with open(base_path, 'rb') as src, open(temp_path, 'r+b') as dst:
+                        dst.truncate(index.size)
+                        for block, offset in matches.items():
+                            start, end = index.block_range(block)
+                            while start < end:
+                                copied = AioUtils._copy_file_range(src.fileno(), dst.fileno(), offset, end - start, start)
+                                if not copied:
+                                    raise ValueError(f"{base_path} shrank while reading it")
+                                start += copied
+                                offset += copied
+                
+                await anyio.to_thread.run_sync(_assemble)
+                if progress_callback:
+                    progress_callback(sum(end - start for start, end in map(index.block_range, matches)))
+                
+                # Coalesce runs of missing blocks into range requests
+                ranges = deque()
+                block_count = len(index.block_checksums)
+                blocks_per_range = max(1, max_range_size // index.block_size)
+                block = 0
+                while block < block_count:
+                    if block in matches:
+                        block += 1
+                        continue
+                    first = block
+                    while block < block_count and block not in matches and block - first < blocks_per_range:
+                        block += 1
+                    ranges.append((first, block))
+                
+                errors: List[Exception] = []
+                
+                async def fetch(first: int, last: int):
+                    """Fetch blocks first..last-1 and check each against the index."""
+                    start, end = index.block_range(first)[0], index.block_range(last - 1)[1]
+                    watchdog = AioThroughputWatchdog(min_throughput, throughput_window) if min_throughput else None
+                    
+                    async def attempt(source: str):
+                        received = 0
+                        try:
+                            headers = {'Range': f'bytes={start}-{end - 1}', 'Accept-Encoding': 'identity'}
+                            async with client.stream('GET', source, headers=headers) as response:
+                                response.raise_for_status()
+                                AioUtils._check_partial_response(response)
+                                if not response.headers.get('content-range', '').endswith(f'/{index.size}'):
+                                    raise ValueError(f"Unexpected Content-Range: {response.headers.get('content-range')}")
+                                
+                                block, hasher, position = first, hashlib.new(index.algorithm), start
+                                if watchdog:
+                                    watchdog.reset()
+                                async with AioFileWriter(temp_path, 'r+b', offset=start, buffer_size=write_buffer_size) as f:
+                                    async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+                                        view = memoryview(chunk)
+                                        while view:
+                                            if block >= last:
+                                                raise ValueError(f"Range {start}-{end - 1} returned too many bytes")
+                                            block_end = index.block_range(block)[1]
+                                            take = min(len(view), block_end - position)
+                                            hasher.update(view[:take])
+                                            view = view[take:]
+                                            position += take
+                                            if position == block_end:
+                                                if hasher.hexdigest() != index.block_checksums[block]:
+                                                    raise ValueError(f"Block {block} does not match the delta control file")
+                                                block, hasher = block + 1, hashlib.new(index.algorithm)
+                                        await f.write(chunk)
+                                        await AioUtils._meter_chunk(len(chunk), progress_callback, rate_limiter, watchdog)
+                                        received += len(chunk)
+                            
+                            if received != end - start:
+                                raise ValueError(f"Incomplete range {start}-{end - 1}: got {received} bytes")
+                        except Exception:
+                            # The whole range is fetched again
+                            if progress_callback and received:
+                                progress_callback(-received)
+                            raise
+                    
+                    try:
+                        await AioUtils._with_failover(sources, attempt, retry, fatal=(OSError,))
+                    except Exception as e:
+                        errors.append(e)
+                        tg.cancel_scope.cancel()
+                
+                async def worker():
+                    while ranges:
+                        await fetch(*ranges.popleft())
+                
+                client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+                async with client_ctx as client:
+                    async with anyio.create_task_group() as tg:
+                        for _ in range(max(1, min(connections, len(ranges)))):
+                            tg.start_soon(worker)
+                
+                if errors:
+                    raise errors[0]
+                
+                if algorithm:
+                    hasher = hashlib.new(algorithm)
+                    await anyio.to_thread.run_sync(AioUtils._hash_file, temp_path, hasher)
+                    AioUtils._verify_digest(hasher, expected_digest)
+                
+                os.replace(temp_path, dest_path)
+                return (True, None, index.size, None)
+            
+        except Exception as e:
+            return (False, str(e), None, type(e))
+
+    @staticmethod
+    async def _copy_local_core(
+        source_path: Path,
+        dest_path: Path,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        checksum: Optional[str] = None,
+        link_mode: str = 'auto',
+        block_size: int = 64 * 1024 * 1024,
+    ) -> tuple[bool, Optional[str], Optional[int], Optional[type]]:
+        """Core copy of a local source (file:// URL or path) without UI.
+        
+        The data never passes through Python: the file is cloned with a reflink
+        (or hard-linked) where the file system supports it, otherwise copied in the kernel with
+        copy_file_range/sendfile (see _copy_file_range), one block per worker
+        thread call so progress is reported between blocks. The copy keeps the
+        modification time of the source.
+        
+        Args:
+            source_path: Existing local file
+            dest_path: Destination file path
+            progress_callback: Optional callback for progress updates (receives bytes copied)
+            checksum: Expected digest as 'algorithm:hexdigest', verified by reading the copy
+            link_mode: 'auto' or 'reflink' (clone where supported), 'hardlink' (share the
+                source's inode) or 'copy'; every mode falls back to a kernel copy
+            block_size: Bytes copied per worker thread call
+            
+        Returns:
+            Tuple of (success, error_message, total_size, error_type)
+        """
+        try:
+            hasher = None
+            if checksum:
+                algorithm, expected = AioUtils._parse_checksum(checksum)
+                hasher = hashlib.new(algorithm)
+            
+            source_stat = await anyio.to_thread.run_sync(os.stat, source_path)
+            total_size = source_stat.st_size
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = AioUtils._temp_path(dest_path)
+            with AioUtils._cleanup_partial(temp_path):
+                if await anyio.to_thread.run_sync(AioUtils._link, source_path, temp_path, link_mode):
+                    if progress_callback:
+                        progress_callback(total_size)
+                else:
+                    src = await anyio.to_thread.run_sync(os.open, source_path, os.O_RDONLY)
+                    try:
+                        # A failed hardlink attempt leaves no temp file behind
+                        dst = await anyio.to_thread.run_sync(os.open, temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+                        try:
+                            offset = 0
+                            while offset < total_size:
+                                copied = await anyio.to_thread.run_sync(
+                                    AioUtils._copy_file_range, src, dst, offset, min(block_size, total_size - offset)
+                                )
+                                if not copied:
+                                    raise ValueError(f"Source file shrank while copying ({offset} of {total_size} bytes)")
+                                offset += copied
+                                if progress_callback:
+                                    progress_callback(copied)
+                        finally:
+                            os.close(dst)
+                    finally:
+                        os.close(src)
+                
+                if hasher is not None:
+                    await anyio.to_thread.run_sync(AioUtils._hash_file, temp_path, hasher)
+                    AioUtils._verify_digest(hasher, expected)
+                
+                os.utime(temp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+                os.replace(temp_path, dest_path)
+                return (True, None, total_size, None)
+            
+        except Exception as e:
+            return (False, str(e), None, type(e))
+
+    @staticmethod
+    async def download_file(
+        url: Union[str, Sequence[str]],
+        dest_path: Path,
+        expected_size: Optional[int] = None,
+        verify_ssl: bool = True,
+        ui_enabled: bool = False,
+        progress: Optional[Progress] = None,
+        ui: Optional['AioUi'] = global_ui,
+        client: Optional[httpx.AsyncClient] = None,
+        segments: int = 1,
+        min_segment_size: int = 4 * 1024 * 1024,
+        resume: bool = False,
+        cache: Optional[AioDownloadCache] = None,
+        checksum: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        write_buffer_size: int = 1024 * 1024,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        max_rate: Optional[float] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        race_mirrors: bool = False,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        multi_source: bool = False,
+        metalink: Optional[Union[str, Path, AioMetalinkFile]] = None,
+        piece_size: Optional[int] = None,
+        connections_per_source: int = 1,
+        progress_throttle: Optional[AioProgressThrottle] = None,
+        progress_interval: float = 0.1,
+        skip_existing: Optional[str] = None,
+        link_mode: str = 'auto',
+        accept_encoding: bool = False,
+        decompress: bool = False,
+        delta: Optional[Union[bool, str, Path, AioDeltaIndex]] = None,
+        delta_base: Optional[Path] = None,
+        result_callback: Optional[Callable[[bool, Optional[str], Optional[int], Optional[type]], None]] = None,
+    ) -> bool:
+        """Download a file asynchronously with optional progress tracking.
+        
+        The file is written to a temp file next to dest_path and renamed over
+        it on success, so a failed download never destroys an existing copy.
+        
+        Local sources ('file://' URLs and plain paths) are copied without going
+        through HTTP or Python buffers, see _copy_local_core.
+        
+        Args:
+            url: URL to download from, a 'file://' URL or local path, or an ordered list of
+                mirror URLs serving the same file; failed or too slow transfers fail over
+                to the next mirror
+            dest_path: Destination file path
+            expected_size: Expected file size for validation
+            verify_ssl: Whether to verify SSL certificates
+            ui_enabled: Whether to show UI elements (progress/messages)
+            progress: Rich Progress instance for tracking (only used if ui_enabled=True)
+            client: Shared HTTP client to use (see create_http_client)
+            segments: Number of concurrent byte ranges for large files (1 disables segmenting)
+            min_segment_size: Minimum size of a single range in bytes
+            resume: Whether to keep partial data in a '.part' file and continue it
+                on the next call instead of starting from zero
+            cache: Download cache used to skip re-transferring unchanged files
+            checksum: Expected digest as 'algorithm:hexdigest' (any hashlib algorithm,
+                e.g. 'sha256:...' or 'blake2b:...'), verified while streaming
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            write_buffer_size: Bytes coalesced in memory before each disk write
+            rate_limiter: Shared token bucket, e.g. the aggregate bandwidth limit of a batch
+            max_rate: Bandwidth limit of this download in bytes per second
+            retry: Retry policy for transient failures (None disables retries)
+            race_mirrors: Whether to race the first bytes of all mirrors and start with the fastest
+            min_throughput: Minimum throughput in bytes per second before a transfer is
+                abandoned for the next mirror (or retried)
+            throughput_window: Seconds over which min_throughput is measured
+            multi_source: Whether to fetch different pieces from all mirrors at once, handing
+                the next piece to whichever mirror is free first (the cache is not used)
+            metalink: Metalink document (path or parsed AioMetalinkFile) adding mirrors,
+                the file size, a checksum and per-piece checksums
+            piece_size: Piece size of multi-source downloads in bytes (defaults to
+                the Metalink piece length or min_segment_size)
+            connections_per_source: Concurrent piece requests per mirror in multi-source mode
+            progress_throttle: Shared throttle batching progress updates (one is created if None)
+            progress_interval: Minimum seconds between progress bar updates of an own throttle
+            skip_existing: Keep an existing dest_path instead of downloading when it is up to
+                date: 'size' (expected_size or the remote Content-Length), 'checksum' (local
+                digest against checksum) or 'validators' (conditional HEAD against the
+                ETag/Last-Modified stamped on the file by an earlier 'validators' download;
+                not recorded by multi-source downloads). Only 'validators' works with decompress
+            link_mode: How a local source is materialized: 'auto' or 'reflink' (clone where
+                supported), 'hardlink' or 'copy'
+            accept_encoding: Whether to offer compressed transfer encodings and decode them
+                while streaming (single-stream downloads only, see _download_core)
+            decompress: Whether to decompress a '.gz', '.bz2', '.xz' or '.zst' URL into
+                dest_path while it streams in (checksum applies to the compressed file);
+                other URLs are downloaded as they are
+            delta: Block checksum control file of the new version (AioDeltaIndex, path or
+                URL), or True for '<url>.nbdelta' next to the file; only blocks missing
+                from delta_base are downloaded, over max(segments, 4) range requests at
+                a time. With True, a missing control file means a full download
+            delta_base: Previous version of the file reused by delta (defaults to dest_path)
+            result_callback: Optional callback receiving (success, error_message, total_size,
+                error_type) once the download is over, whichever way it ended; error_type
+                is the class of the exception behind a failure
+            
+        Returns:
+            True if download successful (or skipped as up to date), False otherwise
+            
+        Raises:
+            ValueError: If skip_existing is 'size' or 'checksum' and decompress is set
+        """
+        AioUtils._check_skip_policy(skip_existing, decompress)
+        dest_path = Path(dest_path)
+        
+        def finish(
+            success: bool,
+            error: Optional[str] = None,
+            total_size: Optional[int] = None,
+            error_type: Optional[type] = None,
+        ) -> bool:
+            if result_callback:
+                if success and not total_size:
+                    # Skipped files and responses without Content-Length
+                    total_size = dest_path.stat().st_size
+                result_callback(success, error, total_size, error_type)
+            return success
+        
+        piece_checksums = None
+        if metalink is not None:
+            try:
+                if not isinstance(metalink, AioMetalinkFile):
+                    document = AioMetalink.load(metalink)
+                    metalink = document.find(dest_path.name if len(document.files) > 1 else None)
+            except (OSError, ValueError, KeyError) as e:
+                if ui_enabled:
+                    ui.print(f"[red]Error reading Metalink {metalink}: {e}")
+                return finish(False, f"Error reading Metalink {metalink}: {e}", error_type=type(e))
+            urls = [url] if isinstance(url, str) else list(url or [])
+            url = urls + [u for u in metalink.urls if u not in urls]
+            checksum = checksum or metalink.checksum
+            expected_size = expected_size or metalink.size
+            if metalink.piece_checksums:
+                # Piece checksums only line up with the document's own piece length
+                piece_checksums = metalink.piece_checksums
+                piece_size = metalink.piece_size
+        
+        if skip_existing and dest_path.exists():
+            client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+            async with client_ctx as check_client:
+                if await AioUtils._is_up_to_date(
+                    url, dest_path, skip_existing, check_client, expected_size=expected_size, checksum=checksum
+                ):
+                    return finish(True)
+        
+        if max_rate:
+            rate_limiter = AioRateLimiter(max_rate, parent=rate_limiter)
+        
+        delta_index = None
+        if delta and (delta is not True or Path(delta_base or dest_path).is_file()):
+            client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+            async with client_ctx as delta_client:
+                try:
+                    delta_index = await AioUtils._load_delta_index(delta, url, delta_client)
+                except ValueError as e:
+                    if delta is not True:
+                        if ui_enabled:
+                            ui.print(f"[red]Error reading delta control file for {dest_path.name}: {e}")
+                        return finish(False, str(e), error_type=type(e))
+        
+        task_id = None
+        throttle = None
+        
+        # Setup progress tracking if UI is enabled
+        if ui_enabled and progress:
+            task_id = progress.add_task(
+                f"[cyan]Downloading {dest_path.name}",
+                total=0  # Will be updated when we know the size
+            )
+            throttle = progress_throttle or AioProgressThrottle(progress, interval=progress_interval)
+        
+        # Define progress callback: chunks are summed and reach rich at a bounded rate
+        def on_progress(chunk_size: int):
+            if throttle is not None:
+                throttle.advance(task_id, chunk_size)
+        
+        # Download using core functionality
+        source = AioUtils._local_source(url)
+        if source is not None:
+            success, error, total_size, error_type = await AioUtils._copy_local_core(
+                source,
+                dest_path,
+                progress_callback=on_progress if ui_enabled and progress else None,
+                checksum=checksum,
+                link_mode=link_mode,
+            )
+        elif decompress and AioUtils._compression_format(AioUtils._mirror_list(url)[0]):
+            success, error, total_size, error_type = await AioUtils._download_decompress_core(
+                url,
+                dest_path,
+                verify_ssl=verify_ssl,
+                progress_callback=on_progress if ui_enabled and progress else None,
+                client=client,
+                checksum=checksum,
+                chunk_size=chunk_size,
+                rate_limiter=rate_limiter,
+                retry=retry,
+                min_throughput=min_throughput,
+                throughput_window=throughput_window,
+            )
+        elif delta_index is not None:
+            success, error, total_size, error_type = await AioUtils._download_delta_core(
+                url,
+                dest_path,
+                delta_index,
+                base_path=delta_base,
+                verify_ssl=verify_ssl,
+                progress_callback=on_progress if ui_enabled and progress else None,
+                client=client,
+                checksum=checksum,
+                connections=max(segments, 4),
+                chunk_size=chunk_size,
+                write_buffer_size=write_buffer_size,
+                rate_limiter=rate_limiter,
+                retry=retry,
+                min_throughput=min_throughput,
+                throughput_window=throughput_window,
+            )
+        elif multi_source:
+            success, error, total_size, error_type = await AioUtils._download_multisource_core(
+                url,
+                dest_path,
+                piece_size=piece_size or min_segment_size,
+                connections_per_source=connections_per_source,
+                verify_ssl=verify_ssl,
+                progress_callback=on_progress if ui_enabled and progress else None,
+                client=client,
+                resume=resume,
+                checksum=checksum,
+                piece_checksums=piece_checksums,
+                expected_size=expected_size,
+                chunk_size=chunk_size,
+                write_buffer_size=write_buffer_size,
+                rate_limiter=rate_limiter,
+                retry=retry,
+                min_throughput=min_throughput,
+                throughput_window=throughput_window,
+            )
+        elif segments > 1:
+            success, error, total_size, error_type = await AioUtils._download_segmented_core(
+                url,
+                dest_path,
+                segments=segments,
+                min_segment_size=min_segment_size,
+                verify_ssl=verify_ssl,
+                progress_callback=on_progress if ui_enabled and progress else None,
+                client=client,
+                resume=resume,
+                cache=cache,
+                checksum=checksum,
+                chunk_size=chunk_size,
+                write_buffer_size=write_buffer_size,
+                rate_limiter=rate_limiter,
+                retry=retry,
+                race_mirrors=race_mirrors,
+                min_throughput=min_throughput,
+                throughput_window=throughput_window,
+                keep_validators=skip_existing == 'validators',
+            )
+        else:
+            success, error, total_size, error_type = await AioUtils._download_core(
+                url,
+                dest_path,
+                verify_ssl=verify_ssl,
+                progress_callback=on_progress if ui_enabled and progress else None,
+                client=client,
+                resume=resume,
+                cache=cache,
+                checksum=checksum,
+                chunk_size=chunk_size,
+                write_buffer_size=write_buffer_size,
+                rate_limiter=rate_limiter,
+                retry=retry,
+                race_mirrors=race_mirrors,
+                min_throughput=min_throughput,
+                throughput_window=throughput_window,
+                keep_validators=skip_existing == 'validators',
+                accept_encoding=accept_encoding,
+            )
+        
+        # Update total size for progress bar
+        if throttle is not None:
+            throttle.flush(task_id)
+        if ui_enabled and progress and task_id is not None and total_size:
+            progress.update(task_id, total=total_size)
+        
+        # Validate size if expected
+        if success and expected_size and dest_path.stat().st_size != expected_size:
+            if ui_enabled:
+                        ui.print(
+                    f"[yellow]Warning: Downloaded file size mismatch for {dest_path.name}"
+                )
+            return finish(False, f"Size mismatch: expected {expected_size} bytes, got {dest_path.stat().st_size}", total_size, ValueError)
+        
+        # Show error message if failed
+        if not success and ui_enabled:
+                ui.print(f"[red]Error downloading {url}: {error}")
+        
+        return finish(success, error, total_size, error_type)
+
+    @staticmethod
+    async def probe_sizes(
+        urls: Sequence[Union[str, Sequence[str], AioMetalinkFile]],
+        max_concurrent: int = 16,
+        verify_ssl: bool = True,
+        client: Optional[httpx.AsyncClient] = None,
+        host_limiter: Optional[AioHostLimiter] = None,
+    ) -> List[Optional[int]]:
+        """Learn the sizes of many downloads with concurrent HEAD requests.
+        
+        Mirror lists are asked through their first mirror, Metalink entries
+        report their declared size and local sources are stat'ed. Repeated URLs
+        are probed once.
+        
+        Args:
+            urls: URLs, mirror lists, AioMetalinkFile entries or local paths
+            max_concurrent: Maximum concurrent HEAD requests
+            verify_ssl: Whether to verify SSL certificates (ignored if client is given)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            host_limiter: Per-host caps the requests are subject to
+            
+        Returns:
+            Size in bytes of each URL, or None where it is unknown
+        """
+        keys = []
+        sizes: dict = {}
+        for url in urls:
+            if isinstance(url, AioMetalinkFile):
+                key = url.urls[0] if url.size is None and url.urls else url
+                if key is url:
+                    sizes[key] = url.size
+            else:
+                key = url if isinstance(url, (str, os.PathLike)) else AioUtils._mirror_list(url)[0]
+            keys.append(key)
+        pending = deque(key for key in dict.fromkeys(keys) if key not in sizes)
+        
+        async def probe(client: httpx.AsyncClient, key):
+            source = AioUtils._local_source(key)
+            if source is not None:
+                stat = await anyio.to_thread.run_sync(os.stat, source)
+                return stat.st_size
+            async with host_limiter.acquire(key) if host_limiter else nullcontext():
+                head = await client.head(key, headers={'Accept-Encoding': 'identity'})
+            head.raise_for_status()
+            size = head.headers.get('content-length')
+            return int(size) if size is not None else None
+        
+        async def worker(client: httpx.AsyncClient):
+            while pending:
+                key = pending.popleft()
+                try:
+                    sizes[key] = await probe(client, key)
+                except Exception:
+                    # Unknown size: the download itself will report the real error
+                    sizes[key] = None
+        
+        client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+        async with client_ctx as client:
+            async with anyio.create_task_group() as tg:
+                for _ in range(max(1, min(max_concurrent, len(pending)))):
+                    tg.start_soon(worker, client)
+        
+        return [sizes.get(key) for key in keys]
+
+    @staticmethod
+    async def _enumerate_entries(entries: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[tuple[int, Any]]:
+        """Yield (index, entry) pairs from a sync or async iterable, pulling lazily."""
+        index = 0
+        if hasattr(entries, '__aiter__'):
+            async for entry in entries:
+                yield index, entry
+                index += 1
+        else:
+            for entry in entries:
+                yield index, entry
+                index += 1
+
+    @staticmethod
+    def _primary_url(url: Union[str, Sequence[str], AioMetalinkFile]) -> str:
+        """The URL whose host a download of download_files counts against: that of its primary mirror."""
+        mirrors = url.urls if isinstance(url, AioMetalinkFile) else [url] if isinstance(url, (str, os.PathLike)) else list(url)
+        return mirrors[0] if mirrors else ''
+
+    @staticmethod
+    def _dedupe_keys(url, checksum: Optional[str], dedupe: bool = True, dedupe_checksums: bool = False) -> list:
+        """Keys under which an entry of download_files counts as a duplicate of an earlier one.
+        
+        Keys are 16-byte digests rather than the URLs themselves, so remembering
+        every finished entry of a streamed batch stays cheap.
+        """
+        keys = []
+        if dedupe and not isinstance(url, AioMetalinkFile):
+            keys.append(('url', url if isinstance(url, (str, os.PathLike)) else tuple(url)))
+        if dedupe_checksums and checksum:
+            try:
+                keys.append(('checksum', ':'.join(AioUtils._parse_checksum(checksum))))
+            except ValueError:
+                pass
+        return [hashlib.blake2b(repr(key).encode(), digest_size=16).digest() for key in keys]
+
+    @staticmethod
+    async def download_files(
+        downloads: Union[
+            Iterable[Union[tuple[Union[str, Sequence[str]], Path], tuple[Union[str, Sequence[str]], Path, Optional[str]]]],
+            AsyncIterable[Union[tuple[Union[str, Sequence[str]], Path], tuple[Union[str, Sequence[str]], Path, Optional[str]]]],
+        ],
+        max_concurrent: int = 5,
+        adaptive_concurrency: bool = False,
+        ui_enabled: bool = False,
+        ui: Optional['AioUi'] = global_ui,
+        verify_ssl: bool = True,
+        client: Optional[httpx.AsyncClient] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = 5.0,
+        http2: bool = False,
+        connect_timeout: Optional[float] = 30.0,
+        read_timeout: Optional[float] = 60.0,
+        pool_timeout: Optional[float] = None,
+        segments: int = 1,
+        resume: bool = False,
+        cache: Optional[AioDownloadCache] = None,
+        chunk_size: Optional[int] = None,
+        write_buffer_size: int = 1024 * 1024,
+        max_per_host: Optional[int] = None,
+        host_limits: Optional[dict[str, int]] = None,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        max_rate: Optional[float] = None,
+        max_rate_per_download: Optional[float] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        race_mirrors: bool = False,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        multi_source: bool = False,
+        connections_per_source: int = 1,
+        progress_interval: float = 0.1,
+        skip_existing: Optional[str] = None,
+        dedupe: bool = True,
+        dedupe_checksums: bool = False,
+        link_mode: str = 'auto',
+        accept_encoding: bool = False,
+        decompress: bool = False,
+        delta: bool = False,
+        largest_first: bool = False,
+        result_callback: Optional[Callable[[AioDownloadResult], Awaitable[None]]] = None,
+        deadline: Optional[float] = None,
+    ) -> List[bool]:
+        """Download multiple files in parallel.
+        
+        All downloads share one pooled HTTP client, so files from the same host
+        reuse warm keep-alive connections instead of paying a handshake each.
+        
+        Downloads are run by a fixed pool of workers that pull entries from
+        the (possibly lazy) input one at a time, so a huge manifest costs
+        memory for its results and the running downloads, plus (with dedupe)
+        a 16-byte key, destination and checksum per successfully downloaded
+        unique file to link later duplicates to.
+        
+        Per-host caps are acquired before the global limiter, so a download
+        waiting for its host never holds a global slot. With host caps the
+        pool has twice max_concurrent workers, and entries whose host is at
+        its cap are set aside (up to max(64, 8 * max_concurrent) of them) while
+        workers read ahead for the next URL whose host has capacity.
+        
+        With adaptive_concurrency, max_concurrent (and max_per_host) become
+        ceilings: an AioAdaptiveLimiter starts low, opens slots while the
+        measured throughput keeps improving and halves the limit on throughput
+        drops, 429/503 responses and failed transfers. With host caps every
+        host is tuned on its own, so one throttling server does not slow the
+        others down.
+        
+        With largest_first, the whole input is read and every URL is probed
+        with a HEAD request first (see probe_sizes); downloads then start in
+        order of decreasing size, so the biggest file does not start last while
+        other workers run out of work, and the UI shows a total bar sized up front.
+        Entries of unknown size start first, as they may be the largest.
+        
+        Entries repeating a URL (or, with dedupe_checksums, a checksum) of an
+        earlier entry are not fetched again: once the first download succeeds,
+        their destinations are materialized from it with link_file. Duplicates
+        that arrive while the first one is still running are queued behind it
+        instead of occupying a worker.
+        
+        Args:
+            downloads: Iterable or async iterable of (url, dest_path) or
+                (url, dest_path, checksum) tuples, where url may be a 'file://' URL or
+                local path, an ordered list of mirror URLs or an AioMetalinkFile and
+                checksum is 'algorithm:hexdigest' or None
+            max_concurrent: Maximum concurrent downloads
+            adaptive_concurrency: Whether to tune concurrency up to max_concurrent from
+                measured throughput and errors (per host with max_per_host or host_limits)
+            ui_enabled: Whether to show UI elements (progress bars/messages)
+            verify_ssl: Whether to verify SSL certificates (ignored if client is given)
+            client: Shared HTTP client to use (created for the batch if None)
+            max_connections: Maximum open connections in the pool
+            max_keepalive_connections: Maximum idle connections kept alive (defaults to max_concurrent)
+            keepalive_expiry: Seconds an idle connection is kept in the pool
+            http2: Whether to enable HTTP/2 multiplexing
+            connect_timeout: Seconds to establish a connection (see create_http_client)
+            read_timeout: Seconds to wait for the next chunk of a response
+            pool_timeout: Seconds to wait for a free connection from the pool
+            segments: Number of concurrent byte ranges per large file (1 disables segmenting)
+            resume: Whether to continue interrupted downloads from their '.part' files
+            cache: Download cache used to skip re-transferring unchanged files
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            write_buffer_size: Bytes coalesced in memory per download before each disk write
+            max_per_host: Maximum concurrent downloads from any single host
+            host_limits: Mapping of host patterns (e.g. '*.example.com') to a concurrency cap
+                shared by all matching hosts
+            rate_limiter: Shared token bucket for the whole batch; its rate can be changed
+                while the batch runs (takes precedence over max_rate)
+            max_rate: Aggregate bandwidth limit of the batch in bytes per second
+            max_rate_per_download: Bandwidth limit of each download in bytes per second
+            retry: Retry policy applied to each download (None disables retries)
+            race_mirrors: Whether downloads with several mirrors start with the fastest one
+            min_throughput: Minimum throughput per download in bytes per second before
+                failing over to the next mirror (or retrying)
+            throughput_window: Seconds over which min_throughput is measured
+            multi_source: Whether downloads with several mirrors fetch pieces from all of them at once
+            connections_per_source: Concurrent piece requests per mirror in multi-source mode
+            progress_interval: Minimum seconds between progress bar updates, shared by all downloads
+            skip_existing: Skip policy for files that are already up to date ('size',
+                'checksum' or 'validators', see download_file)
+            dedupe: Whether to fetch repeated URLs only once
+            dedupe_checksums: Whether entries with the same checksum are duplicates as well,
+                whatever their URLs
+            link_mode: How duplicates and local sources are materialized: 'auto', 'reflink',
+                'hardlink' or 'copy' (see link_file)
+            accept_encoding: Whether to offer compressed transfer encodings (see download_file)
+            decompress: Whether to decompress '.gz', '.bz2', '.xz' and '.zst' URLs while
+                they stream in (see download_file)
+            delta: Whether to update existing files from the '<url>.nbdelta' control file
+                published next to each URL, fetching only changed blocks (see download_file)
+            largest_first: Whether to probe sizes first and start the largest downloads first
+            result_callback: Coroutine function awaited with the AioDownloadResult of every
+                entry as soon as it is done; the reporting worker takes no new entry until
+                it returns (see download_files_iter)
+            deadline: Seconds the whole batch may take; downloads still running or not
+                started by then are cancelled (leaving no temporary files) and fail
+            
+        Returns:
+            List of success flags for each download
+            
+        Raises:
+            ValueError: If skip_existing is 'size' or 'checksum' and decompress is set
+        """
+        AioUtils._check_skip_policy(skip_existing, decompress)
+        if rate_limiter is None and max_rate:
+            rate_limiter = AioRateLimiter(max_rate)
+
+        # Use progress context only if UI is enabled
+        progress_ctx = ui.progress(ui_enabled=ui_enabled)
+        
+        if client is None:
+            client_ctx = AioUtils.create_http_client(
+                verify_ssl=verify_ssl,
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections if max_keepalive_connections is not None else max_concurrent,
+                keepalive_expiry=keepalive_expiry,
+                http2=http2,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                pool_timeout=pool_timeout,
+            )
+        else:
+            client_ctx = nullcontext(client)
+        
+        async with client_ctx as client:
+            with progress_ctx as progress:
+                if adaptive_concurrency:
+                    limiter = AioAdaptiveLimiter(max_concurrent, parent=rate_limiter)
+                    # Received bytes are metered by the adaptive limiters on their way to the rate limiter
+                    meter = limiter
+                else:
+                    limiter = anyio.CapacityLimiter(max_concurrent)
+                    meter = rate_limiter
+                host_limiter = None
+                if max_per_host or host_limits:
+                    host_limiter = AioHostLimiter(
+                        max_per_host or (max_concurrent if adaptive_concurrency else None),
+                        host_limits,
+                        adaptive=adaptive_concurrency,
+                        parent=meter,
+                    )
+                
+                def adaptive_for(url: str) -> Optional[AioAdaptiveLimiter]:
+                    """The adaptive limiter judging a URL: its host's, else the global one."""
+                    if not adaptive_concurrency:
+                        return None
+                    return (host_limiter.adaptive_for(url) if host_limiter else None) or limiter
+                
+                async def on_response(response: httpx.Response):
+                    if response.status_code in (429, 503):
+                        adaptive_for(str(response.request.url)).record_error()
+                
+                if adaptive_concurrency:
+                    # Throttling is seen on every response, including those retried
+                    client.event_hooks['response'].append(on_response)
+            
+                results: List[bool] = []
+                total_task_id = None
+                entries = AioUtils._enumerate_entries(downloads)
+                
+                if largest_first:
+                    downloads = [entry async for _, entry in entries]
+                    sizes = await AioUtils.probe_sizes(
+                        [entry[0] for entry in downloads],
+                        max_concurrent=max_concurrent,
+                        client=client,
+                        host_limiter=host_limiter,
+                    )
+                    # Longest processing time first
+                    order = sorted(range(len(downloads)), key=lambda i: (sizes[i] is not None, -(sizes[i] or 0)))
+                    results = [False] * len(downloads)
+                    
+                    async def planned_entries():
+                        for index in order:
+                            yield index, downloads[index]
+                    
+                    entries = planned_entries()
+                    if ui_enabled and progress:
+                        # Duplicates are linked, not transferred
+                        planned = {}
+                        for (url, *_), size in zip(downloads, sizes):
+                            key = tuple(url) if dedupe and isinstance(url, (list, tuple)) else url if dedupe else len(planned)
+                            planned[key] = size or 0
+                        total_task_id = progress.add_task(
+                            f"[bold cyan]Total ({len(downloads)} files)",
+                            total=sum(planned.values()),
+                        )
+                
+                throttle = None
+                if ui_enabled and progress:
+                    throttle = AioProgressThrottle(progress, interval=progress_interval, total_task_id=total_task_id)
+                entries_lock = anyio.Lock()
+                # Entries taken from the input but not reported yet: index -> (url, dest)
+                unfinished: dict = {}
+                # Entries taken from the input while their host had no free slot, oldest first
+                deferred: List[tuple] = []
+                look_ahead = max(64, max_concurrent * 8)
+                
+                async def download_with_limiter(index: int, url: Union[str, Sequence[str], AioMetalinkFile], dest: Path, checksum: Optional[str] = None):
+                    host_url = AioUtils._primary_url(url)
+                    metalink = None
+                    if isinstance(url, AioMetalinkFile):
+                        url, metalink = [], url
+                    outcome = (False, None, None)
+                    error_type = None
+                    
+                    def on_result(success, error, size, failure):
+                        nonlocal outcome, error_type
+                        outcome, error_type = (success, error, size), failure
+                    
+                    adaptive = adaptive_for(host_url) if host_url and AioUtils._local_source(host_url) is None else None
+                    async with host_limiter.acquire(host_url) if host_limiter else nullcontext(), limiter:
+                        started = time.monotonic()
+                        results[index] = await AioUtils.download_file(
+                            url, 
+                            dest, 
+                            ui_enabled=ui_enabled,
+                            progress=progress if ui_enabled else None,
+                            ui=ui,
+                            client=client,
+                            segments=segments,
+                            resume=resume,
+                            cache=cache,
+                            checksum=checksum,
+                            chunk_size=chunk_size,
+                            write_buffer_size=write_buffer_size,
+                            rate_limiter=adaptive or rate_limiter,
+                            max_rate=max_rate_per_download,
+                            retry=retry,
+                            race_mirrors=race_mirrors,
+                            min_throughput=min_throughput,
+                            throughput_window=throughput_window,
+                            multi_source=multi_source,
+                            metalink=metalink,
+                            connections_per_source=connections_per_source,
+                            progress_throttle=throttle,
+                            skip_existing=skip_existing,
+                            link_mode=link_mode,
+                            accept_encoding=accept_encoding,
+                            decompress=decompress,
+                            delta=delta or None,
+                            result_callback=on_result if result_callback or adaptive else None,
+                        )
+                        duration = time.monotonic() - started
+                    # Only failed transfers count; HTTP status errors are judged by on_response
+                    # (only 429/503 are throttling), bad content is no sign of overload
+                    if adaptive and error_type and issubclass(error_type, httpx.TransportError):
+                        adaptive.record_error()
+                    # Reported outside the limiters: a slow consumer holds up its worker, not a slot
+                    await report(index, metalink or url, dest, *outcome, duration)
+                
+                async def report(index: int, url, dest: Path, success: bool, error: Optional[str], size: Optional[int], duration: float):
+                    unfinished.pop(index, None)
+                    if result_callback:
+                        await result_callback(AioDownloadResult(index, url, Path(dest), success, size, duration, error))
+            
+                # Dedupe key -> running original: the duplicates waiting for it as
+                # (index, url, dest, checksum)
+                running: dict[bytes, list] = {}
+                # Dedupe key -> (dest, checksum) of a successfully downloaded original;
+                # failed originals are forgotten, their duplicates download on their own
+                finished: dict[bytes, tuple[str, Optional[str]]] = {}
+                
+                async def materialize(original: Optional[tuple], index: int, url, dest: Path, checksum: Optional[str]):
+                    """Give a duplicate the content of its finished original (None if it failed)."""
+                    if original is None:
+                        # Nothing to copy from: the duplicate gets its own chance
+                        await download_with_limiter(index, url, dest, checksum)
+                        return
+                    source, source_checksum = Path(original[0]), original[1]
+                    started = time.monotonic()
+                    try:
+                        if checksum and checksum != source_checksum:
+                            algorithm, expected_digest = AioUtils._parse_checksum(checksum)
+                            hasher = hashlib.new(algorithm)
+                            await anyio.to_thread.run_sync(AioUtils._hash_file, source, hasher)
+                            AioUtils._verify_digest(hasher, expected_digest)
+                        if Path(dest) != source:
+                            await anyio.to_thread.run_sync(AioUtils.link_file, source, dest, link_mode)
+                        size = source.stat().st_size
+                        results[index] = True
+                    except (OSError, ValueError) as e:
+                        if ui_enabled:
+                            ui.print(f"[red]Error copying {source} to {dest}: {e}")
+                        await report(index, url, dest, False, str(e), None, time.monotonic() - started)
+                        return
+                    await report(index, url, dest, True, None, size, time.monotonic() - started)
+                
+                def can_start(entry: tuple) -> bool:
+                    """Whether an entry can start without waiting for a busy host."""
+                    _, (url, dest, *checksum) = entry
+                    if host_limiter is None:
+                        return True
+                    keys = AioUtils._dedupe_keys(url, checksum[0] if checksum else None, dedupe, dedupe_checksums)
+                    # Duplicates are linked or wait for their original, taking no host slot
+                    return any(key in running or key in finished for key in keys) or host_limiter.has_capacity(AioUtils._primary_url(url))
+                
+                async def next_entry() -> Optional[tuple]:
+                    """Take the next entry to work on (with entries_lock held), None once all are taken.
+                    
+                    Entries whose host is at its limit are set aside, up to look_ahead of
+                    them, so a run of URLs from one busy host does not park every worker.
+                    """
+                    for position, entry in enumerate(deferred):
+                        if can_start(entry):
+                            return deferred.pop(position)
+                    while len(deferred) < look_ahead:
+                        try:
+                            entry = await entries.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        index, (url, dest, *_) = entry
+                        if index == len(results):
+                            results.append(False)
+                        unfinished[index] = (url, dest)
+                        if can_start(entry):
+                            return entry
+                        deferred.append(entry)
+                    # Every candidate waits for its host: queue up behind the oldest
+                    return deferred.pop(0) if deferred else None
+                
+                async def worker():
+                    while True:
+                        # Async generators must not be advanced by two workers at once
+                        async with entries_lock:
+                            entry = await next_entry()
+                            if entry is None:
+                                return
+                            index, (url, dest, *checksum) = entry
+                            checksum = checksum[0] if checksum else None
+                            keys = AioUtils._dedupe_keys(url, checksum, dedupe, dedupe_checksums)
+                            followers = next((running[key] for key in keys if key in running), None)
+                            if followers is not None:
+                                followers.append((index, url, dest, checksum))
+                                continue
+                            original = next((finished[key] for key in keys if key in finished), None)
+                            if original is None:
+                                followers = []
+                                for key in keys:
+                                    running[key] = followers
+                        
+                        if original is not None:
+                            await materialize(original, index, url, dest, checksum)
+                            continue
+                        
+                        await download_with_limiter(index, url, dest, checksum)
+                        if keys:
+                            original = (str(dest), checksum) if results[index] else None
+                            for key in keys:
+                                del running[key]
+                                if original is not None:
+                                    finished[key] = original
+                            for follower in followers:
+                                await materialize(original, *follower)
+                
+                try:
+                    with anyio.move_on_after(deadline) as deadline_scope:
+                        async with anyio.create_task_group() as tg:
+                            for _ in range(max_concurrent * 2 if host_limiter else max_concurrent):
+                                tg.start_soon(worker)
+                finally:
+                    if adaptive_concurrency:
+                        client.event_hooks['response'].remove(on_response)
+                if deadline_scope.cancelled_caught:
+                    if ui_enabled:
+                        ui.print(f"[yellow]Batch deadline of {deadline}s exceeded")
+                    # Cancelled downloads, then entries never started
+                    for index, (url, dest) in sorted(unfinished.items()):
+                        await report(index, url, dest, False, "Batch deadline exceeded", None, 0.0)
+                    async for index, (url, dest, *_) in entries:
+                        if index == len(results):
+                            results.append(False)
+                        await report(index, url, dest, False, "Batch deadline exceeded", None, 0.0)
+                
+                if total_task_id is not None:
+                    # Skipped and failed files never reach the planned total
+                    throttle.flush()
+                    progress.update(total_task_id, total=throttle.total_advanced)
+            
+                return results
+
+    @staticmethod
+    @asynccontextmanager
+    async def download_files_iter(
+        downloads: Union[Iterable[Any], AsyncIterable[Any]],
+        max_buffered: int = 0,
+        **options: Any,
+    ) -> AsyncIterator[AsyncIterator[AioDownloadResult]]:
+        """Download multiple files in parallel, receiving each result as it completes.
+        
+        Usage:
+            async with AioUtils.download_files_iter(downloads, max_concurrent=8) as results:
+                async for result in results:
+                    if result.success:
+                        await extract(result.path)
+        
+        Results arrive in completion order (see AioDownloadResult.index for the
+        input position). A worker whose result is not taken yet waits before
+        starting another download, so a slow consumer throttles the batch:
+        at most max_concurrent downloads plus max_buffered finished results
+        are ahead of it. The batch runs inside the async with block; leaving
+        the block (e.g. after a break) cancels the remaining downloads.
+        
+        Args:
+            downloads: Iterable or async iterable of entries, as for download_files
+            max_buffered: Finished results held for the consumer before workers wait
+            **options: Any other option of download_files
+            
+        Returns:
+            Async context manager giving an async iterator of the AioDownloadResult of every entry
+        """
+        send_stream, receive_stream = anyio.create_memory_object_stream(max_buffered)
+        
+        async def run_batch():
+            async with send_stream:
+                await AioUtils.download_files(downloads, result_callback=send_stream.send, **options)
+        
+        error = None
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(run_batch)
+            with receive_stream:
+                try:
+                    yield receive_stream
+                except Exception as e:
+                    # Raised again below, outside the task group, so it is not wrapped
+                    error = e
+                finally:
+                    # Left before every result was taken: cancel the remaining downloads
+                    tg.cancel_scope.cancel()
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def _download_shard(channel, shard: int, downloads: list, options: dict, ui_enabled: bool, report_results: bool) -> None:
+        """Run one shard of download_files_sharded in a worker process, reporting over channel."""
+        ui = AioQueueUi(channel, shard)
+        
+        async def report(result: AioDownloadResult):
+            channel.put(('result', shard, result))
+        
+        async def run_shard():
+            return await AioUtils.download_files(
+                downloads,
+                ui_enabled=ui_enabled,
+                ui=ui,
+                result_callback=report if report_results else None,
+                **options,
+            )
+        
+        try:
+            channel.put(('done', shard, anyio.run(run_shard)))
+        except BaseException as e:
+            channel.put(('failed', shard, repr(e)))
+
+    @staticmethod
+    def _shard_entries(
+        downloads: list,
+        processes: int,
+        host_limits: Optional[dict] = None,
+        dedupe: bool = True,
+        dedupe_checksums: bool = False,
+    ) -> tuple[List[List[int]], dict]:
+        """Deal the entries of download_files_sharded into one shard per process.
+        
+        Entries are dealt round-robin and duplicates follow their first occurrence.
+        Entries of a host pattern capped below the number of processes go to the
+        first min(cap, processes) shards only, so the cap is split between those
+        shards instead of limiting the number of processes.
+        
+        Returns:
+            Tuple of (entry indices of every shard, host_limits share of every shard)
+        """
+        host_limits = host_limits or {}
+        host_matcher = AioHostLimiter(host_limits=host_limits) if host_limits else None
+        pattern_shards = {pattern: max(1, min(limit, processes)) for pattern, limit in host_limits.items()}
+        # Entries dealt so far per pattern, None counting those of no pattern
+        dealt = dict.fromkeys([None, *host_limits], 0)
+        
+        shards: List[List[int]] = [[] for _ in range(processes)]
+        owners: dict = {}
+        for index, (url, dest, *checksum) in enumerate(downloads):
+            keys = AioUtils._dedupe_keys(url, checksum[0] if checksum else None, dedupe, dedupe_checksums)
+            pattern = host_matcher.pattern_for(AioUtils._primary_url(url)) if host_matcher else None
+            allowed = pattern_shards[pattern] if pattern else processes
+            # A duplicate outside its pattern's shards is fetched again rather than exceed the cap
+            shard = next((owners[key] for key in keys if key in owners and owners[key] < allowed), dealt[pattern] % allowed)
+            dealt[pattern] += 1
+            for key in keys:
+                owners.setdefault(key, shard)
+            shards[shard].append(index)
+        
+        # Shards without entries of a pattern never use its share
+        shard_host_limits = {pattern: max(1, limit // pattern_shards[pattern]) for pattern, limit in host_limits.items()}
+        return shards, shard_host_limits
+
+    @staticmethod
+    async def download_files_sharded(
+        downloads: Union[Iterable[Any], AsyncIterable[Any]],
+        processes: Optional[int] = None,
+        max_concurrent: int = 5,
+        ui_enabled: bool = False,
+        ui: Optional['AioUi'] = global_ui,
+        result_callback: Optional[Callable[[AioDownloadResult], Awaitable[None]]] = None,
+        **options: Any,
+    ) -> List[bool]:
+        """Download multiple files split across worker processes.
+        
+        At multi-gigabit rates one event loop runs out of CPU (TLS, HTTP
+        parsing and chunk handling all run on one core). Here the entries are
+        dealt round-robin into one shard per process, and every process runs
+        download_files on its shard with its own event loop and connection
+        pool. Entries repeating the URL (or, with dedupe_checksums, the
+        checksum) of an earlier entry go to that entry's shard, so duplicates
+        are still fetched once.
+        
+        Progress bars and messages of the workers are drawn by the parent's ui,
+        and result_callback runs in the parent. Batch-wide limits
+        (max_concurrent, max_connections, max_per_host, host_limits and
+        max_rate) are divided between the processes, rounding down; the
+        number of processes is capped by the smallest of max_concurrent,
+        max_connections and max_per_host, so no limit is exceeded (e.g.
+        max_per_host=2 runs two processes). Entries of a host pattern capped
+        below the number of processes are kept on as many shards as its cap,
+        so a small host limit does not serialize the other hosts. Objects bound to
+        one process (client, rate_limiter, cache) cannot be used. Workers are
+        spawned, so a script calling this needs an `if __name__ == "__main__":`
+        guard around its entry point.
+        
+        Args:
+            downloads: Iterable or async iterable of entries, as for download_files;
+                the input is read completely before the workers start
+            processes: Number of worker processes (defaults to the number of CPUs; capped
+                by the batch-wide limits)
+            max_concurrent: Maximum concurrent downloads of the whole batch
+            ui_enabled: Whether to show UI elements (progress bars/messages)
+            result_callback: Coroutine function awaited with the AioDownloadResult of every
+                entry as soon as it is done (index is the position in downloads)
+            **options: Any other option of download_files
+            
+        Returns:
+            List of success flags for each download
+            
+        Raises:
+            ValueError: If a client, rate_limiter or cache is given, or skip_existing
+                cannot be combined with decompress
+        """
+        for name in ('client', 'rate_limiter', 'cache'):
+            if options.get(name) is not None:
+                raise ValueError(f"{name} cannot be shared with worker processes")
+        AioUtils._check_skip_policy(options.get('skip_existing'), options.get('decompress', False))
+        
+        if isinstance(downloads, AsyncIterable):
+            downloads = [entry async for entry in downloads]
+        else:
+            downloads = list(downloads)
+        if not downloads:
+            return []
+        # One slot of every batch-wide cap per process at least, so dividing never raises a cap
+        caps = [max_concurrent, *(options[name] for name in ('max_connections', 'max_per_host') if options.get(name))]
+        processes = max(1, min(processes or os.cpu_count() or 1, len(downloads), *caps))
+        
+        shards, shard_host_limits = AioUtils._shard_entries(
+            downloads, processes, options.get('host_limits'), options.get('dedupe', True), options.get('dedupe_checksums', False),
+        )
+        
+        shard_options = dict(options, max_concurrent=max(1, max_concurrent // processes))
+        for name in ('max_connections', 'max_per_host'):
+            if shard_options.get(name):
+                shard_options[name] = max(1, shard_options[name] // processes)
+        if shard_host_limits:
+            shard_options['host_limits'] = shard_host_limits
+        if shard_options.get('max_rate'):
+            shard_options['max_rate'] = shard_options['max_rate'] / processes
+        
+        # Spawned, not forked: the parent's event loop and threads must not be copied
+        context = multiprocessing.get_context('spawn')
+        channel = context.Queue()
+        workers = [
+            context.Process(
+                target=AioUtils._download_shard,
+                args=(channel, shard, [downloads[index] for index in indices], shard_options, ui_enabled, result_callback is not None),
+                daemon=True,
+            )
+            for shard, indices in enumerate(shards)
+        ]
+        
+        def receive() -> list:
+            """Wait briefly for a message of the workers, then take all others queued."""
+            try:
+                messages = [channel.get(timeout=0.1)]
+            except queue.Empty:
+                return []
+            while len(messages) < 1000:
+                try:
+                    messages.append(channel.get_nowait())
+                except queue.Empty:
+                    break
+            return messages
+        
+        results = [False] * len(downloads)
+        running = set(range(processes))
+        task_ids: dict = {}
+        
+        with ui.progress(ui_enabled=ui_enabled) as progress:
+            try:
+                for worker in workers:
+                    worker.start()
+                while running:
+                    messages = await anyio.to_thread.run_sync(receive)
+                    for message in messages:
+                        kind, shard, *payload = message
+                        if kind == 'result':
+                            result, = payload
+                            result.index = shards[shard][result.index]
+                            await result_callback(result)
+                        elif kind == 'done':
+                            for local_index, success in enumerate(payload[0]):
+                                results[shards[shard][local_index]] = success
+                            running.discard(shard)
+                        elif kind == 'failed':
+                            if ui_enabled:
+                                ui.print(f"[red]Worker process {shard} failed: {payload[0]}")
+                            running.discard(shard)
+                        else:
+                            AioQueueUi.replay(message, ui, progress if ui_enabled else None, task_ids)
+                    if not messages:
+                        for shard in list(running):
+                            # Crashed without a word (e.g. killed): its entries stay failed
+                            if workers[shard].exitcode not in (None, 0):
+                                if ui_enabled:
+                                    ui.print(f"[red]Worker process {shard} exited with code {workers[shard].exitcode}")
+                                running.discard(shard)
+            finally:
+                if running:
+                    # Cancelled or failed: workers still downloading are stopped
+                    for worker in workers:
+                        if worker.is_alive():
+                            worker.terminate()
+                with anyio.CancelScope(shield=True):
+                    for worker in workers:
+                        if worker.pid is not None:
+                            await anyio.to_thread.run_sync(worker.join)
+                channel.close()
+        
+        return results
+
+    # ============================================================================
+    # DOWNLOAD TO MEMORY
+    # ============================================================================
+
+    @staticmethod
+    async def download_stream(
         url: str,
-        dest_path: Path,
         verify_ssl: bool = True,
+        client: Optional[httpx.AsyncClient] = None,
+        headers: Optional[dict] = None,
+        chunk_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
         progress_callback: Optional[Callable[[int], None]] = None,
-    ) -> tuple[bool, Optional[str], Optional[int]]:
-        """Core download functionality without UI.
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+    ) -> AsyncIterator[bytes]:
+        """Stream a response body as an async iterator of chunks, without touching disk.
+        
+        Usage:
+            async for chunk in AioUtils.download_stream(url, client=client, max_size=10 * 1024 * 1024):
+                parser.feed(chunk)
+        
+        A retry before the first chunk was yielded starts over; after that the
+        stream is continued with a Range/If-Range request, which requires a
+        strong validator from the server.
         
         Args:
-            url: URL to download from
-            dest_path: Destination file path
-            verify_ssl: Whether to verify SSL certificates
-            progress_callback: Optional callback for progress updates (receives bytes downloaded)
+            url: URL to fetch
+            verify_ssl: Whether to verify SSL certificates (ignored if client is given)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            headers: Extra request headers
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            max_size: Largest body accepted in bytes (None for unlimited)
+            rate_limiter: Token bucket consulted for every received chunk (bandwidth limit)
+            retry: Retry policy for transient failures (None disables retries)
+            progress_callback: Optional callback for progress updates (receives bytes received)
+            min_throughput: Minimum throughput in bytes per second; a slower transfer is
+                abandoned and handed to the retry policy (time spent by the consumer counts)
+            throughput_window: Seconds over which min_throughput is measured
             
-        Returns:
-            Tuple of (success, error_message, total_size)
+        Raises:
+            ValueError: If the body is larger than max_size or cannot be continued after a failure
+            httpx.HTTPError: If the request fails for good
         """
-        dest_path = Path(dest_path)
-        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+        received = 0
+        validator = None
+        attempt_number = 1
+        watchdog = AioThroughputWatchdog(min_throughput, throughput_window) if min_throughput else None
+        
+        async with client_ctx as client:
+            while True:
+                request_headers = dict(headers or {})
+                if received:
+                    # Offsets count decoded bytes, which only the identity encoding lines up with
+                    request_headers.update({'Range': f'bytes={received}-', 'If-Range': validator, 'Accept-Encoding': 'identity'})
+                try:
+                    async with client.stream('GET', url, headers=request_headers) as response:
+                        response.raise_for_status()
+                        if received:
+                            AioUtils._check_partial_response(response)
+                        else:
+                            content_length = int(response.headers.get('content-length', 0))
+                            # Refuse oversized bodies before reading any of them
+                            if max_size is not None and content_length > max_size:
+                                raise ValueError(f"Response of {content_length} bytes exceeds max_size of {max_size} bytes")
+                            # An encoded body cannot be continued from a decoded offset
+                            if response.headers.get('content-encoding', 'identity').lower() == 'identity':
+                                validator = AioUtils._if_range_validator({
+                                    'etag': response.headers.get('etag'),
+                                    'last_modified': response.headers.get('last-modified'),
+                                })
+                        if watchdog:
+                            watchdog.reset()
+                        async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+                            # Before counting: an abandoned chunk is fetched again
+                            await AioUtils._meter_chunk(len(chunk), progress_callback, rate_limiter, watchdog)
+                            received += len(chunk)
+                            if max_size is not None and received > max_size:
+                                raise ValueError(f"Response exceeds max_size of {max_size} bytes")
+                            yield chunk
+                    return
+                except Exception as e:
+                    # Chunks already handed out cannot be taken back: continue only with a validator
+                    if retry is not None and (not received or validator) and retry.should_retry(attempt_number, e):
+                        await anyio.sleep(retry.delay(attempt_number, e))
+                        attempt_number += 1
+                        continue
+                    raise
+
+    @staticmethod
+    async def _download_bytes_core(
+        url: str,
+        verify_ssl: bool = True,
+        client: Optional[httpx.AsyncClient] = None,
+        headers: Optional[dict] = None,
+        checksum: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+    ) -> tuple[bool, Optional[str], Optional[bytes]]:
+        """Core in-memory download without UI.
         
+        Returns:
+            Tuple of (success, error_message, content)
+        """
         try:
-            async with httpx.AsyncClient(verify=verify_ssl, timeout=3600.0) as client:
-                async with client.stream('GET', url) as response:
-                    response.raise_for_status()
-                    
-                    total_size = int(response.headers.get('content-length', 0))
-                    
-                    async with await anyio.open_file(dest_path, 'wb') as f:
-                        async for chunk in response.aiter_bytes(chunk_size=8192):
-                            await f.write(chunk)
-                            if progress_callback:
-                                progress_callback(len(chunk))
-                    
-                    return (True, None, total_size)
-                    
+            hasher = None
+            if checksum:
+                algorithm, expected = AioUtils._parse_checksum(checksum)
+                hasher = hashlib.new(algorithm)
+            
+            chunks = []
+            async for chunk in AioUtils.download_stream(
+                url,
+                verify_ssl=verify_ssl,
+                client=client,
+                headers=headers,
+                chunk_size=chunk_size,
+                max_size=max_size,
+                rate_limiter=rate_limiter,
+                retry=retry,
+                progress_callback=progress_callback,
+                min_throughput=min_throughput,
+                throughput_window=throughput_window,
+            ):
+                chunks.append(chunk)
+            
+            content = b''.join(chunks)
+            if hasher is not None:
+                hasher.update(content)
+                AioUtils._verify_digest(hasher, expected)
+            
+            return (True, None, content)
+            
         except Exception as e:
-            if dest_path.exists():
-                dest_path.unlink()
             return (False, str(e), None)
 
     @staticmethod
-    async def download_file(
+    async def download_bytes(
         url: str,
-        dest_path: Path,
-        expected_size: Optional[int] = None,
         verify_ssl: bool = True,
         ui_enabled: bool = False,
         progress: Optional[Progress] = None,
         ui: Optional['AioUi'] = global_ui,
-    ) -> bool:
-        """Download a file asynchronously with optional progress tracking.
+        client: Optional[httpx.AsyncClient] = None,
+        headers: Optional[dict] = None,
+        checksum: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        progress_throttle: Optional[AioProgressThrottle] = None,
+        progress_interval: float = 0.1,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+    ) -> Optional[bytes]:
+        """Download a response body into memory.
         
         Args:
-            url: URL to download from
-            dest_path: Destination file path
-            expected_size: Expected file size for validation
+            url: URL to fetch
             verify_ssl: Whether to verify SSL certificates
             ui_enabled: Whether to show UI elements (progress/messages)
             progress: Rich Progress instance for tracking (only used if ui_enabled=True)
+            client: Shared HTTP client to use (see create_http_client)
+            headers: Extra request headers
+            checksum: Expected digest as 'algorithm:hexdigest' (e.g. 'sha256:ab12...')
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            max_size: Largest body accepted in bytes; bigger responses fail without being buffered
+            rate_limiter: Shared token bucket limiting bandwidth
+            retry: Retry policy for transient failures (None disables retries)
+            progress_throttle: Shared throttle batching progress updates (one is created if None)
+            progress_interval: Minimum seconds between progress bar updates of an own throttle
+            min_throughput: Minimum throughput in bytes per second before a transfer is
+                abandoned and handed to the retry policy
+            throughput_window: Seconds over which min_throughput is measured
             
         Returns:
-            True if download successful, False otherwise
+            The body as bytes, or None if the download failed
         """
-        dest_path = Path(dest_path)
+        name = url.split('?')[0].rstrip('/').split('/')[-1] or url
         
         task_id = None
-        
-        # Setup progress tracking if UI is enabled
+        throttle = None
         if ui_enabled and progress:
-            task_id = progress.add_task(
-                f"[cyan]Downloading {dest_path.name}",
-                total=0  # Will be updated when we know the size
-            )
+            task_id = progress.add_task(f"[cyan]Fetching {name}", total=0)
+            throttle = progress_throttle or AioProgressThrottle(progress, interval=progress_interval)
         
-        # Define progress callback
         def on_progress(chunk_size: int):
-            if ui_enabled and progress and task_id is not None:
-                progress.update(task_id, advance=chunk_size)
+            if throttle is not None:
+                throttle.advance(task_id, chunk_size)
         
-        # Download using core functionality
-        success, error, total_size = await AioUtils._download_core(
+        success, error, content = await AioUtils._download_bytes_core(
             url,
-            dest_path,
             verify_ssl=verify_ssl,
+            client=client,
+            headers=headers,
+            checksum=checksum,
+            chunk_size=chunk_size,
+            max_size=max_size,
+            rate_limiter=rate_limiter,
+            retry=retry,
             progress_callback=on_progress if ui_enabled and progress else None,
+            min_throughput=min_throughput,
+            throughput_window=throughput_window,
         )
         
-        # Update total size for progress bar
-        if ui_enabled and progress and task_id is not None and total_size:
-            progress.update(task_id, total=total_size)
-        
-        # Validate size if expected
-        if success and expected_size and dest_path.stat().st_size != expected_size:
-            if ui_enabled:
-                        ui.print(
-                    f"[yellow]Warning: Downloaded file size mismatch for {dest_path.name}"
-                )
-            return False
+        if throttle is not None:
+            throttle.flush(task_id)
+        if ui_enabled and progress and task_id is not None and content is not None:
+            progress.update(task_id, total=len(content))
         
-        # Show error message if failed
-        if not success and ui_enabled:
-                ui.print(f"[red]Error downloading {url}: {error}")
+        if ui_enabled and not success:
+            ui.print(f"[red]Error fetching {url}: {error}")
         
-        return success
+        return content
 
     @staticmethod
-    async def download_files(
-        downloads: List[tuple[str, Path]],
-        max_concurrent: int = 5,
+    async def download_bytes_many(
+        urls: Union[Iterable[str], AsyncIterable[str]],
+        max_concurrent: int = 20,
         ui_enabled: bool = False,
         ui: Optional['AioUi'] = global_ui,
-    ) -> List[bool]:
-        """Download multiple files in parallel.
+        verify_ssl: bool = True,
+        client: Optional[httpx.AsyncClient] = None,
+        max_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = 5.0,
+        http2: bool = False,
+        connect_timeout: Optional[float] = 30.0,
+        read_timeout: Optional[float] = 60.0,
+        pool_timeout: Optional[float] = None,
+        headers: Optional[dict] = None,
+        chunk_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        max_per_host: Optional[int] = None,
+        host_limits: Optional[dict[str, int]] = None,
+        max_rate: Optional[float] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        progress_interval: float = 0.1,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        deadline: Optional[float] = None,
+    ) -> List[Optional[bytes]]:
+        """Download many small response bodies into memory over a shared client.
+        
+        Meant for crawls of many small documents (e.g. JSON indexes), where
+        writing every response to disk and reading it back would dominate.
+        A fixed pool of workers pulls URLs lazily like download_files; the UI
+        shows a single bar counting documents rather than one bar per URL.
         
         Args:
-            downloads: List of (url, dest_path) tuples
-            max_concurrent: Maximum concurrent downloads
-            ui_enabled: Whether to show UI elements (progress bars/messages)
+            urls: Iterable or async iterable of URLs
+            max_concurrent: Maximum concurrent requests
+            ui_enabled: Whether to show UI elements (progress bar/messages)
+            verify_ssl: Whether to verify SSL certificates (ignored if client is given)
+            client: Shared HTTP client to use (created for the batch if None)
+            max_connections: Maximum open connections in the pool
+            keepalive_expiry: Seconds an idle connection is kept in the pool
+            http2: Whether to enable HTTP/2 multiplexing
+            connect_timeout: Seconds to establish a connection (see create_http_client)
+            read_timeout: Seconds to wait for the next chunk of a response
+            pool_timeout: Seconds to wait for a free connection from the pool
+            headers: Extra request headers sent with every request
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            max_size: Largest body accepted per URL in bytes (None for unlimited)
+            max_per_host: Maximum concurrent requests to any single host
+            host_limits: Mapping of host patterns (e.g. '*.example.com') to a concurrency cap
+                shared by all matching hosts
+            max_rate: Aggregate bandwidth limit of the batch in bytes per second
+            retry: Retry policy applied to each URL (None disables retries)
+            progress_interval: Minimum seconds between progress bar updates
+            min_throughput: Minimum throughput in bytes per second before a transfer is
+                abandoned and handed to the retry policy
+            throughput_window: Seconds over which min_throughput is measured
+            deadline: Seconds the whole batch may take; requests still running or not
+                started by then are abandoned and yield None
             
         Returns:
-            List of success flags for each download
+            List with the body of each URL, or None where the download failed
         """
-        # Use progress context only if UI is enabled
         progress_ctx = ui.progress(ui_enabled=ui_enabled)
+        rate_limiter = AioRateLimiter(max_rate) if max_rate else None
         
-        with progress_ctx as progress:
-            limiter = anyio.CapacityLimiter(max_concurrent)
-            
-            results = [False] * len(downloads)
-            
-            async def download_with_limiter(index: int, url: str, dest: Path):
-                async with limiter:
-                    results[index] = await AioUtils.download_file(
-                        url, 
-                        dest, 
-                        ui_enabled=ui_enabled,
-                        progress=progress if ui_enabled else None,
-                        ui=ui,
-                    )
-            
-            async with anyio.create_task_group() as tg:
-                for i, (url, dest) in enumerate(downloads):
-                    tg.start_soon(download_with_limiter, i, url, dest)
-            
-            return results
+        if client is None:
+            client_ctx = AioUtils.create_http_client(
+                verify_ssl=verify_ssl,
+                max_connections=max_connections,
+                max_keepalive_connections=max_concurrent,
+                keepalive_expiry=keepalive_expiry,
+                http2=http2,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                pool_timeout=pool_timeout,
+            )
+        else:
+            client_ctx = nullcontext(client)
+        
+        async with client_ctx as client:
+            with progress_ctx as progress:
+                limiter = anyio.CapacityLimiter(max_concurrent)
+                host_limiter = AioHostLimiter(max_per_host, host_limits) if max_per_host or host_limits else None
+                
+                results: List[Optional[bytes]] = []
+                throttle = None
+                task_id = None
+                if ui_enabled and progress:
+                    task_id = progress.add_task("[cyan]Fetching documents", total=None)
+                    throttle = AioProgressThrottle(progress, interval=progress_interval)
+                entries = AioUtils._enumerate_entries(urls)
+                entries_lock = anyio.Lock()
+                
+                async def worker():
+                    while True:
+                        async with entries_lock:
+                            try:
+                                index, url = await entries.__anext__()
+                            except StopAsyncIteration:
+                                return
+                            results.append(None)
+                        
+                        async with host_limiter.acquire(url) if host_limiter else nullcontext(), limiter:
+                            success, error, results[index] = await AioUtils._download_bytes_core(
+                                url,
+                                client=client,
+                                headers=headers,
+                                chunk_size=chunk_size,
+                                max_size=max_size,
+                                rate_limiter=rate_limiter,
+                                retry=retry,
+                                min_throughput=min_throughput,
+                                throughput_window=throughput_window,
+                            )
+                        if throttle is not None:
+                            throttle.advance(task_id, 1)
+                        if ui_enabled and not success:
+                            ui.print(f"[red]Error fetching {url}: {error}")
+                
+                with anyio.move_on_after(deadline) as deadline_scope:
+                    async with anyio.create_task_group() as tg:
+                        for _ in range(max_concurrent * 2 if host_limiter else max_concurrent):
+                            tg.start_soon(worker)
+                if deadline_scope.cancelled_caught:
+                    if ui_enabled:
+                        ui.print(f"[yellow]Batch deadline of {deadline}s exceeded")
+                    # Entries never started still get their (empty) result
+                    async for index, url in entries:
+                        results.append(None)
+                
+                if throttle is not None:
+                    throttle.flush(task_id)
+                    progress.update(task_id, total=len(results))
+                
+                return results
 
     # ============================================================================
     # EXTRACT ZIP
@@ -322,6 +3075,516 @@ class AioUtils:
         
         return success
 
+    # ============================================================================
+    # DOWNLOAD + EXTRACT / DECOMPRESS
+    # ============================================================================
+
+    @staticmethod
+    def _archive_format(name: str) -> Optional[str]:
+        """Return 'zip' or 'tar' based on a file name or URL, or None if unknown."""
+        name = name.split('?')[0].split('#')[0].lower()
+        if name.endswith('.zip'):
+            return 'zip'
+        if name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')):
+            return 'tar'
+        return None
+
+    @staticmethod
+    def _compression_format(name: str) -> Optional[str]:
+        """Return 'gzip', 'bz2', 'xz' or 'zstd' for a compressed single file name or URL, or None."""
+        name = name.split('?')[0].split('#')[0].lower()
+        for suffix, compression in (('.gz', 'gzip'), ('.bz2', 'bz2'), ('.xz', 'xz'), ('.zst', 'zstd')):
+            if name.endswith(suffix):
+                return compression
+        return None
+
+    @staticmethod
+    def _open_decompressor(compression: str, fileobj):
+        """Wrap a readable binary file object in a streaming decompressor. Blocking use only.
+        
+        Raises:
+            ValueError: If the format is unknown or zstd support is not installed
+        """
+        if compression == 'gzip':
+            return gzip.GzipFile(fileobj=fileobj, mode='rb')
+        if compression == 'bz2':
+            return bz2.BZ2File(fileobj, mode='rb')
+        if compression == 'xz':
+            return lzma.LZMAFile(fileobj, mode='rb')
+        if compression == 'zstd':
+            try:
+                from compression import zstd
+                return zstd.ZstdFile(fileobj, mode='rb')
+            except ImportError:
+                pass
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd decompression requires Python 3.14 or the optional 'zstandard' package")
+            return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True)
+        raise ValueError(f"Unsupported compression format: {compression}")
+
+    @staticmethod
+    async def _download_decompress_core(
+        url: Union[str, Sequence[str]],
+        dest_path: Path,
+        compression: Optional[str] = None,
+        verify_ssl: bool = True,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        checksum: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+    ) -> tuple[bool, Optional[str], Optional[int], Optional[type]]:
+        """Core streaming download + decompression of a single compressed file without UI.
+        
+        The compressed body is piped into a decompressor running in a worker
+        thread, which writes the uncompressed data to a temp file renamed over
+        dest_path once complete; the compressed file never touches disk.
+        
+        Args:
+            url: URL of the compressed file, or an ordered list of mirror URLs (the next
+                mirror is tried as long as no data has been decompressed yet)
+            dest_path: Destination of the uncompressed file
+            compression: 'gzip', 'bz2', 'xz' or 'zstd' (detected from the URL if None)
+            verify_ssl: Whether to verify SSL certificates
+            progress_callback: Optional callback for progress updates (receives compressed bytes downloaded)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            checksum: Expected digest of the compressed file as served, as 'algorithm:hexdigest'
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            rate_limiter: Token bucket consulted for every received chunk (bandwidth limit)
+            retry: Retry policy for transient failures (see download_stream)
+            min_throughput: Minimum throughput in bytes per second before a transfer is
+                abandoned and handed to the retry policy
+            throughput_window: Seconds over which min_throughput is measured
+            
+        Returns:
+            Tuple of (success, error_message, total_size, error_type) where total_size counts compressed bytes
+        """
+        dest_path = Path(dest_path)
+        try:
+            sources = AioUtils._mirror_list(url)
+            compression = compression or AioUtils._compression_format(sources[0])
+            if compression not in ('gzip', 'bz2', 'xz', 'zstd'):
+                raise ValueError(f"Unsupported compression format for '{sources[0]}'")
+            hasher = None
+            if checksum:
+                algorithm, expected = AioUtils._parse_checksum(checksum)
+                hasher = hashlib.new(algorithm)
+            
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = AioUtils._temp_path(dest_path)
+            with AioUtils._cleanup_partial(temp_path):
+                pipe = AioBytePipe()
+                received = 0
+                errors: List[Exception] = []
+                
+                def _decompress():
+                    try:
+                        with AioUtils._open_decompressor(compression, pipe) as reader, open(temp_path, 'wb') as f:
+                            shutil.copyfileobj(reader, f, 1024 * 1024)
+                    finally:
+                        pipe.close()
+                
+                async def run_decompress():
+                    try:
+                        await anyio.to_thread.run_sync(_decompress)
+                    except Exception as e:
+                        errors.append(e)
+                        tg.cancel_scope.cancel()
+                
+                async def run_download(client: httpx.AsyncClient):
+                    nonlocal received
+                    try:
+                        for index, source in enumerate(sources):
+                            try:
+                                # The decompressor needs the file as stored, not a transfer encoding
+                                async for chunk in AioUtils.download_stream(
+                                    source,
+                                    client=client,
+                                    headers={'Accept-Encoding': 'identity'},
+                                    chunk_size=chunk_size,
+                                    rate_limiter=rate_limiter,
+                                    retry=retry,
+                                    progress_callback=progress_callback,
+                                    min_throughput=min_throughput,
+                                    throughput_window=throughput_window,
+                                ):
+                                    if hasher is not None:
+                                        hasher.update(chunk)
+                                    received += len(chunk)
+                                    await pipe.feed(chunk)
+                                break
+                            except Exception:
+                                # Bytes already decompressed cannot be taken back
+                                if received or index == len(sources) - 1:
+                                    raise
+                        if hasher is not None:
+                            AioUtils._verify_digest(hasher, expected)
+                        await pipe.feed_eof()
+                    except Exception as e:
+                        errors.append(e)
+                        # Unblock the decompressor; it fails instead of seeing a truncated stream
+                        await pipe.feed_error(e)
+                    except BaseException as e:
+                        # Cancelled (e.g. by a batch deadline): the decompressor thread must not wait for more data
+                        pipe.abort(e)
+                        raise
+                
+                client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+                async with client_ctx as client:
+                    async with anyio.create_task_group() as tg:
+                        tg.start_soon(run_decompress)
+                        tg.start_soon(run_download, client)
+                
+                if errors:
+                    raise errors[0]
+                
+                os.replace(temp_path, dest_path)
+                return (True, None, received, None)
+            
+        except Exception as e:
+            return (False, str(e), None, type(e))
+
+    @staticmethod
+    async def _download_extract_core(
+        url: str,
+        dest_dir: Path,
+        archive_format: Optional[str] = None,
+        filter: str = 'data',
+        verify_ssl: bool = True,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        chunk_size: Optional[int] = None,
+        zip_spool_size: int = 64 * 1024 * 1024,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        checksum: Optional[str] = None,
+    ) -> tuple[bool, Optional[str], Optional[int]]:
+        """Core streaming download + extraction without UI.
+        
+        The response body is piped into an extractor running in a worker thread,
+        so decompression overlaps the transfer and TAR archives never touch disk.
+        ZIP archives keep their directory at the end of the file and cannot be
+        extracted sequentially; they are spooled in memory (spilling to a
+        temporary file beyond zip_spool_size) and extracted once complete.
+        
+        Args:
+            url: URL of the archive
+            dest_dir: Destination directory
+            archive_format: 'tar' or 'zip' (detected from the URL if None)
+            filter: Filter level for tarfile.extractall ('data', 'tar', or 'fully_trusted')
+            verify_ssl: Whether to verify SSL certificates
+            progress_callback: Optional callback for progress updates (receives bytes downloaded)
+            client: Shared HTTP client to use (a one-off client is created if None)
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            zip_spool_size: Bytes of a ZIP archive kept in memory before spilling to disk
+            rate_limiter: Token bucket consulted for every received chunk (bandwidth limit)
+            retry: Retry policy for transient failures; once the extractor has consumed
+                data, a retry continues the stream with a Range/If-Range request and
+                is only possible if the server sent a strong validator
+            min_throughput: Minimum throughput in bytes per second before a transfer is
+                abandoned and handed to the retry policy
+            throughput_window: Seconds over which min_throughput is measured
+            checksum: Expected digest of the archive as 'algorithm:hexdigest'; a mismatch
+                fails the extraction, but only once the whole archive was read, so TAR
+                members streamed out before stay on disk (ZIP archives are not extracted)
+            
+        Returns:
+            Tuple of (success, error_message, total_size)
+        """
+        dest_dir = Path(dest_dir)
+        archive_format = archive_format or AioUtils._archive_format(url)
+        if archive_format not in ('tar', 'zip'):
+            return (False, f"Unsupported archive format for '{url}'", None)
+        hasher = None
+        if checksum:
+            try:
+                algorithm, expected = AioUtils._parse_checksum(checksum)
+            except ValueError as e:
+                return (False, str(e), None)
+            hasher = hashlib.new(algorithm)
+        
+        pipe = AioBytePipe()
+        total_size = None
+        errors: List[Exception] = []
+        
+        def _extract():
+            try:
+                if archive_format == 'zip':
+                    with tempfile.SpooledTemporaryFile(max_size=zip_spool_size) as spool:
+                        shutil.copyfileobj(pipe, spool)
+                        spool.seek(0)
+                        with zipfile.ZipFile(spool, 'r') as zip_ref:
+                            zip_ref.extractall(dest_dir)
+                else:
+                    with tarfile.open(fileobj=pipe, mode='r|*') as tar_ref:
+                        tar_ref.extractall(dest_dir, filter=filter)
+            finally:
+                pipe.close()
+        
+        async def run_extract():
+            try:
+                await anyio.to_thread.run_sync(_extract)
+            except Exception as e:
+                errors.append(e)
+                tg.cancel_scope.cancel()
+        
+        async def run_download(client: httpx.AsyncClient):
+            nonlocal total_size
+            received = 0
+            try:
+                # Continuing mid-archive after a failure is left to download_stream (Range/If-Range)
+                async for chunk in AioUtils.download_stream(
+                    url,
+                    client=client,
+                    chunk_size=chunk_size,
+                    rate_limiter=rate_limiter,
+                    retry=retry,
+                    progress_callback=progress_callback,
+                    min_throughput=min_throughput,
+                    throughput_window=throughput_window,
+                ):
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    received += len(chunk)
+                    await pipe.feed(chunk)
+                total_size = received
+                if hasher is not None:
+                    AioUtils._verify_digest(hasher, expected)
+                await pipe.feed_eof()
+            except Exception as e:
+                errors.append(e)
+                # Unblock the extractor; it fails instead of seeing a truncated archive
+                await pipe.feed_error(e)
+            except BaseException as e:
+                # Cancelled (e.g. by a batch deadline): the extractor thread must not wait for more data
+                pipe.abort(e)
+                raise
+        
+        client_ctx = nullcontext(client) if client is not None else AioUtils.create_http_client(verify_ssl=verify_ssl)
+        
+        try:
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            
+            async with client_ctx as client:
+                async with anyio.create_task_group() as tg:
+                    tg.start_soon(run_extract)
+                    tg.start_soon(run_download, client)
+            
+            if errors:
+                raise errors[0]
+            
+            return (True, None, total_size)
+            
+        except Exception as e:
+            return (False, str(e), None)
+
+    @staticmethod
+    async def download_extract(
+        url: str,
+        dest_dir: Path,
+        archive_format: Optional[str] = None,
+        filter: str = 'data',
+        verify_ssl: bool = True,
+        ui_enabled: bool = False,
+        progress: Optional[Progress] = None,
+        ui: Optional['AioUi'] = global_ui,
+        client: Optional[httpx.AsyncClient] = None,
+        chunk_size: Optional[int] = None,
+        rate_limiter: Optional[AioRateLimiter] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        progress_throttle: Optional[AioProgressThrottle] = None,
+        progress_interval: float = 0.1,
+        checksum: Optional[str] = None,
+    ) -> bool:
+        """Download an archive and extract it while it streams in, without saving it.
+        
+        Args:
+            url: URL of the archive
+            dest_dir: Destination directory
+            archive_format: 'tar' or 'zip' (detected from the URL if None)
+            filter: Filter level for tarfile.extractall ('data', 'tar', or 'fully_trusted')
+            verify_ssl: Whether to verify SSL certificates
+            ui_enabled: Whether to show UI elements (progress/messages)
+            progress: Rich Progress instance for tracking (only used if ui_enabled=True)
+            client: Shared HTTP client to use (see create_http_client)
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            rate_limiter: Shared token bucket limiting bandwidth
+            retry: Retry policy for transient failures (None disables retries)
+            min_throughput: Minimum throughput in bytes per second before a transfer is
+                abandoned and handed to the retry policy
+            throughput_window: Seconds over which min_throughput is measured
+            progress_throttle: Shared throttle batching progress updates (one is created if None)
+            progress_interval: Minimum seconds between progress bar updates of an own throttle
+            checksum: Expected digest of the archive as 'algorithm:hexdigest' (see _download_extract_core)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        dest_dir = Path(dest_dir)
+        name = url.split('?')[0].rstrip('/').split('/')[-1] or url
+        
+        task_id = None
+        throttle = None
+        if ui_enabled and progress:
+            task_id = progress.add_task(f"[cyan]Downloading + extracting {name}", total=0)
+            throttle = progress_throttle or AioProgressThrottle(progress, interval=progress_interval)
+        
+        def on_progress(chunk_size: int):
+            if throttle is not None:
+                throttle.advance(task_id, chunk_size)
+        
+        success, error, total_size = await AioUtils._download_extract_core(
+            url,
+            dest_dir,
+            archive_format=archive_format,
+            filter=filter,
+            verify_ssl=verify_ssl,
+            progress_callback=on_progress if ui_enabled and progress else None,
+            client=client,
+            chunk_size=chunk_size,
+            rate_limiter=rate_limiter,
+            retry=retry,
+            min_throughput=min_throughput,
+            throughput_window=throughput_window,
+            checksum=checksum,
+        )
+        
+        if throttle is not None:
+            throttle.flush(task_id)
+        if ui_enabled and progress and task_id is not None and total_size:
+            progress.update(task_id, total=total_size)
+        
+        if ui_enabled:
+            if success:
+                ui.print(f"[green]✓ Extracted {name}")
+            else:
+                ui.print(f"[red]Error downloading + extracting {url}: {error}")
+        
+        return success
+
+    @staticmethod
+    async def download_extract_files(
+        downloads: Union[
+            Iterable[Union[tuple[str, Path], tuple[str, Path, Optional[str]]]],
+            AsyncIterable[Union[tuple[str, Path], tuple[str, Path, Optional[str]]]],
+        ],
+        max_concurrent: int = 5,
+        filter: str = 'data',
+        ui_enabled: bool = False,
+        ui: Optional['AioUi'] = global_ui,
+        verify_ssl: bool = True,
+        client: Optional[httpx.AsyncClient] = None,
+        http2: bool = False,
+        connect_timeout: Optional[float] = 30.0,
+        read_timeout: Optional[float] = 60.0,
+        pool_timeout: Optional[float] = None,
+        chunk_size: Optional[int] = None,
+        max_rate: Optional[float] = None,
+        retry: Optional[AioRetryPolicy] = None,
+        min_throughput: Optional[float] = None,
+        throughput_window: float = 10.0,
+        progress_interval: float = 0.1,
+        deadline: Optional[float] = None,
+    ) -> List[bool]:
+        """Download and extract multiple archives in parallel over a shared client.
+        
+        A fixed pool of workers pulls entries lazily, as download_files does.
+        
+        Args:
+            downloads: Iterable or async iterable of (url, dest_dir) or (url, dest_dir, checksum)
+                tuples, where checksum is the expected digest of the archive as 'algorithm:hexdigest'
+            max_concurrent: Maximum concurrent downloads
+            filter: Filter level for tarfile.extractall ('data', 'tar', or 'fully_trusted')
+            ui_enabled: Whether to show UI elements (progress bars/messages)
+            verify_ssl: Whether to verify SSL certificates (ignored if client is given)
+            client: Shared HTTP client to use (created for the batch if None)
+            http2: Whether to enable HTTP/2 multiplexing
+            connect_timeout: Seconds to establish a connection (see create_http_client)
+            read_timeout: Seconds to wait for the next chunk of a response
+            pool_timeout: Seconds to wait for a free connection from the pool
+            chunk_size: Network read chunk size in bytes (None passes data on as it arrives)
+            max_rate: Aggregate bandwidth limit of the batch in bytes per second
+            retry: Retry policy applied to each archive (None disables retries)
+            min_throughput: Minimum throughput in bytes per second before a transfer is
+                abandoned and handed to the retry policy
+            throughput_window: Seconds over which min_throughput is measured
+            progress_interval: Minimum seconds between progress bar updates, shared by all archives
+            deadline: Seconds the whole batch may take; archives still streaming or not
+                started by then are abandoned and fail (files already extracted stay)
+            
+        Returns:
+            List of success flags for each archive
+        """
+        progress_ctx = ui.progress(ui_enabled=ui_enabled)
+        rate_limiter = AioRateLimiter(max_rate) if max_rate else None
+        
+        if client is None:
+            client_ctx = AioUtils.create_http_client(
+                verify_ssl=verify_ssl,
+                max_keepalive_connections=max_concurrent,
+                http2=http2,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                pool_timeout=pool_timeout,
+            )
+        else:
+            client_ctx = nullcontext(client)
+        
+        async with client_ctx as client:
+            with progress_ctx as progress:
+                results: List[bool] = []
+                throttle = AioProgressThrottle(progress, interval=progress_interval) if ui_enabled and progress else None
+                entries = AioUtils._enumerate_entries(downloads)
+                entries_lock = anyio.Lock()
+                
+                async def worker():
+                    while True:
+                        async with entries_lock:
+                            try:
+                                index, (url, dest, *checksum) = await entries.__anext__()
+                            except StopAsyncIteration:
+                                return
+                            results.append(False)
+                        
+                        results[index] = await AioUtils.download_extract(
+                            url,
+                            dest,
+                            filter=filter,
+                            ui_enabled=ui_enabled,
+                            progress=progress if ui_enabled else None,
+                            ui=ui,
+                            client=client,
+                            chunk_size=chunk_size,
+                            rate_limiter=rate_limiter,
+                            retry=retry,
+                            min_throughput=min_throughput,
+                            throughput_window=throughput_window,
+                            progress_throttle=throttle,
+                            checksum=checksum[0] if checksum else None,
+                        )
+                
+                with anyio.move_on_after(deadline) as deadline_scope:
+                    async with anyio.create_task_group() as tg:
+                        for _ in range(max_concurrent):
+                            tg.start_soon(worker)
+                if deadline_scope.cancelled_caught:
+                    if ui_enabled:
+                        ui.print(f"[yellow]Batch deadline of {deadline}s exceeded")
+                    # Entries never started still get their (failed) result
+                    async for _ in entries:
+                        results.append(False)
+                
+                return results
+
     # ============================================================================
     # SHELL
     # ============================================================================
@@ -687,6 +3950,110 @@ class AioUtils:
     # FILE SYSTEM
     # ============================================================================
 
+    # ioctl request cloning a whole file on copy-on-write file systems (Linux: Btrfs, XFS, ...)
+    FICLONE = 0x40049409
+
+    @staticmethod
+    def _reflink(source_path: Path, dest_path: Path) -> bool:
+        """Clone source_path into dest_path with FICLONE; False if unsupported."""
+        try:
+            import fcntl
+        except ImportError:
+            return False
+        try:
+            with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), AioUtils.FICLONE, src.fileno())
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int, dest_offset: Optional[int] = None) -> int:
+        """Copy up to count bytes at offset between two file descriptors in the kernel. Blocking.
+        
+        Tries copy_file_range (server-side copies on NFS, extent sharing on some
+        file systems), then sendfile, then a plain pread/pwrite.
+        
+        Args:
+            src_fd: Descriptor of the source file
+            dst_fd: Descriptor of the destination file
+            offset: Position in the source file
+            count: Maximum number of bytes to copy
+            dest_offset: Position in the destination file (defaults to offset)
+        
+        Returns:
+            Number of bytes copied (0 at the end of the source)
+        """
+        dest_offset = offset if dest_offset is None else dest_offset
+        if hasattr(os, 'copy_file_range'):
+            try:
+                return os.copy_file_range(src_fd, dst_fd, count, offset, dest_offset)
+            except OSError:
+                # E.g. EXDEV on old kernels or ENOSYS/EOPNOTSUPP on some file systems
+                pass
+        if hasattr(os, 'sendfile'):
+            try:
+                os.lseek(dst_fd, dest_offset, os.SEEK_SET)
+                return os.sendfile(dst_fd, src_fd, offset, count)
+            except OSError:
+                pass
+        data = os.pread(src_fd, count, offset)
+        return os.pwrite(dst_fd, data, dest_offset) if data else 0
+
+    @staticmethod
+    def _link(source_path: Path, temp_path: Path, mode: str) -> Optional[str]:
+        """Link source_path to temp_path as the link mode asks. Blocking.
+        
+        Returns:
+            The method used, 'reflink' or 'hardlink', or None if the caller has to copy
+            (temp_path may then be missing)
+            
+        Raises:
+            ValueError: If mode is not a known link mode
+        """
+        if mode not in ('auto', 'reflink', 'hardlink', 'copy'):
+            raise ValueError(f"Unknown link mode: {mode}")
+        if mode == 'hardlink':
+            try:
+                temp_path.unlink(missing_ok=True)
+                os.link(source_path, temp_path)
+                return 'hardlink'
+            except OSError:
+                # E.g. across file systems
+                return None
+        if mode in ('auto', 'reflink') and AioUtils._reflink(source_path, temp_path):
+            return 'reflink'
+        return None
+
+    @staticmethod
+    def link_file(source_path: Path, dest_path: Path, mode: str = 'auto') -> str:
+        """Materialize the content of source_path at dest_path without downloading it again.
+        
+        dest_path is replaced atomically through a temp file in its directory.
+        
+        Args:
+            source_path: Existing file
+            dest_path: File to create or replace
+            mode: 'reflink' (copy-on-write clone), 'hardlink' (shared inode), 'copy', or
+                'auto' (reflink where supported); every mode falls back to a plain copy
+            
+        Returns:
+            The method used: 'reflink', 'hardlink' or 'copy'
+        """
+        source_path, dest_path = Path(source_path), Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        temp_path = AioUtils._temp_path(dest_path)
+        try:
+            method = AioUtils._link(source_path, temp_path, mode) or 'copy'
+            if method == 'copy':
+                shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, dest_path)
+            return method
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
     @staticmethod
     def check_file_size(file_path: Path, expected_size: int, tolerance: float = 0.01) -> bool:
         """Check if file size matches expected size within tolerance.
@@ -0,0 +1,232 @@
+"""Bridges between the async download loop and blocking I/O threads.
+
+Writing every network chunk through an async file handle costs one worker
+thread round-trip per chunk. AioFileWriter instead collects chunks in memory
+and hands large blocks to a dedicated I/O thread, so the event loop keeps
+receiving while the previous block is written to disk.
+
+AioBytePipe goes the other way: it exposes chunks received by async code as a
+blocking file-like object, so a synchronous consumer (e.g. tarfile in stream
+mode) can process a response body in a worker thread while it downloads.
+"""
+
+import queue
+import threading
+from pathlib import Path
+from typing import Optional, Union
+import anyio
+
+
+class AioFileWriter:
+    """Async file writer that coalesces small chunks into large writes.
+
+    Usage:
+        async with AioFileWriter(path, 'wb', buffer_size=4 * 1024 * 1024) as writer:
+            async for chunk in response.aiter_bytes():
+                await writer.write(chunk)
+
+    Buffered data is flushed on exit even when the block raises, so partial
+    downloads keep every byte that was received.
+    """
+
+    def __init__(
+        self,
+        file_path: Union[str, Path],
+        mode: str = 'wb',
+        offset: Optional[int] = None,
+        buffer_size: int = 1024 * 1024,
+        max_pending: int = 2,
+    ):
+        """Create a writer; the file is opened when entering the context.
+
+        Args:
+            file_path: File to write
+            mode: File open mode ('wb', 'ab' or 'r+b')
+            offset: Position to seek to after opening (e.g. for ranged writes)
+            buffer_size: Number of bytes collected before a block is handed to the I/O thread
+            max_pending: Maximum number of blocks queued for the I/O thread before write() waits
+        """
+        self._path = Path(file_path)
+        self._mode = mode
+        self._offset = offset
+        self._buffer_size = buffer_size
+        self._chunks: list = []
+        self._buffered = 0
+        self._file = None
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    async def __aenter__(self) -> 'AioFileWriter':
+        def _open():
+            f = open(self._path, self._mode)
+            if self._offset is not None:
+                f.seek(self._offset)
+            return f
+
+        self._file = await anyio.to_thread.run_sync(_open)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        """I/O thread: write queued blocks until the None sentinel arrives."""
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is None:
+                try:
+                    self._file.write(data)
+                except BaseException as e:
+                    self._error = e
+
+    async def _submit(self, data: Optional[bytes]) -> None:
+        """Queue a block (or the None sentinel) for the I/O thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"AioFileWriter-{self._path.name}", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            # Disk is slower than the network: wait for the I/O thread to catch up
+            await anyio.to_thread.run_sync(self._queue.put, data)
+
+    def _take_buffer(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self._buffered = 0
+        return data
+
+    async def write(self, data: bytes) -> None:
+        """Buffer data, handing a block to the I/O thread once buffer_size is reached."""
+        self._raise_if_failed()
+        self._chunks.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self._buffer_size:
+            await self._submit(self._take_buffer())
+
+    async def aclose(self) -> None:
+        """Flush buffered data, wait for the I/O thread and close the file."""
+        if self._file is None:
+            return
+
+        # Shielded so that a cancelled download still leaves a consistent file behind
+        with anyio.CancelScope(shield=True):
+            data = self._take_buffer()
+            try:
+                if self._thread is not None:
+                    if data:
+                        await self._submit(data)
+                    await self._submit(None)
+                    await anyio.to_thread.run_sync(self._thread.join)
+                    data = b''
+            finally:
+                f, self._file = self._file, None
+
+                def _finish():
+                    # Small files never start the I/O thread: write and close in one hop
+                    try:
+                        if data and self._error is None:
+                            f.write(data)
+                    finally:
+                        f.close()
+
+                await anyio.to_thread.run_sync(_finish)
+        self._raise_if_failed()
+
+
+class AioBytePipe:
+    """Blocking, read-only file-like object fed with chunks from async code.
+
+    Usage:
+        pipe = AioBytePipe()
+        # async side                         # worker thread
+        await pipe.feed(chunk)               tarfile.open(fileobj=pipe, mode='r|*')
+        await pipe.feed_eof()
+
+    The consumer calls close() when it stops reading; later feeds are dropped,
+    so the producer never blocks on a consumer that has gone away.
+    """
+
+    _EOF = object()
+
+    def __init__(self, max_pending: int = 16):
+        """Create a pipe.
+
+        Args:
+            max_pending: Maximum number of chunks queued before feed() waits for the reader
+        """
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._buffer = memoryview(b'')
+        self._eof = False
+        self._closed = False
+
+    async def _put(self, item) -> None:
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Reader is slower than the network: wait for it to catch up
+            await anyio.to_thread.run_sync(self._queue.put, item)
+
+    async def feed(self, data: bytes) -> None:
+        """Queue a chunk for the reader (dropped if the reader has closed the pipe)."""
+        if data:
+            await self._put(data)
+
+    async def feed_eof(self) -> None:
+        """Signal the end of the stream."""
+        await self._put(self._EOF)
+
+    async def feed_error(self, error: BaseException) -> None:
+        """Make the reader raise an OSError instead of seeing a truncated stream."""
+        await self._put(OSError(f"Stream interrupted: {error}"))
+
+    def abort(self, error: BaseException) -> None:
+        """Make the reader raise an OSError at once, without waiting (e.g. when cancelled)."""
+        # Queued chunks are dropped, which also makes room to wake a waiting reader
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._queue.put_nowait(OSError(f"Stream interrupted: {error!r}"))
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes (all remaining bytes if negative), blocking until available."""
+        chunks = []
+        wanted = size
+        while wanted != 0 and not self._eof:
+            if not self._buffer:
+                item = self._queue.get()
+                if item is self._EOF:
+                    self._eof = True
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                self._buffer = memoryview(item)
+            take = self._buffer if wanted < 0 else self._buffer[:wanted]
+            self._buffer = self._buffer[len(take):]
+            chunks.append(bytes(take))
+            if wanted > 0:
+                wanted -= len(take)
+        return b''.join(chunks)
+
+    def close(self) -> None:
+        """Stop reading: drop queued and future chunks so the producer is never blocked."""
+        self._closed = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
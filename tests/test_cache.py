@@ -0,0 +1,39 @@
+from nbaio.cache import AioDownloadCache
+
+
+def test_store_and_lookup(tmp_path):
+    cache = AioDownloadCache(tmp_path / "cache")
+    source = tmp_path / "file.bin"
+    source.write_bytes(b"payload")
+    
+    assert cache.store("https://example.com/file.bin", source, etag='"abc"') is True
+    assert cache.lookup("https://example.com/file.bin")["size"] == 7
+    assert cache.conditional_headers("https://example.com/file.bin") == {"If-None-Match": '"abc"'}
+    
+    # Responses without validators cannot be revalidated
+    assert cache.store("https://example.com/other.bin", source) is False
+    assert cache.conditional_headers("https://example.com/other.bin") == {}
+    
+    # The index survives reopening the cache
+    reopened = AioDownloadCache(tmp_path / "cache")
+    assert reopened.lookup("https://example.com/file.bin")["etag"] == '"abc"'
+
+
+def test_lru_eviction(tmp_path):
+    cache = AioDownloadCache(tmp_path / "cache", max_size=25)
+    source = tmp_path / "file.bin"
+    source.write_bytes(b"x" * 10)
+    
+    cache.store("https://example.com/a", source, etag='"a"')
+    cache.store("https://example.com/b", source, etag='"b"')
+    cache.restore("https://example.com/a", tmp_path / "restored.bin")  # a is now most recent
+    cache.store("https://example.com/c", source, etag='"c"')
+    
+    assert cache.lookup("https://example.com/a") is not None
+    assert cache.lookup("https://example.com/b") is None
+    assert cache.lookup("https://example.com/c") is not None
+    assert cache.total_size == 20
+    
+    # Files larger than the whole cache are not stored
+    source.write_bytes(b"x" * 30)
+    assert cache.store("https://example.com/big", source, etag='"big"') is False
@@ -0,0 +1,46 @@
+import os
+import hashlib
+import pytest
+from nbaio.delta import AioDeltaIndex
+
+
+def test_generate_and_parse(tmp_path):
+    content = os.urandom(10_000)
+    path = tmp_path / "data.bin"
+    path.write_bytes(content)
+    
+    index = AioDeltaIndex.generate(path, block_size=4096)
+    assert index.size == 10_000
+    assert index.name == "data.bin"
+    assert index.checksum == f"sha256:{hashlib.sha256(content).hexdigest()}"
+    assert index.block_checksums[2] == hashlib.sha256(content[8192:]).hexdigest()
+    assert index.block_range(2) == (8192, 10_000)
+    
+    control_path = tmp_path / "data.bin.nbdelta"
+    index.save(control_path)
+    loaded = AioDeltaIndex.load(control_path)
+    assert (loaded.size, loaded.block_size, loaded.block_checksums, loaded.checksum) == (
+        index.size, index.block_size, index.block_checksums, index.checksum
+    )
+
+
+def test_match_local(tmp_path):
+    old = os.urandom(4096 * 4)
+    # Block 1 changed in place, old block 3 moved to block 0
+    new = old[12288:] + os.urandom(4096) + old[8192:12288] + b"tail"
+    (tmp_path / "old.bin").write_bytes(old)
+    (tmp_path / "new.bin").write_bytes(new)
+    
+    index = AioDeltaIndex.generate(tmp_path / "new.bin", block_size=4096)
+    assert index.match_local(tmp_path / "old.bin") == {0: 12288, 2: 8192}
+
+
+def test_parse_invalid():
+    with pytest.raises(ValueError):
+        AioDeltaIndex.parse("not json")
+    with pytest.raises(ValueError):
+        AioDeltaIndex.parse('{"version": 99, "size": 1, "block_size": 1, "blocks": ["x"]}')
+    with pytest.raises(ValueError, match="block count"):
+        AioDeltaIndex.parse('{"version": 1, "size": 10, "block_size": 4, "blocks": ["a"]}')
+    with pytest.raises(ValueError):
+        AioDeltaIndex.generate(__file__, block_size=0)
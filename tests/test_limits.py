@@ -0,0 +1,161 @@
+import time
+import pytest
+import anyio
+from collections import Counter
+from types import SimpleNamespace
+from nbaio.limits import AioHostLimiter, AioAdaptiveLimiter, AioRateLimiter, AioThroughputWatchdog, AioSlowTransferError
+
+
+def test_host_limiter_matching():
+    host_limiter = AioHostLimiter(max_per_host=2, host_limits={"*.example.com": 3})
+    
+    assert AioHostLimiter.host_of("https://A.Example.com/file") == "a.example.com"
+    assert len(host_limiter.limiters_for("https://a.example.com/x")) == 2
+    assert len(host_limiter.limiters_for("https://other.org/x")) == 1
+    # Pattern limiter is shared, host limiters are not
+    assert host_limiter.limiters_for("https://a.example.com/x")[0] is host_limiter.limiters_for("https://b.example.com/y")[0]
+    assert host_limiter.limiters_for("https://a.example.com/x")[1] is not host_limiter.limiters_for("https://b.example.com/y")[1]
+    
+    assert AioHostLimiter().limiters_for("https://other.org/x") == []
+    assert host_limiter.pattern_for("https://B.example.com/y") == "*.example.com"
+    assert host_limiter.pattern_for("https://other.org/x") is None
+
+
+@pytest.mark.anyio
+async def test_host_limiter_caps_concurrency():
+    host_limiter = AioHostLimiter(max_per_host=2, host_limits={"*.cdn.net": 3})
+    urls = [f"https://slow.org/{i}" for i in range(6)] + [f"https://{h}.cdn.net/{i}" for h in "ab" for i in range(4)]
+    running = Counter()
+    peak = Counter()
+    
+    async def fetch(url: str):
+        host = AioHostLimiter.host_of(url)
+        key = "cdn" if host.endswith(".cdn.net") else host
+        async with host_limiter.acquire(url):
+            running[key] += 1
+            peak[key] = max(peak[key], running[key])
+            await anyio.sleep(0.01)
+            running[key] -= 1
+    
+    async with anyio.create_task_group() as tg:
+        for url in urls:
+            tg.start_soon(fetch, url)
+    
+    assert peak["slow.org"] == 2
+    assert peak["cdn"] == 3
+    
+    host_limiter = AioHostLimiter(max_per_host=1)
+    assert host_limiter.has_capacity("https://slow.org/0")
+    async with host_limiter.acquire("https://slow.org/0"):
+        assert not host_limiter.has_capacity("https://slow.org/1")
+        assert host_limiter.has_capacity("https://other.org/0")
+
+
+@pytest.mark.anyio
+async def test_adaptive_limiter_aimd(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("nbaio.limits.time", SimpleNamespace(monotonic=lambda: clock[0]))
+    
+    async def after(seconds: float, amount: int):
+        clock[0] += seconds
+        await limiter.consume(amount)
+    
+    parent = AioRateLimiter(None)
+    limiter = AioAdaptiveLimiter(max_limit=8, initial=4, interval=1.0, parent=parent)
+    release = anyio.Event()
+    
+    async def hold():
+        async with limiter:
+            await release.wait()
+    
+    async with anyio.create_task_group() as tg:
+        for _ in range(4):
+            tg.start_soon(hold)
+        await anyio.sleep(0.01)
+        assert limiter.in_use == limiter.limit == 4
+        
+        # Baseline, then improving throughput with every slot in use opens one more
+        await after(1.0, 1000)
+        await after(1.0, 2000)
+        assert limiter.limit == 5
+        # Samples with idle slots are not judged
+        await after(1.0, 100)
+        assert limiter.limit == 5
+        
+        # A throughput drop halves the limit; running holders keep their slots
+        tg.start_soon(hold)
+        await anyio.sleep(0.01)
+        await after(1.0, 2000)
+        await after(0.5, 0)
+        assert limiter.limit == 5
+        await after(0.5, 1000)
+        assert limiter.limit == 2
+        assert limiter.in_use == 5
+        release.set()
+    
+    # Errors back off once per interval, never below min_limit
+    limiter = AioAdaptiveLimiter(max_limit=8, initial=8, interval=60)
+    limiter.record_error()
+    limiter.record_error()
+    assert limiter.limit == 4
+    clock[0] += 60
+    limiter.record_error()
+    limiter = AioAdaptiveLimiter(max_limit=8, initial=1, interval=60)
+    limiter.record_error()
+    assert limiter.limit == 1
+    assert AioAdaptiveLimiter(max_limit=1).limit == 1
+
+
+def test_host_limiter_adaptive():
+    parent = AioAdaptiveLimiter(max_limit=16)
+    host_limiter = AioHostLimiter(max_per_host=4, adaptive=True, parent=parent)
+    
+    adaptive = host_limiter.adaptive_for("https://a.example.com/x")
+    assert isinstance(adaptive, AioAdaptiveLimiter)
+    assert adaptive.max_limit == 4
+    assert adaptive is host_limiter.adaptive_for("https://a.example.com/y")
+    assert adaptive is not host_limiter.adaptive_for("https://b.example.com/y")
+    assert host_limiter.limiters_for("https://a.example.com/x") == [adaptive]
+    assert AioHostLimiter(max_per_host=4).adaptive_for("https://a.example.com/x") is None
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_throttles():
+    total = AioRateLimiter(100_000, burst=10_000)
+    single = AioRateLimiter(None, parent=total)
+    assert single.rate is None
+    
+    start = time.monotonic()
+    for _ in range(4):
+        await single.consume(10_000)
+    # Burst covers the first 10 KB, the remaining 30 KB take ~0.3s
+    assert time.monotonic() - start >= 0.25
+    
+    # Raising the rate at runtime takes effect immediately
+    total.rate = 10_000_000
+    start = time.monotonic()
+    await single.consume(10_000)
+    assert time.monotonic() - start < 0.1
+
+
+@pytest.mark.anyio
+async def test_rate_limiter_unlimited():
+    limiter = AioRateLimiter(None)
+    start = time.monotonic()
+    for _ in range(100):
+        await limiter.consume(1_000_000)
+    assert time.monotonic() - start < 0.1
+
+
+def test_throughput_watchdog():
+    watchdog = AioThroughputWatchdog(min_rate=1000, window=0.05)
+    
+    # Nothing is judged before a full window has elapsed
+    watchdog.update(1)
+    time.sleep(0.06)
+    with pytest.raises(AioSlowTransferError):
+        watchdog.update(1)
+    
+    watchdog.reset()
+    time.sleep(0.06)
+    watchdog.update(1000)
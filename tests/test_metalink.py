@@ -0,0 +1,86 @@
+import pytest
+from nbaio.metalink import AioMetalink
+
+METALINK4 = """<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+  <file name="example.iso">
+    <size>10240</size>
+    <hash type="md5">0123456789ABCDEF0123456789ABCDEF</hash>
+    <hash type="sha-256">aa11</hash>
+    <pieces length="4096" type="sha-1">
+      <hash>p0</hash>
+      <hash>p1</hash>
+      <hash>p2</hash>
+    </pieces>
+    <url priority="2">https://b.example.com/example.iso</url>
+    <url priority="1">https://a.example.com/example.iso</url>
+    <url>https://c.example.com/example.iso</url>
+  </file>
+  <file name="other.bin">
+    <url>https://a.example.com/other.bin</url>
+  </file>
+</metalink>
+"""
+
+METALINK3 = """<?xml version="1.0" encoding="UTF-8"?>
+<metalink version="3.0" xmlns="http://www.metalinker.org/">
+  <files>
+    <file name="example.iso">
+      <size>10240</size>
+      <verification>
+        <hash type="sha1">bb22</hash>
+        <pieces length="8192" type="sha1">
+          <hash piece="1">q1</hash>
+          <hash piece="0">q0</hash>
+        </pieces>
+      </verification>
+      <resources>
+        <url type="http" preference="10">https://slow.example.com/example.iso</url>
+        <url type="bittorrent" preference="100">https://example.com/example.torrent</url>
+        <url type="https" preference="90">https://fast.example.com/example.iso</url>
+      </resources>
+    </file>
+  </files>
+</metalink>
+"""
+
+
+def test_parse_metalink4():
+    metalink = AioMetalink.parse(METALINK4)
+    
+    assert len(metalink.files) == 2
+    entry = metalink.find("example.iso")
+    assert entry.urls == [
+        "https://a.example.com/example.iso",
+        "https://b.example.com/example.iso",
+        "https://c.example.com/example.iso",
+    ]
+    assert entry.size == 10240
+    # Strongest hash wins
+    assert entry.checksum == "sha256:aa11"
+    assert entry.piece_size == 4096
+    assert entry.piece_checksums == ["sha1:p0", "sha1:p1", "sha1:p2"]
+    
+    other = metalink.find("other.bin")
+    assert other.size is None and other.checksum is None and other.piece_checksums == []
+    with pytest.raises(KeyError):
+        metalink.find("missing.bin")
+
+
+def test_parse_metalink3():
+    entry = AioMetalink.parse(METALINK3).find()
+    
+    assert entry.urls == ["https://fast.example.com/example.iso", "https://slow.example.com/example.iso"]
+    assert entry.checksum == "sha1:bb22"
+    assert entry.piece_size == 8192
+    assert entry.piece_checksums == ["sha1:q0", "sha1:q1"]
+
+
+def test_parse_invalid_metalink():
+    with pytest.raises(ValueError):
+        AioMetalink.parse("<not-closed>")
+    with pytest.raises(ValueError):
+        AioMetalink.parse("<feed></feed>")
+    for document in (METALINK4.replace("<hash>p1</hash>", "<hash/>"), METALINK3.replace(">q1<", "> <")):
+        with pytest.raises(ValueError, match="Empty piece hash"):
+            AioMetalink.parse(document)
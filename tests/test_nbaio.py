@@ -3,6 +3,7 @@ from click.testing import CliRunner
 from pathlib import Path
 from nbaio.cli import cli
 from nbaio.util import AioUtils
+from nbaio.delta import AioDeltaIndex
 
 
 def test_version():
@@ -53,6 +54,204 @@ def test_download_cli():
             assert Path("file2.txt").read_text() == "content2"
 
 
+def test_download_cli_manifest():
+    import respx
+    import httpx
+    runner = CliRunner()
+    
+    with respx.mock:
+        respx.get("https://example.com/a.txt").mock(return_value=httpx.Response(200, content=b"a"))
+        respx.get("https://example.com/b.txt").mock(return_value=httpx.Response(200, content=b"b"))
+        
+        with runner.isolated_filesystem():
+            manifest = "# comment\nhttps://example.com/a.txt\n\nhttps://example.com/b.txt sub/b.txt\n"
+            result = runner.invoke(cli, ["download", "--from-file", "-"], input=manifest)
+            
+            assert result.exit_code == 0
+            assert "Downloaded 2/2 files" in result.output
+            assert Path("a.txt").read_text() == "a"
+            assert Path("sub/b.txt").read_text() == "b"
+
+
+def test_download_cli_pool_options():
+    runner = CliRunner()
+    
+    with patch.object(AioUtils, 'download_files', new_callable=AsyncMock) as mock_download:
+        mock_download.return_value = [True]
+        
+        with runner.isolated_filesystem():
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "-c", "8", "--max-connections", "16", "--keepalive-expiry", "30", "--http2"])
+            
+            assert result.exit_code == 0
+            kwargs = mock_download.call_args.kwargs
+            assert kwargs['max_concurrent'] == 8
+            assert kwargs['max_connections'] == 16
+            assert kwargs['keepalive_expiry'] == 30.0
+            assert kwargs['http2'] is True
+            
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "--pool-timeout", "5"])
+            assert result.exit_code == 0
+            assert mock_download.call_args.kwargs['pool_timeout'] == 5.0
+
+
+def test_download_extract_cli():
+    runner = CliRunner()
+    
+    with patch.object(AioUtils, 'download_extract_files', new_callable=AsyncMock) as mock_extract:
+        mock_extract.return_value = [True, False]
+        
+        with runner.isolated_filesystem():
+            result = runner.invoke(cli, ["download", "--extract", "-o", "out", "https://example.com/a.tar.gz", "https://example.com/b.zip"])
+            
+            assert result.exit_code == 0
+            assert "Extracted 1/2 archives" in result.output
+            args, kwargs = mock_extract.call_args
+            assert args[0] == [("https://example.com/a.tar.gz", Path("out")), ("https://example.com/b.zip", Path("out"))]
+            assert kwargs['filter'] == 'data'
+            
+            result = runner.invoke(cli, [
+                "download", "--extract", "https://example.com/a.tar.gz",
+                "--pool-timeout", "5", "--min-throughput", "100K", "--deadline", "60",
+            ])
+            assert result.exit_code == 0
+            kwargs = mock_extract.call_args.kwargs
+            assert kwargs['pool_timeout'] == 5.0
+            assert kwargs['min_throughput'] == 100 * 1024
+            assert kwargs['deadline'] == 60.0
+            
+            # Options of file downloads are refused rather than silently ignored
+            result = runner.invoke(cli, ["download", "--extract", "https://example.com/a.tar.gz", "--segments", "4", "--no-dedupe"])
+            assert result.exit_code == 2
+            assert "--segments, --dedupe cannot be combined with --extract" in result.output
+            
+            # Manifest entries keep their DEST subdirectory and checksum, read as the batch runs
+            entries = []
+            
+            async def consume(downloads, **kwargs):
+                entries.extend([entry async for entry in downloads])
+                return [True] * len(entries)
+            
+            mock_extract.side_effect = consume
+            Path("archives.txt").write_text("https://example.com/a.tar.gz\n# comment\nhttps://example.com/b.zip b sha256:abc\n")
+            result = runner.invoke(cli, ["download", "--extract", "-o", "out", "--from-file", "archives.txt"])
+            assert result.exit_code == 0
+            assert "Extracted 2/2 archives" in result.output
+            assert entries == [
+                ("https://example.com/a.tar.gz", Path("out")),
+                ("https://example.com/b.zip", Path("out") / "b", "sha256:abc"),
+            ]
+
+
+def test_download_cli_limits():
+    runner = CliRunner()
+    
+    with patch.object(AioUtils, 'download_files', new_callable=AsyncMock) as mock_download:
+        mock_download.return_value = [True]
+        
+        with runner.isolated_filesystem():
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "--max-per-host", "2", "--host-limit", "*.example.com=4"])
+            
+            assert result.exit_code == 0
+            kwargs = mock_download.call_args.kwargs
+            assert kwargs['max_per_host'] == 2
+            assert kwargs['host_limits'] == {"*.example.com": 4}
+            
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "--limit-rate", "10M", "--limit-rate-per-download", "512K"])
+            kwargs = mock_download.call_args.kwargs
+            assert kwargs['max_rate'] == 10 * 1024 * 1024
+            assert kwargs['max_rate_per_download'] == 512 * 1024
+            
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "--host-limit", "nope"])
+            assert result.exit_code != 0
+            assert "Expected PATTERN=N" in result.output
+            
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "--retries", "4"])
+            assert result.exit_code == 0
+            assert mock_download.call_args.kwargs['retry'].max_attempts == 5
+            
+            result = runner.invoke(cli, ["download", "https://a.example.com/f.bin|https://b.example.com/f.bin", "--race-mirrors", "--min-throughput", "100K"])
+            assert result.exit_code == 0
+            args, kwargs = mock_download.call_args
+            assert args[0] == [(["https://a.example.com/f.bin", "https://b.example.com/f.bin"], Path("f.bin"))]
+            assert kwargs['race_mirrors'] is True
+            assert kwargs['min_throughput'] == 100 * 1024
+            
+            Path("files.meta4").write_text("""<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+              <file name="f.iso"><url>https://a.example.com/f.iso</url><url>https://b.example.com/f.iso</url></file>
+            </metalink>""")
+            result = runner.invoke(cli, ["download", "--metalink", "files.meta4", "--multi-source", "--connections-per-source", "2"])
+            assert result.exit_code == 0
+            args, kwargs = mock_download.call_args
+            assert args[0][0][0].urls == ["https://a.example.com/f.iso", "https://b.example.com/f.iso"]
+            assert args[0][0][1] == Path("f.iso")
+            assert kwargs['multi_source'] is True
+            assert kwargs['connections_per_source'] == 2
+            
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "--no-dedupe", "--link-mode", "hardlink"])
+            assert result.exit_code == 0
+            kwargs = mock_download.call_args.kwargs
+            assert kwargs['dedupe'] is False
+            assert kwargs['link_mode'] == "hardlink"
+            
+            result = runner.invoke(cli, ["download", "https://example.com/data.csv.gz", "https://example.com/b.bin", "--decompress", "--compressed"])
+            assert result.exit_code == 0
+            args, kwargs = mock_download.call_args
+            assert args[0] == [("https://example.com/data.csv.gz", Path("data.csv")), ("https://example.com/b.bin", Path("b.bin"))]
+            assert kwargs['decompress'] is True
+            assert kwargs['accept_encoding'] is True
+            
+            # Sizes and checksums of the compressed files never match the decompressed ones
+            result = runner.invoke(cli, ["download", "https://example.com/data.csv.gz", "--decompress", "--skip-existing", "size"])
+            assert result.exit_code == 2
+            assert "cannot be combined with --decompress" in result.output
+            
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "--largest-first"])
+            assert result.exit_code == 0
+            assert mock_download.call_args.kwargs['largest_first'] is True
+            
+            result = runner.invoke(cli, ["download", "https://example.com/a.bin", "-c", "32", "--adaptive-concurrency"])
+            assert result.exit_code == 0
+            kwargs = mock_download.call_args.kwargs
+            assert kwargs['adaptive_concurrency'] is True
+            assert kwargs['max_concurrent'] == 32
+            
+            with patch.object(AioUtils, 'download_files_sharded', new_callable=AsyncMock) as mock_sharded:
+                mock_sharded.return_value = [True]
+                result = runner.invoke(cli, ["download", "https://example.com/a.bin", "-P", "4", "-c", "64"])
+                assert result.exit_code == 0
+                kwargs = mock_sharded.call_args.kwargs
+                assert kwargs['processes'] == 4
+                assert kwargs['max_concurrent'] == 64
+                
+                result = runner.invoke(cli, ["download", "https://example.com/a.bin", "-P", "0"])
+                assert mock_sharded.call_args.kwargs['processes'] is None
+                
+                result = runner.invoke(cli, ["download", "https://example.com/a.bin", "-P", "4", "--cache-dir", "cache"])
+                assert result.exit_code != 0
+                assert mock_sharded.call_count == 2
+            
+            result = runner.invoke(cli, ["download"])
+            assert result.exit_code != 0
+
+
+def test_delta_index_cli():
+    runner = CliRunner()
+    
+    with runner.isolated_filesystem():
+        Path("disk.img").write_bytes(b"x" * 5000)
+        result = runner.invoke(cli, ["delta_index", "disk.img", "--block-size", "1K", "-o", "control"])
+        
+        assert result.exit_code == 0
+        index = AioDeltaIndex.load("control/disk.img.nbdelta")
+        assert (index.size, index.block_size, len(index.block_checksums)) == (5000, 1024, 5)
+        
+        with patch.object(AioUtils, 'download_files', new_callable=AsyncMock) as mock_download:
+            mock_download.return_value = [True]
+            result = runner.invoke(cli, ["download", "https://example.com/disk.img", "--delta"])
+            assert result.exit_code == 0
+            assert mock_download.call_args.kwargs['delta'] is True
+
+
 def test_shell_cli():
     runner = CliRunner()
     result = runner.invoke(cli, ["shell", "echo hello", "echo world"])
@@ -0,0 +1,42 @@
+import httpx
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from nbaio.retry import AioRetryPolicy
+
+
+def status_error(status_code: int, headers: dict = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://example.com/file")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def test_retry_classification():
+    retry = AioRetryPolicy(max_attempts=3)
+    
+    assert retry.is_retryable(status_error(503)) is True
+    assert retry.is_retryable(status_error(429)) is True
+    assert retry.is_retryable(status_error(404)) is False
+    assert retry.is_retryable(httpx.ReadError("Connection reset")) is True
+    assert retry.is_retryable(httpx.ConnectTimeout("timeout")) is True
+    assert retry.is_retryable(ValueError("Checksum mismatch")) is False
+    
+    assert retry.should_retry(2, status_error(503)) is True
+    assert retry.should_retry(3, status_error(503)) is False
+
+
+def test_retry_delay():
+    retry = AioRetryPolicy(backoff_base=1.0, backoff_max=5.0, jitter=False)
+    
+    assert retry.delay(1) == 1.0
+    assert retry.delay(3) == 4.0
+    assert retry.delay(10) == 5.0
+    
+    jittered = AioRetryPolicy(backoff_base=1.0)
+    assert all(0 <= jittered.delay(2) <= 2.0 for _ in range(20))
+    
+    # Retry-After in seconds or as an HTTP date, bounded by max_retry_after
+    assert retry.delay(1, status_error(503, {"Retry-After": "7"})) == 7.0
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= retry.delay(1, status_error(429, {"Retry-After": when})) <= 30
+    assert AioRetryPolicy(max_retry_after=2).delay(1, status_error(503, {"Retry-After": "60"})) == 2
+    assert AioRetryPolicy(respect_retry_after=False, jitter=False).delay(1, status_error(503, {"Retry-After": "60"})) == 0.5
@@ -0,0 +1,77 @@
+import time
+import queue
+from unittest.mock import MagicMock
+from nbaio.ui import AioProgressThrottle, AioQueueUi
+
+
+def test_progress_throttle_batches_updates():
+    progress = MagicMock()
+    throttle = AioProgressThrottle(progress, interval=60)
+    
+    for _ in range(1000):
+        throttle.advance(1, 8192)
+    throttle.advance(2, 100)
+    assert progress.update.call_count == 0
+    
+    throttle.flush(2)
+    progress.update.assert_called_once_with(2, advance=100)
+    
+    throttle.flush()
+    progress.update.assert_called_with(1, advance=8192 * 1000)
+    assert progress.update.call_count == 2
+
+
+def test_progress_throttle_flushes_on_interval_and_size():
+    progress = MagicMock()
+    throttle = AioProgressThrottle(progress, interval=0.01)
+    throttle.advance(1, 10)
+    time.sleep(0.02)
+    throttle.advance(1, 10)
+    progress.update.assert_called_once_with(1, advance=20)
+    
+    progress = MagicMock()
+    throttle = AioProgressThrottle(progress, interval=60, max_pending=1000)
+    for _ in range(10):
+        throttle.advance(1, 300)
+    # Flushed after the 4th and 8th chunk
+    assert progress.update.call_count == 2
+
+
+def test_progress_throttle_total_task():
+    progress = MagicMock()
+    throttle = AioProgressThrottle(progress, interval=60, total_task_id=0)
+    throttle.advance(1, 100)
+    throttle.advance(2, 50)
+    throttle.advance(2, -20)
+    throttle.flush(1)
+    progress.update.assert_called_once_with(1, advance=100)
+    
+    throttle.flush()
+    progress.update.assert_any_call(0, advance=130)
+    progress.update.assert_any_call(2, advance=30)
+    assert throttle.total_advanced == 130
+
+
+def test_queue_ui_replays_in_parent():
+    channel = queue.Queue()
+    worker_ui = AioQueueUi(channel, shard=3)
+    with worker_ui.progress(ui_enabled=True) as progress:
+        task_id = progress.add_task("Downloading a.bin", total=0)
+        progress.update(task_id, total=100)
+        progress.update(task_id, advance=40)
+    worker_ui.print("[red]Error")
+    with worker_ui.progress(ui_enabled=False) as progress:
+        assert progress is None
+    
+    ui = MagicMock()
+    parent_progress = MagicMock()
+    parent_progress.add_task.return_value = 7
+    task_ids = {}
+    while not channel.empty():
+        AioQueueUi.replay(channel.get(), ui, parent_progress, task_ids)
+    
+    parent_progress.add_task.assert_called_once_with("Downloading a.bin", total=0)
+    parent_progress.update.assert_any_call(7, total=100)
+    parent_progress.update.assert_any_call(7, advance=40)
+    ui.print.assert_called_once_with("[red]Error")
+    assert task_ids == {(3, 0): 7}
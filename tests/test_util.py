@@ -1,11 +1,24 @@
+import io
 import os
+import multiprocessing
+from pathlib import Path
+import json
+import hashlib
 import pytest
+import anyio
 import httpx
 import respx
 import zipfile
 import tarfile
-from unittest.mock import AsyncMock, patch
+import gzip
+import bz2
+import lzma
+from unittest.mock import AsyncMock, MagicMock, patch
 from nbaio.util import AioUtils
+from nbaio.cache import AioDownloadCache
+from nbaio.retry import AioRetryPolicy
+from nbaio.delta import AioDeltaIndex
+from nbaio.limits import AioAdaptiveLimiter
 from nbaio.ui import global_ui
 
 #==========================================================================
@@ -24,6 +37,20 @@ def mock_download_url():
 def mock_download_content():
     return b"Hello world"
 
+def range_responder(content: bytes, headers: dict = None):
+    """Build a respx side effect that serves content honoring Range headers."""
+    def _respond(request):
+        range_header = request.headers.get("range")
+        if range_header:
+            start, end = range_header.split("=")[1].split("-")
+            start = int(start)
+            end = int(end) if end else len(content) - 1
+            end = min(end, len(content) - 1)
+            content_range = {"Content-Range": f"bytes {start}-{end}/{len(content)}"}
+            return httpx.Response(206, content=content[start:end + 1], headers={**(headers or {}), **content_range})
+        return httpx.Response(200, content=content, headers=headers or {})
+    return _respond
+
 #==========================================================================
 # TESTS
 #==========================================================================
@@ -42,6 +69,21 @@ def test_check_file_size(temp_dir):
     # Non-existent file
     assert AioUtils.check_file_size(temp_dir / "nope.txt", 5) is False
 
+def test_link_file(temp_dir):
+    source = temp_dir / "source.bin"
+    source.write_bytes(b"payload")
+    
+    assert AioUtils.link_file(source, temp_dir / "copy.bin", mode="copy") == "copy"
+    assert AioUtils.link_file(source, temp_dir / "linked.bin", mode="hardlink") == "hardlink"
+    assert (temp_dir / "linked.bin").stat().st_ino == source.stat().st_ino
+    # Reflinks fall back to copies where the file system cannot clone
+    assert AioUtils.link_file(source, temp_dir / "nested" / "auto.bin") in ("reflink", "copy")
+    
+    for name in ("copy.bin", "linked.bin", "nested/auto.bin"):
+        assert (temp_dir / name).read_bytes() == b"payload"
+    with pytest.raises(ValueError):
+        AioUtils.link_file(source, temp_dir / "x.bin", mode="symlink")
+
 def test_remove_directory(temp_dir):
     nested_dir = temp_dir / "nested" / "dir"
     nested_dir.mkdir(parents=True)
@@ -199,6 +241,1089 @@ async def test_download_files(temp_dir, mock_download_url, mock_download_content
         assert dest1.read_bytes() == mock_download_content
         assert dest2.read_bytes() == mock_download_content
 
+@pytest.mark.anyio
+async def test_download_files_shared_client(temp_dir, mock_download_url, mock_download_content):
+    downloads = [(mock_download_url, temp_dir / f"file{i}.txt") for i in range(5)]
+    
+    with respx.mock:
+        respx.get(mock_download_url).mock(return_value=httpx.Response(200, content=mock_download_content))
+        
+        # One pooled client for the whole batch
+        with patch.object(AioUtils, 'create_http_client', wraps=AioUtils.create_http_client) as mock_create:
+            results = await AioUtils.download_files(downloads, max_concurrent=2, ui_enabled=False)
+            assert all(results)
+            mock_create.assert_called_once()
+            assert mock_create.call_args.kwargs['max_keepalive_connections'] == 2
+        
+        # Caller-owned client is used and left open
+        async with AioUtils.create_http_client(max_connections=4) as client:
+            with patch.object(AioUtils, 'create_http_client') as mock_create:
+                results = await AioUtils.download_files(downloads, ui_enabled=False, client=client)
+                assert all(results)
+                mock_create.assert_not_called()
+            assert not client.is_closed
+        
+        # Phase timeouts fall back to the overall timeout
+        async with AioUtils.create_http_client(timeout=5.0, connect_timeout=2.0, read_timeout=None) as client:
+            assert client.timeout.connect == 2.0
+            assert client.timeout.read == 5.0
+            assert client.timeout.pool == 5.0
+
+@pytest.mark.anyio
+async def test_download_files_streaming(temp_dir):
+    pulled = 0
+    running = 0
+    peak = 0
+    
+    async def manifest():
+        nonlocal pulled
+        for i in range(20):
+            pulled += 1
+            yield (f"https://example.com/{i}.bin", temp_dir / f"{i}.bin")
+    
+    async def fake_download_file(url, dest, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Entries are pulled on demand: never more than one per worker ahead
+        assert pulled - (int(url.split("/")[-1].split(".")[0]) + 1) < 3
+        await anyio.sleep(0.01)
+        running -= 1
+        return not url.endswith("/7.bin")
+    
+    with patch.object(AioUtils, 'download_file', side_effect=fake_download_file):
+        results = await AioUtils.download_files(manifest(), max_concurrent=3)
+    
+    assert peak == 3
+    assert len(results) == 20
+    assert results == [i != 7 for i in range(20)]
+
+@pytest.mark.anyio
+async def test_download_file_progress_throttled(temp_dir, mock_download_url):
+    content = os.urandom(100_000)
+    progress = MagicMock()
+    progress.add_task.return_value = 1
+    
+    def chunked(data: bytes):
+        async def _stream():
+            for start in range(0, len(data), 100):
+                yield data[start:start + 100]
+        return _stream()
+    
+    with respx.mock:
+        respx.get(mock_download_url).mock(return_value=httpx.Response(200, stream=chunked(content)))
+        
+        assert await AioUtils.download_file(mock_download_url, temp_dir / "p.bin", ui_enabled=True, progress=progress) is True
+    
+    advances = [c.kwargs["advance"] for c in progress.update.call_args_list if "advance" in c.kwargs]
+    # 1000 chunks reach rich in a handful of batched updates
+    assert sum(advances) == len(content)
+    assert len(advances) < 20
+
+@pytest.mark.anyio
+async def test_download_file_atomic(temp_dir, mock_download_url):
+    dest_path = temp_dir / "atomic.txt"
+    dest_path.write_bytes(b"good copy")
+    
+    with respx.mock:
+        respx.get(mock_download_url).mock(return_value=httpx.Response(
+            200, headers={"Content-Length": "20000"}, stream=interrupted_stream(b"x" * 10000)))
+        
+        assert await AioUtils.download_file(mock_download_url, dest_path) is False
+        # The existing file was never truncated and no temp file is left behind
+        assert dest_path.read_bytes() == b"good copy"
+        assert list(temp_dir.iterdir()) == [dest_path]
+
+@pytest.mark.anyio
+async def test_download_file_skip_existing(temp_dir, mock_download_url, mock_download_content):
+    dest_path = temp_dir / "existing.txt"
+    sha256 = hashlib.sha256(mock_download_content).hexdigest()
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+    
+    with respx.mock:
+        head = respx.head(mock_download_url).mock(return_value=httpx.Response(
+            200, headers={"Content-Length": str(len(mock_download_content))}))
+        get = respx.get(mock_download_url).mock(return_value=httpx.Response(
+            200, content=mock_download_content, headers={"Last-Modified": last_modified}))
+        
+        # Missing files are downloaded; the 'validators' policy stamps them
+        assert await AioUtils.download_file(mock_download_url, dest_path, skip_existing="validators") is True
+        assert get.call_count == 1
+        assert dest_path.stat().st_mtime == 1445412480
+        
+        # Size and checksum matches skip the transfer
+        assert await AioUtils.download_file(mock_download_url, dest_path, skip_existing="size") is True
+        assert head.call_count == 1
+        assert await AioUtils.download_file(mock_download_url, dest_path, skip_existing="checksum", checksum=f"sha256:{sha256}") is True
+        assert await AioUtils.download_file(mock_download_url, dest_path, skip_existing="size", expected_size=len(mock_download_content)) is True
+        assert head.call_count == 1
+        assert get.call_count == 1
+        
+        # Unchanged validators skip as well
+        head.mock(side_effect=lambda request: httpx.Response(
+            304 if request.headers.get("if-modified-since") == last_modified else 200))
+        assert await AioUtils.download_file(mock_download_url, dest_path, skip_existing="validators") is True
+        assert get.call_count == 1
+        
+        # Anything else downloads again
+        dest_path.write_bytes(b"stale")
+        head.mock(return_value=httpx.Response(200, headers={"Content-Length": str(len(mock_download_content))}))
+        assert await AioUtils.download_file(mock_download_url, dest_path, skip_existing="size") is True
+        assert dest_path.read_bytes() == mock_download_content
+        assert await AioUtils.download_file(mock_download_url, dest_path, skip_existing="checksum", checksum="sha256:" + "0" * 64) is False
+        assert get.call_count == 3
+    
+    # The policies describing the compressed file are refused with decompress
+    for policy in ("size", "checksum"):
+        with pytest.raises(ValueError):
+            await AioUtils.download_file(mock_download_url + ".gz", dest_path, skip_existing=policy, decompress=True)
+        with pytest.raises(ValueError):
+            await AioUtils.download_files([(mock_download_url + ".gz", dest_path)], skip_existing=policy, decompress=True)
+
+@pytest.mark.anyio
+async def test_download_files_busy_host(temp_dir):
+    started = {}
+    
+    async def respond(request):
+        started.setdefault(request.url.host, anyio.current_time())
+        await anyio.sleep(0.1)
+        return httpx.Response(200, content=b"data")
+    
+    # A run of URLs from one host must not hold back the next host
+    downloads = [(f"https://a.example.com/{i}", temp_dir / f"a{i}") for i in range(10)]
+    downloads.append(("https://b.example.com/0", temp_dir / "b0"))
+    
+    with respx.mock:
+        respx.route(host__regex=r".*\.example\.com").mock(side_effect=respond)
+        
+        results = await AioUtils.download_files(iter(downloads), max_concurrent=2, max_per_host=1)
+        
+        assert results == [True] * 11
+        # Before the first URL of the busy host is done
+        assert started["b.example.com"] < started["a.example.com"] + 0.1
+
+@pytest.mark.anyio
+async def test_download_files_local_sources(temp_dir, mock_download_url, mock_download_content):
+    source = temp_dir / "src" / "artifact.bin"
+    source.parent.mkdir()
+    content = os.urandom(300_000)
+    source.write_bytes(content)
+    sha256 = hashlib.sha256(content).hexdigest()
+    
+    with respx.mock:
+        respx.get(mock_download_url).mock(return_value=httpx.Response(200, content=mock_download_content))
+        
+        results = await AioUtils.download_files([
+            (source.as_uri(), temp_dir / "from_uri.bin", f"sha256:{sha256}"),
+            (str(source), temp_dir / "from_path.bin"),
+            (source, temp_dir / "hardlinked.bin"),
+            (mock_download_url, temp_dir / "remote.txt"),
+            (str(temp_dir / "missing.bin"), temp_dir / "missing_copy.bin"),
+        ], dedupe=False, link_mode="hardlink")
+        
+        assert results == [True, True, True, True, False]
+        for name in ("from_uri.bin", "from_path.bin", "hardlinked.bin"):
+            assert (temp_dir / name).read_bytes() == content
+        assert (temp_dir / "hardlinked.bin").stat().st_ino == source.stat().st_ino
+        assert (temp_dir / "remote.txt").read_bytes() == mock_download_content
+    
+    # Kernel copies in blocks, reporting progress and keeping the source's mtime
+    advanced = []
+    dest_path = temp_dir / "copied.bin"
+    success, error, total_size, _ = await AioUtils._copy_local_core(
+        source, dest_path, progress_callback=advanced.append, link_mode="copy", block_size=100_000,
+    )
+    assert success is True
+    assert total_size == len(content)
+    assert advanced == [100_000] * 3
+    assert dest_path.read_bytes() == content
+    assert dest_path.stat().st_mtime_ns == source.stat().st_mtime_ns
+    assert await AioUtils.download_file(source, dest_path, link_mode="copy", skip_existing="validators") is True
+    
+    # Hardlinks across file systems fall back to a kernel copy, as in link_file
+    with patch("nbaio.util.os.link", side_effect=OSError("Invalid cross-device link")):
+        success, error, total_size, _ = await AioUtils._copy_local_core(
+            source, temp_dir / "cross_device.bin", progress_callback=advanced.append, link_mode="hardlink",
+        )
+    assert (success, error) == (True, None)
+    assert (temp_dir / "cross_device.bin").read_bytes() == content
+    assert (temp_dir / "cross_device.bin").stat().st_ino != source.stat().st_ino
+    
+    success, error, total_size, _ = await AioUtils._copy_local_core(source, dest_path, checksum="sha256:" + "0" * 64)
+    assert success is False
+    assert "Checksum mismatch" in error
+    assert dest_path.read_bytes() == content
+    assert sorted(p.name for p in temp_dir.iterdir() if p.name.startswith(".")) == []
+
+@pytest.mark.anyio
+async def test_download_files_largest_first(temp_dir):
+    sizes = {"small": 10, "large": 3000, "medium": 500, "unknown": 20}
+    started = []
+    
+    def respond(request):
+        name = request.url.path.strip("/")
+        if request.method == "HEAD":
+            if name == "unknown":
+                return httpx.Response(405)
+            return httpx.Response(200, headers={"Content-Length": str(sizes[name])})
+        started.append(name)
+        return httpx.Response(200, content=b"x" * sizes[name])
+    
+    ui = MagicMock()
+    progress = ui.progress.return_value.__enter__.return_value
+    progress.add_task.side_effect = range(100)
+    
+    with respx.mock:
+        route = respx.route(host="example.com").mock(side_effect=respond)
+        downloads = [(f"https://example.com/{name}", temp_dir / name) for name in ["small", "large", "medium", "unknown", "small"]]
+        
+        results = await AioUtils.download_files(iter(downloads), max_concurrent=1, largest_first=True, ui_enabled=True, ui=ui)
+        
+        assert results == [True] * 5
+        assert started == ["unknown", "large", "medium", "small"]
+        # Repeated URLs are probed (and downloaded) once
+        assert sum(1 for call in route.calls if call.request.method == "HEAD") == 4
+        assert progress.add_task.call_args_list[0].kwargs["total"] == 3510
+        progress.update.assert_called_with(0, total=3530)
+
+@pytest.mark.anyio
+async def test_download_files_iter(temp_dir):
+    started = []
+    
+    async def respond(request):
+        name = request.url.path.strip("/")
+        started.append(name)
+        if name == "bad":
+            return httpx.Response(404)
+        await anyio.sleep(0.05 if name == "slow" else 0)
+        return httpx.Response(200, content=name.encode())
+    
+    names = ["slow", "a", "bad", "b", "a", "c", "d", "e"]
+    downloads = [(f"https://example.com/{name}", temp_dir / f"{i}_{name}") for i, name in enumerate(names)]
+    
+    with respx.mock:
+        respx.route(host="example.com").mock(side_effect=respond)
+        
+        async with AioUtils.download_files_iter(downloads, max_concurrent=2) as stream:
+            results = [result async for result in stream]
+        
+        assert sorted(result.index for result in results) == list(range(8))
+        # Completion order: the slow first entry finishes after the ones behind it
+        assert results[0].index != 0
+        by_index = {result.index: result for result in results}
+        assert by_index[2].success is False and "404" in by_index[2].error
+        assert by_index[4].success is True and by_index[4].size == 1
+        assert by_index[0].path == temp_dir / "0_slow" and by_index[0].duration >= 0.05
+        assert all(result.success for i, result in by_index.items() if i != 2)
+        
+        # A consumer that does not take results holds the workers back
+        started.clear()
+        async with AioUtils.download_files_iter(downloads, max_concurrent=2) as results:
+            async for result in results:
+                await anyio.sleep(0.2)
+                break
+        # Two workers, each with one finished result at most, plus the one taken
+        assert len(started) <= 3
+        # Leaving early cancels only the batch, not the caller
+        await anyio.sleep(0.01)
+        
+        # Errors of the consumer pass through unchanged
+        with pytest.raises(KeyError):
+            async with AioUtils.download_files_iter(downloads, max_concurrent=2) as results:
+                async for result in results:
+                    raise KeyError(result.index)
+
+@pytest.mark.anyio
+async def test_download_files_deadline(temp_dir):
+    async def respond(request):
+        name = request.url.path.strip("/")
+        if name == "fast":
+            return httpx.Response(200, content=b"fast")
+        if name.endswith(".gz"):
+            return httpx.Response(200, stream=slow_stream(gzip.compress(b"x" * 1000), 30))
+        return httpx.Response(200, headers={"Content-Length": "1000"}, stream=slow_stream(b"x" * 1000, 0.2, chunks=10))
+    
+    reported = []
+    
+    async def on_result(result):
+        reported.append(result)
+    
+    downloads = [(f"https://example.com/{name}", temp_dir / f"{i}_{name}") for i, name in enumerate(["fast", "slow", "slow2", "late"])]
+    
+    with respx.mock:
+        respx.route(host="example.com").mock(side_effect=respond)
+        
+        with anyio.fail_after(2):
+            results = await AioUtils.download_files(
+                iter(downloads), max_concurrent=2, deadline=0.3, result_callback=on_result,
+            )
+        
+        assert results == [True, False, False, False]
+        assert sorted(result.index for result in reported) == [0, 1, 2, 3]
+        assert all(result.error == "Batch deadline exceeded" for result in reported if result.index)
+        # Cancelled downloads leave no partial files behind
+        assert [path.name for path in temp_dir.iterdir()] == ["0_fast"]
+        
+        # Streams piped into a decompressor end at the deadline as well
+        with anyio.fail_after(2):
+            results = await AioUtils.download_files(
+                [("https://example.com/stalled.gz", temp_dir / "stalled")], decompress=True, deadline=0.3,
+            )
+        assert results == [False]
+        assert [path.name for path in temp_dir.iterdir()] == ["0_fast"]
+
+@pytest.mark.anyio
+async def test_with_failover(temp_dir):
+    tried = []
+    
+    async def attempt(source: str):
+        tried.append(source)
+        if source == "disk":
+            raise OSError("No space left on device")
+        if len(tried) < 4:
+            raise httpx.ConnectError("refused")
+        return source
+    
+    # Every mirror fails once before the retry policy backs off
+    assert await AioUtils._with_failover(["a", "b"], attempt, AioRetryPolicy(max_attempts=3, backoff_base=0)) == "b"
+    assert tried == ["a", "b", "a", "b"]
+    
+    tried.clear()
+    with pytest.raises(httpx.ConnectError):
+        await AioUtils._with_failover(["a", "b"], attempt)
+    assert tried == ["a", "b"]
+    
+    tried.clear()
+    with pytest.raises(OSError):
+        await AioUtils._with_failover(["disk", "b"], attempt, fatal=(OSError,))
+    assert tried == ["disk"]
+    
+    # Disk errors of a download are not blamed on the mirror
+    with respx.mock:
+        first = respx.get("https://a.example.com/f").mock(return_value=httpx.Response(200, content=b"data"))
+        second = respx.get("https://b.example.com/f").mock(return_value=httpx.Response(200, content=b"data"))
+        with patch("nbaio.util.AioFileWriter.write", AsyncMock(side_effect=OSError("No space left on device"))):
+            success, error, _, error_type = await AioUtils._download_core(
+                ["https://a.example.com/f", "https://b.example.com/f"], temp_dir / "f",
+                retry=AioRetryPolicy(max_attempts=3, backoff_base=0),
+            )
+        assert (success, error, error_type) == (False, "No space left on device", OSError)
+        assert (first.call_count, second.call_count) == (1, 0)
+    
+    partial_path = temp_dir / "file.part"
+    partial_path.write_bytes(b"partial")
+    with pytest.raises(ValueError):
+        with AioUtils._cleanup_partial(partial_path, keep=True):
+            raise ValueError("failed")
+    assert partial_path.exists()
+    with pytest.raises(ValueError):
+        with AioUtils._cleanup_partial(partial_path):
+            raise ValueError("failed")
+    assert not partial_path.exists()
+
+@pytest.mark.anyio
+async def test_download_files_adaptive_concurrency(temp_dir):
+    running = 0
+    peak = 0
+    throttled = 0
+    
+    async def respond(request):
+        nonlocal running, peak, throttled
+        if request.url.host == "busy.example.com" and throttled < 2:
+            throttled += 1
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        running += 1
+        peak = max(peak, running)
+        await anyio.sleep(0.01)
+        running -= 1
+        return httpx.Response(200, content=b"data")
+    
+    downloads = [(f"https://{host}.example.com/{i}", temp_dir / f"{host}{i}") for host in ("busy", "calm") for i in range(6)]
+    
+    with respx.mock:
+        respx.route(host__regex=r".*\.example\.com").mock(side_effect=respond)
+        
+        with patch.object(AioAdaptiveLimiter, 'record_error', autospec=True, side_effect=AioAdaptiveLimiter.record_error) as record_error:
+            results = await AioUtils.download_files(
+                downloads, max_concurrent=16, max_per_host=8, adaptive_concurrency=True,
+                retry=AioRetryPolicy(max_attempts=3, backoff_base=0),
+            )
+        
+        assert results == [True] * 12
+        # Slots open one sample at a time: both hosts start at two
+        assert peak <= 4
+        # Throttling backs off the busy host only
+        assert record_error.call_count == 2
+        assert len({id(call.args[0]) for call in record_error.call_args_list}) == 1
+    
+    # Only transport failures back off: bad content and HTTP errors do not
+    with respx.mock:
+        respx.get("https://host.example.com/bad").mock(return_value=httpx.Response(200, content=b"data"))
+        respx.get("https://host.example.com/missing").mock(return_value=httpx.Response(404))
+        respx.get("https://host.example.com/down").mock(side_effect=httpx.ConnectError("refused"))
+        
+        with patch.object(AioAdaptiveLimiter, 'record_error', autospec=True) as record_error:
+            results = await AioUtils.download_files(
+                [
+                    ("https://host.example.com/bad", temp_dir / "bad", "sha256:" + "0" * 64),
+                    ("https://host.example.com/missing", temp_dir / "missing"),
+                    ("https://host.example.com/down", temp_dir / "down"),
+                ],
+                adaptive_concurrency=True,
+            )
+        
+        assert results == [False] * 3
+        assert record_error.call_count == 1
+
+@pytest.mark.anyio
+async def test_download_files_sharded(temp_dir):
+    sources = []
+    for i in range(5):
+        source = temp_dir / "src" / f"f{i}.bin"
+        source.parent.mkdir(exist_ok=True)
+        source.write_bytes(os.urandom(50_000))
+        sources.append(source)
+    downloads = [(str(source), temp_dir / f"out{i}.bin") for i, source in enumerate(sources)]
+    downloads += [(str(sources[0]), temp_dir / "dup.bin"), (str(temp_dir / "missing.bin"), temp_dir / "missing_copy.bin")]
+    
+    ui = MagicMock()
+    progress = ui.progress.return_value.__enter__.return_value
+    progress.add_task.side_effect = range(100)
+    reported = []
+    
+    async def on_result(result):
+        reported.append(result)
+    
+    results = await AioUtils.download_files_sharded(
+        downloads, processes=3, ui_enabled=True, ui=ui, result_callback=on_result, link_mode="copy",
+    )
+    
+    assert results == [True] * 6 + [False]
+    for (source, dest) in downloads[:6]:
+        assert dest.read_bytes() == Path(source).read_bytes()
+    # Results and progress of the workers reach the parent
+    assert sorted(result.index for result in reported) == list(range(7))
+    assert next(result for result in reported if result.index == 6).success is False
+    assert progress.add_task.call_count == 6
+    assert sum(call.kwargs.get("advance", 0) for call in progress.update.call_args_list) == 5 * 50_000
+    ui.print.assert_called()
+    
+    # Never more processes than slots of a batch-wide cap; checksum duplicates share a shard
+    context = multiprocessing.get_context("spawn")
+    started = []
+    
+    def process(**kwargs):
+        started.append(kwargs["args"])
+        return context.Process(**kwargs)
+    
+    sha256 = hashlib.sha256(sources[0].read_bytes()).hexdigest()
+    downloads = [(str(source), temp_dir / f"again{i}.bin") for i, source in enumerate(sources[:4])]
+    downloads[1] = (str(sources[0]), downloads[1][1], f"SHA256={sha256.upper()}")
+    downloads[0] += (f"sha256:{sha256}",)
+    with patch("nbaio.util.multiprocessing.get_context", return_value=MagicMock(Queue=context.Queue, Process=process)):
+        results = await AioUtils.download_files_sharded(
+            downloads, processes=8, max_concurrent=4, max_per_host=2, dedupe=False, dedupe_checksums=True,
+        )
+    assert results == [True] * 4
+    assert len(started) == 2
+    assert all(args[3]["max_concurrent"] == 2 and args[3]["max_per_host"] == 1 for args in started)
+    assert [entry[1].name for entry in started[0][2]] == ["again0.bin", "again1.bin", "again2.bin"]
+    
+    with pytest.raises(ValueError):
+        await AioUtils.download_files_sharded(downloads, cache=AioDownloadCache(temp_dir / "cache"))
+    assert await AioUtils.download_files_sharded([]) == []
+    
+    # A small host cap keeps its host on as many shards, the other hosts use every process
+    entries = [(f"https://{host}.example.com/{i}", temp_dir / f"{host}{i}") for i in range(4) for host in ("slow", "fast")]
+    shards, host_limits = AioUtils._shard_entries(entries, 4, {"slow.*": 2}, dedupe=False)
+    assert host_limits == {"slow.*": 1}
+    assert [[entries[index][0].split(".")[0] for index in shard] for shard in shards] == [
+        ["https://slow", "https://fast", "https://slow"],
+        ["https://slow", "https://fast", "https://slow"],
+        ["https://fast"],
+        ["https://fast"],
+    ]
+
+@pytest.mark.anyio
+async def test_download_files_dedupe(temp_dir, mock_download_url, mock_download_content):
+    sha256 = hashlib.sha256(mock_download_content).hexdigest()
+    other_url = "https://mirror.example.com/test.txt"
+    
+    async def slow(request):
+        await anyio.sleep(0.05)
+        return httpx.Response(200, content=mock_download_content)
+    
+    with respx.mock:
+        route = respx.get(mock_download_url).mock(side_effect=slow)
+        other = respx.get(other_url).mock(side_effect=slow)
+        
+        results = await AioUtils.download_files([
+            (mock_download_url, temp_dir / "a.txt"),
+            (mock_download_url, temp_dir / "b.txt"),
+            (mock_download_url, temp_dir / "sub" / "c.txt", f"sha256:{sha256}"),
+            (mock_download_url, temp_dir / "d.txt", "sha256:" + "0" * 64),
+            (other_url, temp_dir / "e.txt", f"sha256:{sha256}"),
+        ], max_concurrent=2, link_mode="hardlink")
+        
+        assert results == [True, True, True, False, True]
+        assert route.call_count == 1
+        assert other.call_count == 1
+        for name in ("a.txt", "b.txt", "sub/c.txt"):
+            assert (temp_dir / name).read_bytes() == mock_download_content
+        assert (temp_dir / "b.txt").stat().st_ino == (temp_dir / "a.txt").stat().st_ino
+        assert not (temp_dir / "d.txt").exists()
+        
+        # Same checksum, different URL
+        results = await AioUtils.download_files([
+            (mock_download_url, temp_dir / "f.txt", f"sha256:{sha256}"),
+            (other_url, temp_dir / "g.txt", f"sha256:{sha256}"),
+        ], dedupe_checksums=True, link_mode="copy")
+        assert results == [True, True]
+        assert route.call_count + other.call_count == 3
+        assert (temp_dir / "g.txt").stat().st_ino != (temp_dir / "f.txt").stat().st_ino
+        
+        # Failed originals leave duplicates to fetch on their own
+        route.mock(side_effect=[httpx.Response(500), httpx.Response(200, content=mock_download_content)])
+        results = await AioUtils.download_files([
+            (mock_download_url, temp_dir / "h.txt"),
+            (mock_download_url, temp_dir / "i.txt"),
+        ], max_concurrent=1)
+        assert results == [False, True]
+    
+    # Finished entries are remembered by fixed-size digests, not their URLs
+    keys = AioUtils._dedupe_keys(mock_download_url, f"sha256:{sha256}", dedupe_checksums=True)
+    assert [len(key) for key in keys] == [16, 16]
+    assert AioUtils._dedupe_keys(mock_download_url, None) == keys[:1]
+
+@pytest.mark.anyio
+async def test_download_file_segmented(temp_dir, mock_download_url):
+    content = os.urandom(100_000)
+    dest_path = temp_dir / "segmented.bin"
+    
+    with respx.mock:
+        respx.head(mock_download_url).mock(return_value=httpx.Response(
+            200, headers={"Accept-Ranges": "bytes", "Content-Length": str(len(content))}
+        ))
+        route = respx.get(mock_download_url).mock(side_effect=range_responder(content))
+        
+        success = await AioUtils.download_file(
+            mock_download_url, dest_path, segments=4, min_segment_size=10_000
+        )
+        
+        assert success is True
+        assert dest_path.read_bytes() == content
+        assert route.call_count == 4
+        assert all("range" in call.request.headers for call in route.calls)
+
+@pytest.mark.anyio
+async def test_download_file_segmented_fallback(temp_dir, mock_download_url, mock_download_content):
+    dest_path = temp_dir / "single.txt"
+    
+    with respx.mock:
+        # No Accept-Ranges: falls back to a single stream
+        respx.head(mock_download_url).mock(return_value=httpx.Response(200))
+        route = respx.get(mock_download_url).mock(return_value=httpx.Response(200, content=mock_download_content))
+        
+        success = await AioUtils.download_file(mock_download_url, dest_path, segments=4)
+        
+        assert success is True
+        assert dest_path.read_bytes() == mock_download_content
+        assert route.call_count == 1
+        assert "range" not in route.calls[0].request.headers
+
+def interrupted_stream(data: bytes):
+    """Async byte stream that yields data and then drops the connection."""
+    async def _stream():
+        yield data
+        raise httpx.ReadError("Connection reset")
+    return _stream()
+
+@pytest.mark.anyio
+async def test_download_file_resume(temp_dir, mock_download_url):
+    content = os.urandom(20_000)
+    dest_path = temp_dir / "resumed.bin"
+    part_path = temp_dir / "resumed.bin.part"
+    meta_path = temp_dir / "resumed.bin.part.json"
+    headers = {"ETag": '"v1"'}
+    
+    with respx.mock:
+        # First attempt drops the connection after two full chunks
+        respx.get(mock_download_url).mock(return_value=httpx.Response(
+            200, headers={**headers, "Content-Length": str(len(content))}, stream=interrupted_stream(content[:16384])
+        ))
+        success = await AioUtils.download_file(mock_download_url, dest_path, resume=True)
+        
+        assert success is False
+        assert not dest_path.exists()
+        assert part_path.read_bytes() == content[:16384]
+        assert json.loads(meta_path.read_text())["bytes_written"] == 16384
+    
+    with respx.mock:
+        # Second attempt continues from the partial file
+        route = respx.get(mock_download_url).mock(side_effect=range_responder(content, headers))
+        success = await AioUtils.download_file(mock_download_url, dest_path, resume=True)
+        
+        assert success is True
+        assert dest_path.read_bytes() == content
+        assert route.calls[0].request.headers["range"] == "bytes=16384-"
+        assert route.calls[0].request.headers["if-range"] == '"v1"'
+        assert not part_path.exists()
+        assert not meta_path.exists()
+
+@pytest.mark.anyio
+async def test_download_file_resume_changed(temp_dir, mock_download_url):
+    dest_path = temp_dir / "changed.bin"
+    part_path = temp_dir / "changed.bin.part"
+    part_path.write_bytes(b"stale")
+    (temp_dir / "changed.bin.part.json").write_text(json.dumps({"url": mock_download_url, "etag": '"v1"'}))
+    
+    with respx.mock:
+        # If-Range did not match: the server sends the full new content
+        respx.get(mock_download_url).mock(return_value=httpx.Response(200, content=b"new content"))
+        success = await AioUtils.download_file(mock_download_url, dest_path, resume=True)
+        
+        assert success is True
+        assert dest_path.read_bytes() == b"new content"
+        assert not part_path.exists()
+
+@pytest.mark.anyio
+async def test_download_file_retry(temp_dir, mock_download_url, mock_download_content):
+    dest_path = temp_dir / "retried.txt"
+    retry = AioRetryPolicy(max_attempts=3, backoff_base=0)
+    
+    with respx.mock:
+        route = respx.get(mock_download_url).mock(side_effect=[
+            httpx.Response(503, headers={"Retry-After": "0"}),
+            httpx.ConnectError("Connection refused"),
+            httpx.Response(200, content=mock_download_content),
+        ])
+        
+        assert await AioUtils.download_file(mock_download_url, dest_path, retry=retry) is True
+        assert dest_path.read_bytes() == mock_download_content
+        assert route.call_count == 3
+    
+    with respx.mock:
+        # Not retryable
+        route = respx.get(mock_download_url).mock(return_value=httpx.Response(404))
+        assert await AioUtils.download_file(mock_download_url, dest_path, retry=retry) is False
+        assert route.call_count == 1
+
+@pytest.mark.anyio
+async def test_download_file_retry_continues_partial(temp_dir, mock_download_url):
+    content = os.urandom(20_000)
+    dest_path = temp_dir / "retried.bin"
+    headers = {"ETag": '"v1"', "Content-Length": str(len(content))}
+    advanced = []
+    
+    with respx.mock:
+        route = respx.get(mock_download_url).mock(side_effect=[
+            httpx.Response(200, headers=headers, stream=interrupted_stream(content[:16384])),
+            range_responder(content, {"ETag": '"v1"'}),
+        ])
+        
+        success, error, total_size, _ = await AioUtils._download_core(
+            mock_download_url, dest_path, progress_callback=advanced.append,
+            retry=AioRetryPolicy(max_attempts=2, backoff_base=0),
+        )
+        
+        assert success is True
+        assert dest_path.read_bytes() == content
+        assert route.calls[1].request.headers["range"] == "bytes=16384-"
+        assert sum(advanced) == len(content)
+        assert not (temp_dir / "retried.bin.part").exists()
+
+@pytest.mark.anyio
+async def test_download_bytes(mock_download_url, mock_download_content):
+    sha256 = hashlib.sha256(mock_download_content).hexdigest()
+    
+    with respx.mock:
+        respx.get(mock_download_url).mock(return_value=httpx.Response(200, content=mock_download_content))
+        
+        assert await AioUtils.download_bytes(mock_download_url, checksum=f"sha256:{sha256}") == mock_download_content
+        assert await AioUtils.download_bytes(mock_download_url, checksum="sha256:" + "0" * 64) is None
+        # Declared sizes are refused up front, undeclared ones while streaming
+        assert await AioUtils.download_bytes(mock_download_url, max_size=4) is None
+        respx.get(mock_download_url).mock(return_value=httpx.Response(200, stream=slow_stream(b"x" * 100, 0, chunks=4)))
+        assert await AioUtils.download_bytes(mock_download_url, max_size=50) is None
+
+@pytest.mark.anyio
+async def test_download_stream_retry(mock_download_url):
+    content = os.urandom(20_000)
+    headers = {"ETag": '"v1"', "Content-Length": str(len(content))}
+    
+    with respx.mock:
+        route = respx.get(mock_download_url).mock(side_effect=[
+            httpx.Response(200, headers=headers, stream=interrupted_stream(content[:16384])),
+            range_responder(content, {"ETag": '"v1"'}),
+        ])
+        
+        chunks = [chunk async for chunk in AioUtils.download_stream(
+            mock_download_url, retry=AioRetryPolicy(max_attempts=2, backoff_base=0),
+        )]
+        
+        assert b"".join(chunks) == content
+        assert route.calls[1].request.headers["range"] == "bytes=16384-"
+        assert route.calls[1].request.headers["accept-encoding"] == "identity"
+        
+        # Decoded offsets of a compressed transfer do not apply to the file: start over
+        encoded = gzip.compress(content)
+        route.mock(side_effect=[
+            httpx.Response(200, headers={"ETag": '"v1"', "Content-Encoding": "gzip"}, stream=interrupted_stream(encoded[:len(encoded) // 2])),
+            range_responder(content, {"ETag": '"v1"'}),
+        ])
+        calls = route.call_count
+        assert await AioUtils.download_bytes(mock_download_url, retry=AioRetryPolicy(max_attempts=3, backoff_base=0)) is None
+        assert route.call_count == calls + 1
+        
+        # Without a validator the stream cannot be continued
+        route.mock(side_effect=[
+            httpx.Response(200, headers={"Content-Length": str(len(content))}, stream=interrupted_stream(content[:16384])),
+            httpx.Response(200, content=content),
+        ])
+        with pytest.raises(httpx.ReadError):
+            async for chunk in AioUtils.download_stream(mock_download_url, retry=AioRetryPolicy(max_attempts=2, backoff_base=0)):
+                pass
+        
+        # A stalled stream is abandoned, then continued
+        route.mock(side_effect=[
+            httpx.Response(200, headers=headers, stream=slow_stream(content, 0.05, chunks=10)),
+            range_responder(content, {"ETag": '"v1"'}),
+        ])
+        chunks = [chunk async for chunk in AioUtils.download_stream(
+            mock_download_url, retry=AioRetryPolicy(max_attempts=2, backoff_base=0),
+            min_throughput=1_000_000, throughput_window=0.1,
+        )]
+        assert b"".join(chunks) == content
+        assert route.calls[-1].request.headers["range"].startswith("bytes=")
+
+@pytest.mark.anyio
+async def test_download_bytes_many():
+    urls = [f"https://example.com/doc{i}.json" for i in range(50)]
+    
+    with respx.mock:
+        for i, url in enumerate(urls):
+            respx.get(url).mock(return_value=httpx.Response(200 if i != 7 else 404, json={"id": i}))
+        
+        with patch.object(AioUtils, 'create_http_client', wraps=AioUtils.create_http_client) as create_http_client:
+            results = await AioUtils.download_bytes_many(iter(urls), max_concurrent=8, max_per_host=4, pool_timeout=5.0)
+        assert create_http_client.call_args.kwargs['pool_timeout'] == 5.0
+        
+        assert len(results) == 50
+        assert results[7] is None
+        assert [json.loads(body)["id"] for i, body in enumerate(results) if i != 7] == [i for i in range(50) if i != 7]
+
+@pytest.mark.anyio
+async def test_download_file_accept_encoding(temp_dir, mock_download_url):
+    content = b"id,value\n" * 10_000
+    sha256 = hashlib.sha256(content).hexdigest()
+    dest_path = temp_dir / "export.csv"
+    
+    with respx.mock:
+        route = respx.get(mock_download_url).mock(return_value=httpx.Response(
+            200, content=gzip.compress(content), headers={"Content-Encoding": "gzip"},
+        ))
+        
+        assert await AioUtils.download_file(mock_download_url, dest_path, accept_encoding=True, checksum=f"sha256:{sha256}") is True
+        assert "gzip" in route.calls[0].request.headers["accept-encoding"]
+        assert dest_path.read_bytes() == content
+        
+        route.mock(return_value=httpx.Response(200, content=content))
+        assert await AioUtils.download_file(mock_download_url, dest_path) is True
+        assert route.calls[1].request.headers["accept-encoding"] == "identity"
+
+@pytest.mark.anyio
+async def test_download_file_ranges_use_identity(temp_dir, mock_download_url):
+    content = os.urandom(40_000)
+    dest_path = temp_dir / "ranged.bin"
+    identity = range_responder(content, {"Accept-Ranges": "bytes", "ETag": '"v1"'})
+    
+    def respond(request):
+        # A server compressing whatever the client accepts, Range or not
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            response = identity(request)
+            body = gzip.compress(response.content)
+            headers = {**response.headers, "Content-Encoding": "gzip", "Content-Length": str(len(body))}
+            return httpx.Response(response.status_code, content=body, headers=headers)
+        return identity(request)
+    
+    with respx.mock:
+        route = respx.route(url=mock_download_url).mock(side_effect=respond)
+        
+        assert await AioUtils.download_file(mock_download_url, dest_path, segments=4, min_segment_size=5_000) is True
+        assert dest_path.read_bytes() == content
+        assert all(call.request.headers["accept-encoding"] == "identity" for call in route.calls)
+        
+        mirrors = [mock_download_url, mock_download_url + "?mirror"]
+        respx.route(url=mirrors[1]).mock(side_effect=respond)
+        assert await AioUtils.download_file(mirrors, dest_path, multi_source=True, piece_size=10_000) is True
+        assert dest_path.read_bytes() == content
+        
+        # Encoded partial responses are refused
+        response = httpx.Response(206, content=b"x", headers={"Content-Encoding": "gzip"})
+        with pytest.raises(ValueError, match="Content-Encoding"):
+            AioUtils._check_partial_response(response)
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("suffix, compress", [(".gz", gzip.compress), (".bz2", bz2.compress), (".xz", lzma.compress)])
+async def test_download_file_decompress(temp_dir, suffix, compress):
+    url = f"https://example.com/export.jsonl{suffix}"
+    content = os.urandom(50_000) * 4
+    compressed = compress(content)
+    sha256 = hashlib.sha256(compressed).hexdigest()
+    dest_path = temp_dir / "export.jsonl"
+    
+    with respx.mock:
+        route = respx.get(url).mock(return_value=httpx.Response(200, stream=slow_stream(compressed, 0, chunks=5)))
+        
+        assert await AioUtils.download_file(url, dest_path, decompress=True, checksum=f"sha256:{sha256}") is True
+        assert dest_path.read_bytes() == content
+        assert route.calls[0].request.headers["accept-encoding"] == "identity"
+        
+        # A truncated or corrupt stream leaves the previous file in place
+        route.mock(return_value=httpx.Response(200, content=compressed[:len(compressed) // 2]))
+        assert await AioUtils.download_file(url, dest_path, decompress=True) is False
+        route.mock(return_value=httpx.Response(200, content=b"not compressed at all" * 100))
+        assert await AioUtils.download_file(url, dest_path, decompress=True) is False
+        assert dest_path.read_bytes() == content
+        assert list(temp_dir.iterdir()) == [dest_path]
+
+@pytest.mark.anyio
+async def test_download_file_delta(temp_dir, mock_download_url):
+    block_size = 4096
+    old = os.urandom(block_size * 20)
+    new = bytearray(old)
+    new[5 * block_size + 7] ^= 0xFF
+    new[6 * block_size] ^= 0xFF
+    new[15 * block_size + 1] ^= 0xFF
+    new = bytes(new) + b"appended"
+    dest_path = temp_dir / "disk.img"
+    dest_path.write_bytes(old)
+    (temp_dir / "new.img").write_bytes(new)
+    AioDeltaIndex.generate(temp_dir / "new.img", block_size=block_size).save(temp_dir / "disk.img.nbdelta")
+    advanced = []
+    
+    with respx.mock:
+        route = respx.get(mock_download_url).mock(side_effect=range_responder(new))
+        control = respx.get(mock_download_url + ".nbdelta").mock(
+            return_value=httpx.Response(200, content=(temp_dir / "disk.img.nbdelta").read_bytes()),
+        )
+        
+        success = await AioUtils.download_file(mock_download_url, dest_path, delta=True)
+        
+        assert success is True
+        assert dest_path.read_bytes() == new
+        assert control.call_count == 1
+        # Only the changed blocks (5-6 as one range, 15, and the new tail block) were fetched
+        fetched = sorted(call.request.headers["range"] for call in route.calls)
+        assert fetched == ["bytes=20480-28671", "bytes=61440-65535", "bytes=81920-81927"]
+        
+        # A corrupted range is caught by the block checksums
+        dest_path.write_bytes(old)
+        route.mock(side_effect=range_responder(old + b"xxxxxxxx"))
+        success, error, total_size, _ = await AioUtils._download_delta_core(
+            mock_download_url, dest_path, AioDeltaIndex.load(temp_dir / "disk.img.nbdelta"), progress_callback=advanced.append,
+        )
+        assert success is False
+        assert "does not match" in error
+        assert dest_path.read_bytes() == old
+        
+        # Nothing to reuse: a plain download
+        route.mock(side_effect=range_responder(new))
+        assert await AioUtils.download_file(
+            mock_download_url, temp_dir / "fresh.img", delta=temp_dir / "disk.img.nbdelta", delta_base=temp_dir / "missing.img",
+        ) is True
+        assert (temp_dir / "fresh.img").read_bytes() == new
+        assert "range" not in route.calls[-1].request.headers
+        
+        # An explicit control file that cannot be read fails the download
+        assert await AioUtils.download_file(mock_download_url, dest_path, delta=temp_dir / "nope.nbdelta") is False
+
+def slow_stream(data: bytes, delay: float, chunks: int = 1):
+    """Async byte stream that yields data in chunks, sleeping before each one."""
+    async def _stream():
+        size = -(-len(data) // chunks)
+        for start in range(0, len(data), size):
+            await anyio.sleep(delay)
+            yield data[start:start + size]
+    return _stream()
+
+@pytest.mark.anyio
+async def test_download_file_mirror_failover(temp_dir):
+    content = os.urandom(20_000)
+    dest_path = temp_dir / "mirrored.bin"
+    mirrors = ["https://a.example.com/f.bin", "https://b.example.com/f.bin"]
+    headers = {"ETag": '"a1"', "Content-Length": str(len(content))}
+    
+    with respx.mock:
+        route_a = respx.get(mirrors[0]).mock(return_value=httpx.Response(200, headers=headers, stream=interrupted_stream(content[:16384])))
+        route_b = respx.get(mirrors[1]).mock(side_effect=range_responder(content, {"ETag": '"b1"'}))
+        
+        assert await AioUtils.download_file(mirrors, dest_path) is True
+        assert dest_path.read_bytes() == content
+        assert route_a.call_count == 1
+        # Continued on the other mirror without its (meaningless) validator
+        assert route_b.calls[0].request.headers["range"] == "bytes=16384-"
+        assert "if-range" not in route_b.calls[0].request.headers
+    
+    with respx.mock:
+        respx.get(mirrors[0]).mock(return_value=httpx.Response(404))
+        respx.get(mirrors[1]).mock(return_value=httpx.Response(503))
+        
+        assert await AioUtils.download_file(mirrors, dest_path) is False
+
+@pytest.mark.anyio
+async def test_download_file_mirror_slow_failover(temp_dir):
+    content = os.urandom(20_000)
+    dest_path = temp_dir / "mirrored.bin"
+    mirrors = ["https://slow.example.com/f.bin", "https://fast.example.com/f.bin"]
+    
+    with respx.mock:
+        respx.get(mirrors[0]).mock(return_value=httpx.Response(
+            200, headers={"Content-Length": str(len(content))}, stream=slow_stream(content, 0.03, chunks=10)))
+        route_fast = respx.get(mirrors[1]).mock(side_effect=range_responder(content))
+        
+        assert await AioUtils.download_file(mirrors, dest_path, min_throughput=1_000_000, throughput_window=0.05) is True
+        assert dest_path.read_bytes() == content
+        assert route_fast.calls[0].request.headers["range"].startswith("bytes=")
+        assert route_fast.calls[0].request.headers["range"] != "bytes=0-"
+
+@pytest.mark.anyio
+async def test_download_file_race_mirrors(temp_dir):
+    content = os.urandom(20_000)
+    dest_path = temp_dir / "raced.bin"
+    mirrors = ["https://slow.example.com/f.bin", "https://fast.example.com/f.bin"]
+    
+    def slow_responder(request):
+        return httpx.Response(206, stream=slow_stream(content[:1024], 1.0))
+    
+    with respx.mock:
+        route_slow = respx.get(mirrors[0]).mock(side_effect=slow_responder)
+        route_fast = respx.get(mirrors[1]).mock(side_effect=range_responder(content))
+        
+        assert await AioUtils.download_file(mirrors, dest_path, race_mirrors=True) is True
+        assert dest_path.read_bytes() == content
+        # One probe each, then the whole file from the winner
+        assert route_slow.call_count == 1
+        assert route_fast.call_count == 2
+        assert "range" not in route_fast.calls[1].request.headers
+
+@pytest.mark.anyio
+async def test_download_file_multi_source(temp_dir):
+    content = os.urandom(40_000)
+    dest_path = temp_dir / "multi.bin"
+    mirrors = ["https://slow.example.com/f.bin", "https://fast.example.com/f.bin"]
+    fast = range_responder(content, {"Accept-Ranges": "bytes"})
+    
+    async def slow(request):
+        await anyio.sleep(0.05)
+        return fast(request)
+    
+    with respx.mock:
+        route_slow = respx.route(url=mirrors[0]).mock(side_effect=slow)
+        route_fast = respx.route(url=mirrors[1]).mock(side_effect=fast)
+        
+        assert await AioUtils.download_file(
+            mirrors, dest_path, multi_source=True, piece_size=4000,
+            checksum=f"sha256:{hashlib.sha256(content).hexdigest()}",
+        ) is True
+        assert dest_path.read_bytes() == content
+        
+        pieces_slow = [c for c in route_slow.calls if c.request.method == "GET"]
+        pieces_fast = [c for c in route_fast.calls if c.request.method == "GET"]
+        # Both mirrors contribute, the faster one more
+        assert len(pieces_slow) + len(pieces_fast) == 10
+        assert 1 <= len(pieces_slow) < len(pieces_fast)
+
+@pytest.mark.anyio
+async def test_download_file_metalink_pieces(temp_dir):
+    from nbaio.metalink import AioMetalink
+    content = os.urandom(12_000)
+    dest_path = temp_dir / "example.iso"
+    mirrors = ["https://bad.example.com/example.iso", "https://good.example.com/example.iso"]
+    pieces = "".join(f"<hash>{hashlib.sha1(content[i:i + 4000]).hexdigest()}</hash>" for i in range(0, len(content), 4000))
+    metalink_path = temp_dir / "example.meta4"
+    metalink_path.write_text(f"""<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+      <file name="example.iso">
+        <size>{len(content)}</size>
+        <hash type="sha-256">{hashlib.sha256(content).hexdigest()}</hash>
+        <pieces length="4000" type="sha-1">{pieces}</pieces>
+        <url priority="1">{mirrors[0]}</url>
+        <url priority="2">{mirrors[1]}</url>
+      </file>
+    </metalink>""")
+    corrupt = bytes(b ^ 0xFF for b in content)
+    
+    with respx.mock:
+        route_bad = respx.route(url=mirrors[0]).mock(side_effect=range_responder(corrupt, {"Accept-Ranges": "bytes"}))
+        respx.route(url=mirrors[1]).mock(side_effect=range_responder(content, {"Accept-Ranges": "bytes"}))
+        
+        # The corrupt mirror fails its first piece and is dropped
+        assert await AioUtils.download_file([], dest_path, multi_source=True, metalink=metalink_path) is True
+        assert dest_path.read_bytes() == content
+        assert len([c for c in route_bad.calls if c.request.method == "GET"]) == 1
+    
+    assert AioMetalink.load(metalink_path).find().size == len(content)
+
+@pytest.mark.anyio
+async def test_download_file_cache(temp_dir, mock_download_url, mock_download_content):
+    cache = AioDownloadCache(temp_dir / "cache")
+    dest_path = temp_dir / "cached.txt"
+    
+    with respx.mock:
+        route = respx.get(mock_download_url).mock(side_effect=[
+            httpx.Response(200, content=mock_download_content, headers={"ETag": '"v1"'}),
+            httpx.Response(304),
+        ])
+        
+        assert await AioUtils.download_file(mock_download_url, dest_path, cache=cache) is True
+        dest_path.unlink()
+        
+        # Second run revalidates and is served from the cache
+        assert await AioUtils.download_file(mock_download_url, dest_path, cache=cache) is True
+        assert dest_path.read_bytes() == mock_download_content
+        assert "if-none-match" not in route.calls[0].request.headers
+        assert route.calls[1].request.headers["if-none-match"] == '"v1"'
+        
+        # A cached copy failing its checksum on the segmented path keeps the previous file
+        respx.head(mock_download_url).mock(return_value=httpx.Response(304))
+        dest_path.write_bytes(b"previous")
+        assert await AioUtils.download_file(
+            mock_download_url, dest_path, cache=cache, segments=4, checksum="sha256:" + "0" * 64,
+        ) is False
+        assert dest_path.read_bytes() == b"previous"
+        assert sorted(p.name for p in temp_dir.iterdir()) == ["cache", "cached.txt"]
+        assert await AioUtils.download_file(mock_download_url, dest_path, cache=cache, segments=4) is True
+        assert dest_path.read_bytes() == mock_download_content
+
+@pytest.mark.anyio
+async def test_download_file_checksum(temp_dir, mock_download_url, mock_download_content):
+    dest_path = temp_dir / "checked.txt"
+    sha256 = hashlib.sha256(mock_download_content).hexdigest()
+    blake2b = hashlib.blake2b(mock_download_content).hexdigest()
+    
+    with respx.mock:
+        respx.get(mock_download_url).mock(return_value=httpx.Response(200, content=mock_download_content))
+        
+        assert await AioUtils.download_file(mock_download_url, dest_path, checksum=f"sha256:{sha256}") is True
+        assert await AioUtils.download_file(mock_download_url, dest_path, checksum=f"blake2b={blake2b.upper()}") is True
+        
+        # Mismatching digest fails and discards the corrupt data, keeping the previous copy
+        assert await AioUtils.download_file(mock_download_url, dest_path, checksum="sha256:" + "0" * 64) is False
+        assert dest_path.read_bytes() == mock_download_content
+        assert list(temp_dir.iterdir()) == [dest_path]
+        assert await AioUtils.download_file(mock_download_url, temp_dir / "new.txt", checksum="sha256:" + "0" * 64) is False
+        assert not (temp_dir / "new.txt").exists()
+        
+        # Unknown algorithm fails before any transfer
+        assert await AioUtils.download_file(mock_download_url, dest_path, checksum="nope:1234") is False
+        
+        results = await AioUtils.download_files([
+            (mock_download_url, temp_dir / "a.txt", f"sha256:{sha256}"),
+            (mock_download_url, temp_dir / "b.txt", "sha256:" + "0" * 64),
+            (mock_download_url, temp_dir / "c.txt"),
+        ])
+        assert results == [True, False, True]
+
 @pytest.mark.anyio
 async def test_extract_zip(temp_dir):
     zip_path = temp_dir / "test.zip"
@@ -246,6 +1371,75 @@ async def test_extract_tar(temp_dir):
     assert (extract_to_trusted / "file1.txt").read_text() == "hello content"
     assert not tar_path.exists()
 
+@pytest.mark.anyio
+async def test_download_extract(temp_dir):
+    tar_buffer = io.BytesIO()
+    with tarfile.open(fileobj=tar_buffer, mode="w:gz") as tf:
+        data = os.urandom(200_000)
+        info = tarfile.TarInfo(name="sub/data.bin")
+        info.size = len(data)
+        tf.addfile(info, io.BytesIO(data))
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zf:
+        zf.writestr("zipped.txt", "from zip")
+    
+    with respx.mock:
+        respx.get("https://example.com/a.tar.gz").mock(return_value=httpx.Response(200, content=tar_buffer.getvalue()))
+        respx.get("https://example.com/b.zip").mock(return_value=httpx.Response(200, content=zip_buffer.getvalue()))
+        respx.get("https://example.com/broken.tar.gz").mock(return_value=httpx.Response(200, content=b"not an archive"))
+        respx.get("https://example.com/missing.tar").mock(return_value=httpx.Response(404))
+        
+        results = await AioUtils.download_extract_files([
+            ("https://example.com/a.tar.gz", temp_dir / "out"),
+            ("https://example.com/b.zip", temp_dir / "out"),
+            ("https://example.com/broken.tar.gz", temp_dir / "broken"),
+            ("https://example.com/missing.tar", temp_dir / "missing"),
+            ("https://example.com/file.txt", temp_dir / "unsupported"),
+        ])
+        
+        assert results == [True, True, False, False, False]
+        assert (temp_dir / "out" / "sub" / "data.bin").read_bytes() == data
+        assert (temp_dir / "out" / "zipped.txt").read_text() == "from zip"
+        # The archive itself never lands on disk
+        assert not list(temp_dir.glob("*.tar.gz"))
+        
+        # Entries are pulled lazily and may carry the digest of the archive
+        async def entries():
+            yield ("https://example.com/b.zip", temp_dir / "verified", f"sha256:{hashlib.sha256(zip_buffer.getvalue()).hexdigest()}")
+            yield ("https://example.com/b.zip", temp_dir / "corrupt", "sha256:" + "0" * 64)
+        
+        assert await AioUtils.download_extract_files(entries()) == [True, False]
+        assert (temp_dir / "verified" / "zipped.txt").read_text() == "from zip"
+        # ZIP archives are only extracted once verified
+        assert not (temp_dir / "corrupt" / "zipped.txt").exists()
+        
+        # A compressed transfer is not continued at a decoded offset
+        encoded = gzip.compress(tar_buffer.getvalue())
+        route = respx.get("https://example.com/c.tar.gz").mock(side_effect=[
+            httpx.Response(200, headers={"ETag": '"v1"', "Content-Encoding": "gzip"}, stream=interrupted_stream(encoded[:len(encoded) // 2])),
+            range_responder(tar_buffer.getvalue(), {"ETag": '"v1"'}),
+        ])
+        assert await AioUtils.download_extract(
+            "https://example.com/c.tar.gz", temp_dir / "c", retry=AioRetryPolicy(max_attempts=3, backoff_base=0),
+        ) is False
+        assert route.call_count == 1
+        
+        # Trickling archives trip the watchdog; a stalled batch ends at its deadline
+        respx.get("https://example.com/slow.tar.gz").mock(return_value=httpx.Response(
+            200, stream=slow_stream(tar_buffer.getvalue(), 0.05, chunks=40),
+        ))
+        respx.get("https://example.com/stalled.tar.gz").mock(return_value=httpx.Response(
+            200, stream=slow_stream(tar_buffer.getvalue(), 30, chunks=2),
+        ))
+        assert await AioUtils.download_extract(
+            "https://example.com/slow.tar.gz", temp_dir / "slow", min_throughput=1_000_000, throughput_window=0.2,
+        ) is False
+        with anyio.fail_after(5):
+            results = await AioUtils.download_extract_files(
+                [("https://example.com/stalled.tar.gz", temp_dir / "stalled")], deadline=0.3,
+            )
+        assert results == [False]
+
 @pytest.mark.anyio
 async def test_shell_cmd_py_pip_install_mock():
     python_exe = "python.exe"
@@ -0,0 +1,45 @@
+import os
+import pytest
+from nbaio.writer import AioFileWriter
+
+
+@pytest.mark.anyio
+async def test_writer_coalesces_chunks(tmp_path):
+    path = tmp_path / "out.bin"
+    chunks = [os.urandom(1000) for _ in range(100)]
+    
+    async with AioFileWriter(path, 'wb', buffer_size=10_000) as writer:
+        for chunk in chunks:
+            await writer.write(chunk)
+        # Blocks go to one dedicated I/O thread
+        assert writer._thread is not None
+    
+    assert path.read_bytes() == b"".join(chunks)
+
+
+@pytest.mark.anyio
+async def test_writer_small_file_and_offset(tmp_path):
+    path = tmp_path / "out.bin"
+    path.write_bytes(b"." * 10)
+    
+    async with AioFileWriter(path, 'r+b', offset=4) as writer:
+        await writer.write(b"ab")
+        await writer.write(b"cd")
+        # Nothing reached buffer_size: no I/O thread is started
+        assert writer._thread is None
+    
+    assert path.read_bytes() == b"....abcd.."
+
+
+@pytest.mark.anyio
+async def test_writer_flushes_on_error(tmp_path):
+    path = tmp_path / "out.bin"
+    
+    with pytest.raises(RuntimeError):
+        async with AioFileWriter(path, 'wb', buffer_size=4) as writer:
+            await writer.write(b"1234")
+            await writer.write(b"56")
+            raise RuntimeError("connection lost")
+    
+    # Every byte handed to the writer is on disk
+    assert path.read_bytes() == b"123456"